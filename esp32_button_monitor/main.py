@@ -7,6 +7,8 @@ import socket
 import machine
 import time
 import json
+import ubinascii
+import uasyncio as asyncio
 
 # WiFi Configuration
 WIFI_SSID = "YOUR_WIFI_SSID"  # Ganti dengan SSID WiFi Anda
@@ -15,48 +17,80 @@ WIFI_PASSWORD = "YOUR_WIFI_PASSWORD"  # Ganti dengan password WiFi
 # Backend WebSocket Server
 BACKEND_HOST = "192.168.1.100"  # Ganti dengan IP PC Backend (Raspberry Pi/PC)
 BACKEND_PORT = 8765
+BACKEND_PATH = "/esp32"  # Panel endpoint of the backend WebSocket server
+
+# Reporting mode:
+#   "irq"  - edge interrupts + debounce, batched binary frames (default)
+#   "poll" - legacy 20 Hz polling, one JSON message per change
+REPORT_MODE = "irq"
+DEBOUNCE_MS = 15  # Edges within this window go out in one frame
+
+# Link supervision (irq mode): a heartbeat with the full button state every
+# HEARTBEAT_MS; the server acks it, and a link that delivers nothing (ack or
+# ping) for LINK_TIMEOUT_MS is dropped and reconnected
+HEARTBEAT_MS = 1000
+LINK_TIMEOUT_MS = 3000
 
 # GPIO Pin Mapping (24 buttons)
-BUTTON_PINS = {
-    "konveyor_atas": 23,
-    "konveyor_bawah": 22,
-    "silo_1": 21,
-    "silo_2": 19,
-    "silo_3": 18,
-    "silo_4": 5,
-    "pintu_pasir_1": 17,
-    "pintu_pasir_2": 16,
-    "pintu_batu_1": 4,
-    "pintu_batu_2": 2,
-    "pompa_air": 15,
-    "semen": 13,
-    "mixer": 12,
-    "vibrator": 14,
-    "pintu_mixer": 27,
-    "klakson": 26,
-    "waiting_hopper": 25,
-    "emergency_stop": 33,
-    "start_button": 32,
-    "stop_button": 35,
-    "pause_button": 34,
-    "reset_button": 39,
-    "spare_1": 36,
-    "spare_2": 0,
-}
+# Order matters: button i is bit i of the state/changed masks
+BUTTONS = [
+    ("konveyor_atas", 23),
+    ("konveyor_bawah", 22),
+    ("silo_1", 21),
+    ("silo_2", 19),
+    ("silo_3", 18),
+    ("silo_4", 5),
+    ("pintu_pasir_1", 17),
+    ("pintu_pasir_2", 16),
+    ("pintu_batu_1", 4),
+    ("pintu_batu_2", 2),
+    ("pompa_air", 15),
+    ("semen", 13),
+    ("mixer", 12),
+    ("vibrator", 14),
+    ("pintu_mixer", 27),
+    ("klakson", 26),
+    ("waiting_hopper", 25),
+    ("emergency_stop", 33),
+    ("start_button", 32),
+    ("stop_button", 35),
+    ("pause_button", 34),
+    ("reset_button", 39),
+    ("spare_1", 36),
+    ("spare_2", 0),
+]
+BUTTON_PINS = dict(BUTTONS)
+
+# Binary button frame: type, seq (uint16), state mask (24 bit), changed mask (24 bit)
+FRAME_BUTTONS = 0x10
+FRAME_HEARTBEAT = 0x11  # Same layout, changed mask = 0
+
+# Shared by the reporting, heartbeat and receive tasks of one connection
+link = {"seq": 0, "state": 0, "rx": 0}
 
 # Initialize GPIO pins
 button_states = {}
 gpio_pins = {}
+pin_list = []  # Pins in bit order
 
 def init_gpio():
     """Initialize all GPIO pins as inputs with pull-up resistors"""
     print("🔧 Initializing GPIO pins...")
-    for relay_name, pin_num in BUTTON_PINS.items():
+    for relay_name, pin_num in BUTTONS:
         gpio_pins[relay_name] = machine.Pin(pin_num, machine.Pin.IN, machine.Pin.PULL_UP)
+        pin_list.append(gpio_pins[relay_name])
         button_states[relay_name] = False  # Initial state: not pressed
         print(f"  - {relay_name}: GPIO {pin_num}")
     print("✅ GPIO initialized")
 
+def read_state_mask():
+    """Current button states as a bitmask (bit i = BUTTONS[i] pressed)"""
+    mask = 0
+    for bit, pin in enumerate(pin_list):
+        if not pin.value():  # Inverted: 0 = pressed
+            mask |= 1 << bit
+    return mask
+
 def connect_wifi():
     """Connect to WiFi network"""
     print(f"📡 Connecting to WiFi: {WIFI_SSID}...")
@@ -80,7 +114,7 @@ def connect_wifi():
 def create_websocket_handshake():
     """Create WebSocket handshake HTTP request"""
     handshake = (
-        f"GET / HTTP/1.1\r\n"
+        f"GET {BACKEND_PATH} HTTP/1.1\r\n"
         f"Host: {BACKEND_HOST}:{BACKEND_PORT}\r\n"
         f"Upgrade: websocket\r\n"
         f"Connection: Upgrade\r\n"
@@ -92,7 +126,7 @@ def create_websocket_handshake():
 def connect_websocket():
     """Connect to backend WebSocket server"""
     try:
-        print(f"🔌 Connecting to WebSocket: ws://{BACKEND_HOST}:{BACKEND_PORT}")
+        print(f"🔌 Connecting to WebSocket: ws://{BACKEND_HOST}:{BACKEND_PORT}{BACKEND_PATH}")
         s = socket.socket()
         s.connect((BACKEND_HOST, BACKEND_PORT))
         
@@ -112,6 +146,42 @@ def connect_websocket():
         print(f"❌ WebSocket connection error: {e}")
         return None
 
+def send_frame(ws, opcode, payload):
+    """Send one masked client WebSocket frame (0x1 = text, 0x2 = binary)"""
+    frame = bytearray([0x80 | opcode])  # FIN bit set
+    
+    # Payload length
+    length = len(payload)
+    if length <= 125:
+        frame.append(length | 0x80)  # Mask bit set
+    else:
+        frame.append(126 | 0x80)
+        frame.extend(length.to_bytes(2, 'big'))
+    
+    # Masking key (simple, not cryptographically secure)
+    frame.extend(b'\x00\x00\x00\x00')
+    
+    # Masked payload (zero key = unchanged)
+    frame.extend(payload)
+    ws.send(frame)
+
+def send_hello(ws):
+    """Announce panel id and button (bit) order before the first binary frame"""
+    message = {
+        "type": "panel_hello",
+        "panel_id": ubinascii.hexlify(machine.unique_id()).decode(),
+        "format": "mask24.v1",
+        "buttons": [name for name, _ in BUTTONS],
+        "heartbeat_ms": HEARTBEAT_MS,
+    }
+    send_frame(ws, 0x1, json.dumps(message).encode())
+
+def send_button_frame(ws, seq, state, changed, frame_type=FRAME_BUTTONS):
+    """Batched button report: 9 bytes for any number of simultaneous changes"""
+    payload = bytes([frame_type, seq & 0xFF, (seq >> 8) & 0xFF]) + \
+        state.to_bytes(3, 'little') + changed.to_bytes(3, 'little')
+    send_frame(ws, 0x2, payload)
+
 def send_button_state(ws, relay_name, state):
     """Send button state via WebSocket"""
     try:
@@ -122,26 +192,7 @@ def send_button_state(ws, relay_name, state):
             "timestamp": time.time()
         }
         
-        # WebSocket frame format (simple text frame)
-        payload = json.dumps(message).encode()
-        frame = bytearray([0x81])  # Text frame, FIN bit set
-        
-        # Payload length
-        length = len(payload)
-        if length <= 125:
-            frame.append(length | 0x80)  # Mask bit set
-        else:
-            frame.append(126 | 0x80)
-            frame.extend(length.to_bytes(2, 'big'))
-        
-        # Masking key (simple, not cryptographically secure)
-        mask = b'\x00\x00\x00\x00'
-        frame.extend(mask)
-        
-        # Masked payload
-        frame.extend(payload)
-        
-        ws.send(frame)
+        send_frame(ws, 0x1, json.dumps(message).encode())
         print(f"📤 Sent: {relay_name} = {state}")
     except Exception as e:
         print(f"❌ Send error: {e}")
@@ -168,6 +219,74 @@ def poll_buttons(ws):
             print(f"❌ Polling error: {e}")
             raise
 
+# Edge interrupts only flag activity; the pins are read after the debounce
+# window, so bounces that settle back to the old state are never reported
+edge_flag = None
+
+def on_edge(pin):
+    edge_flag.set()
+
+def init_irq():
+    global edge_flag
+    edge_flag = asyncio.ThreadSafeFlag()
+    for pin in pin_list:
+        pin.irq(trigger=machine.Pin.IRQ_FALLING | machine.Pin.IRQ_RISING, handler=on_edge)
+
+async def report_buttons(ws):
+    """Sleep until an edge, debounce, send all changes in one frame"""
+    link["seq"] = 0
+    link["state"] = read_state_mask()
+    
+    # Full state on (re)connect so the server starts in sync
+    send_button_frame(ws, 0, link["state"], (1 << len(BUTTONS)) - 1)
+    
+    while True:
+        await edge_flag.wait()
+        await asyncio.sleep_ms(DEBOUNCE_MS)
+        
+        state = read_state_mask()
+        changed = state ^ link["state"]
+        if changed:
+            link["seq"] = (link["seq"] + 1) & 0xFFFF
+            send_button_frame(ws, link["seq"], state, changed)
+            link["state"] = state
+            print(f"📤 Buttons: state={state:06x} changed={changed:06x}")
+
+async def heartbeat(ws):
+    """Periodic full state (server resyncs from it) and link timeout check"""
+    while True:
+        await asyncio.sleep_ms(HEARTBEAT_MS)
+        if time.ticks_diff(time.ticks_ms(), link["rx"]) > LINK_TIMEOUT_MS:
+            raise OSError("link timeout: no ack from server")
+        # Last reported state, so a change still in its debounce window is
+        # not sent ahead of its own frame
+        send_button_frame(ws, link["seq"], link["state"], 0, FRAME_HEARTBEAT)
+
+async def receive(ws):
+    """Read server frames: acks and pings prove the link is alive"""
+    reader = asyncio.StreamReader(ws)
+    while True:
+        header = await reader.readexactly(2)
+        opcode = header[0] & 0x0F
+        length = header[1] & 0x7F
+        if length == 126:
+            length = int.from_bytes(await reader.readexactly(2), 'big')
+        elif length == 127:
+            length = int.from_bytes(await reader.readexactly(8), 'big')
+        payload = await reader.readexactly(length) if length else b""
+        link["rx"] = time.ticks_ms()
+        
+        if opcode == 0x9:
+            send_frame(ws, 0xA, payload)  # Ping → pong (server keepalive)
+        elif opcode == 0x8:
+            raise OSError("server closed the connection")
+
+async def run_link(ws):
+    """All tasks of one connection; the first failure ends it"""
+    ws.setblocking(False)
+    link["rx"] = time.ticks_ms()
+    await asyncio.gather(report_buttons(ws), heartbeat(ws), receive(ws))
+
 def main():
     """Main entry point"""
     print("\n" + "="*50)
@@ -177,6 +296,8 @@ def main():
     
     # Initialize GPIO
     init_gpio()
+    if REPORT_MODE == "irq":
+        init_irq()
     
     # Connect to WiFi
     if not connect_wifi():
@@ -188,11 +309,19 @@ def main():
         ws = connect_websocket()
         if ws:
             try:
-                print("🚀 Starting button polling...")
-                poll_buttons(ws)
+                if REPORT_MODE == "irq":
+                    print("🚀 Starting interrupt-driven button reporting...")
+                    send_hello(ws)
+                    asyncio.run(run_link(ws))
+                else:
+                    print("🚀 Starting button polling...")
+                    poll_buttons(ws)
             except Exception as e:
                 print(f"❌ Error: {e}")
                 ws.close()
+            finally:
+                if REPORT_MODE == "irq":
+                    asyncio.new_event_loop()  # Drop the tasks of the dead link
         
         print("🔄 Reconnecting in 5 seconds...")
         time.sleep(5)
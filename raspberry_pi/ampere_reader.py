@@ -1,16 +1,45 @@
 #!/usr/bin/env python3
 """
 Ampere Meter Reader Module
-Reads current (ampere), voltage, and power from PZEM-016 via Modbus RTU
+Reads current (ampere), voltage, power, energy, frequency, power factor and
+alarm state from PZEM-016 via Modbus RTU
+
+All ten input registers are read in one FC04 transaction by a background
+sampler thread; get_cached_data() never touches the serial port.
 """
 
 import minimalmodbus
+import threading
 import time
-from typing import Optional, Dict
+from typing import Optional, Dict, List, Callable
+
+# PZEM-016 input registers 0x0000-0x0009 (function code 04)
+PZEM_REGISTER_COUNT = 10
+
+def decode_pzem(registers: List[int]) -> Dict[str, float]:
+    """
+    Decode a PZEM-016 input register block
+    32-bit values are sent low word first
+    """
+    return {
+        'voltage': registers[0] / 10.0,                         # 0x0000, 0.1 V
+        'ampere': (registers[1] | registers[2] << 16) / 1000.0,  # 0x0001-2, 0.001 A
+        'power': (registers[3] | registers[4] << 16) / 10.0,     # 0x0003-4, 0.1 W
+        'energy': registers[5] | registers[6] << 16,             # 0x0005-6, 1 Wh
+        'frequency': registers[7] / 10.0,                       # 0x0007, 0.1 Hz
+        'power_factor': registers[8] / 100.0,                   # 0x0008, 0.01
+        'alarm': registers[9] == 0xFFFF,                        # 0x0009, power alarm
+    }
 
 class AmpereReader:
-    def __init__(self, config: dict):
-        """Initialize ampere meter reader with PZEM-016"""
+    def __init__(self, config: dict, recorder=None, instrument=None):
+        """
+        Initialize ampere meter reader with PZEM-016
+        Args:
+            recorder: TrafficRecorder capturing every register read (optional)
+            instrument: Register source to use instead of a minimalmodbus
+                Instrument on ampere_meter.port (e.g. traffic_replay.py)
+        """
         self.config = config.get('ampere_meter', {})
         
         # Default values if not configured
@@ -18,108 +47,158 @@ class AmpereReader:
         slave_id = self.config.get('slave_id', 10)
         baudrate = self.config.get('baudrate', 9600)
         
-        try:
-            self.instrument = minimalmodbus.Instrument(port, slave_id)
-            self.instrument.serial.baudrate = baudrate
-            self.instrument.serial.timeout = 1.0
-            self.instrument.serial.bytesize = 8
-            self.instrument.serial.parity = minimalmodbus.serial.PARITY_NONE
-            self.instrument.serial.stopbits = 1
-            
-            print(f"✅ PZEM-016 initialized on {port} (Slave ID: {slave_id})")
-            
-        except Exception as e:
-            print(f"⚠️ Failed to initialize PZEM-016: {e}")
-            self.instrument = None
+        # Background sampling period
+        self.sample_interval = self.config.get('sample_interval_ms', 500) / 1000.0
+        
+        if instrument is not None:
+            self.instrument = instrument
+        else:
+            self.instrument = self._open_instrument(port, slave_id, baudrate)
+        if self.instrument and recorder:
+            self.instrument = recorder.wrap_client(self.instrument, 'pzem', ('read_registers',))
         
         # Store last readings
         self.current_ampere = 0.0
         self.voltage = 0.0
         self.power = 0.0
+        self.energy = 0
+        self.frequency = 0.0
+        self.power_factor = 0.0
+        self.alarm = False
         self.last_update = 0
+        self.online = False
         
-    def read_current(self) -> Optional[float]:
-        """Read current in Ampere from register 0x0001"""
-        if not self.instrument:
-            return None
-            
+        self.lock = threading.Lock()      # Guards the readings above
+        self.io_lock = threading.Lock()   # One transaction at a time on the port
+        self.running = False
+        self.thread = None
+        self.sample_listeners: List[Callable[[dict, float], None]] = []
+        
+    def _open_instrument(self, port: str, slave_id: int, baudrate: int):
         try:
-            # PZEM-016 register 0x0001 = Current (A), 2 decimals
-            ampere = self.instrument.read_register(0x0001, numberOfDecimals=2, functioncode=4)
-            self.current_ampere = ampere
-            self.last_update = time.time()
-            return ampere
+            instrument = minimalmodbus.Instrument(port, slave_id)
+            instrument.serial.baudrate = baudrate
+            instrument.serial.timeout = self.config.get('timeout', 1.0)
+            instrument.serial.bytesize = 8
+            instrument.serial.parity = minimalmodbus.serial.PARITY_NONE
+            instrument.serial.stopbits = 1
+            
+            print(f"✅ PZEM-016 initialized on {port} (Slave ID: {slave_id})")
+            return instrument
+            
         except Exception as e:
-            print(f"⚠️ Error reading ampere: {e}")
+            print(f"⚠️ Failed to initialize PZEM-016: {e}")
             return None
     
-    def read_voltage(self) -> Optional[float]:
-        """Read voltage in Volts from register 0x0000"""
-        if not self.instrument:
-            return None
+    def add_sample_listener(self, callback: Callable[[dict, float], None]):
+        """
+        Register callback(data, monotonic_time) called for every successful
+        sample. Keep callbacks fast.
+        """
+        self.sample_listeners.append(callback)
+    
+    def start(self):
+        """Start the background sampler thread"""
+        if not self.instrument or self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._sample_loop, name='pzem-sampler', daemon=True)
+        self.thread.start()
+        print(f"✅ PZEM-016 sampling every {int(self.sample_interval * 1000)}ms")
+    
+    def stop(self):
+        """Stop the background sampler thread"""
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout=2)
+            self.thread = None
+    
+    def _sample_loop(self):
+        next_sample = time.monotonic()
+        while self.running:
+            self.get_all_data()
             
-        try:
-            # PZEM-016 register 0x0000 = Voltage (V), 1 decimal
-            voltage = self.instrument.read_register(0x0000, numberOfDecimals=1, functioncode=4)
-            self.voltage = voltage
-            return voltage
-        except Exception as e:
-            print(f"⚠️ Error reading voltage: {e}")
-            return None
+            # Fixed rate; skip missed slots after a slow/failed read
+            next_sample += self.sample_interval
+            now = time.monotonic()
+            if next_sample < now:
+                next_sample = now
+            time.sleep(next_sample - now)
     
-    def read_power(self) -> Optional[float]:
-        """Read active power in Watts from register 0x0003"""
+    def read_block(self) -> Optional[Dict[str, float]]:
+        """Read all PZEM-016 input registers in a single transaction"""
         if not self.instrument:
             return None
-            
-        try:
-            # PZEM-016 register 0x0003 = Power (W), 1 decimal
-            power = self.instrument.read_register(0x0003, numberOfDecimals=1, functioncode=4)
-            self.power = power
-            return power
-        except Exception as e:
-            print(f"⚠️ Error reading power: {e}")
-            return None
+        
+        with self.io_lock:
+            registers = self.instrument.read_registers(0x0000, PZEM_REGISTER_COUNT, functioncode=4)
+        return decode_pzem(registers)
+        
+    def read_current(self) -> Optional[float]:
+        """Read current in Ampere (registers 0x0001-0x0002)"""
+        data = self.get_all_data()
+        return data['ampere'] if data else None
+    
+    def read_voltage(self) -> Optional[float]:
+        """Read voltage in Volts (register 0x0000)"""
+        data = self.get_all_data()
+        return data['voltage'] if data else None
+    
+    def read_power(self) -> Optional[float]:
+        """Read active power in Watts (registers 0x0003-0x0004)"""
+        data = self.get_all_data()
+        return data['power'] if data else None
     
     def get_all_data(self) -> Optional[Dict[str, float]]:
-        """Read all available data from PZEM-016"""
+        """Read all available data from PZEM-016 (one bus transaction)"""
         if not self.instrument:
             return None
             
         try:
-            # Read voltage (0x0000)
-            voltage = self.instrument.read_register(0x0000, numberOfDecimals=1, functioncode=4)
-            
-            # Read current (0x0001)
-            ampere = self.instrument.read_register(0x0001, numberOfDecimals=2, functioncode=4)
-            
-            # Read power (0x0003)
-            power = self.instrument.read_register(0x0003, numberOfDecimals=1, functioncode=4)
-            
-            # Update internal state
-            self.voltage = voltage
-            self.current_ampere = ampere
-            self.power = power
-            self.last_update = time.time()
-            
-            return {
-                'voltage': voltage,
-                'ampere': ampere,
-                'power': power,
-                'timestamp': self.last_update
-            }
+            data = self.read_block()
         except Exception as e:
-            print(f"⚠️ Error reading ampere meter data: {e}")
+            if self.online:
+                print(f"⚠️ Error reading ampere meter data: {e}")
+            with self.lock:
+                self.online = False
             return None
+        
+        # Update internal state
+        with self.lock:
+            self.voltage = data['voltage']
+            self.current_ampere = data['ampere']
+            self.power = data['power']
+            self.energy = data['energy']
+            self.frequency = data['frequency']
+            self.power_factor = data['power_factor']
+            self.alarm = data['alarm']
+            self.last_update = time.time()
+            self.online = True
+            data['timestamp'] = self.last_update
+        
+        sample_time = time.monotonic()
+        for callback in self.sample_listeners:
+            try:
+                callback(data, sample_time)
+            except Exception as e:
+                print(f"⚠️ Ampere sample listener error: {e}")
+        
+        return data
     
     def get_cached_data(self) -> Dict[str, float]:
         """Get last cached readings (faster, no I/O)"""
-        return {
-            'voltage': self.voltage,
-            'ampere': self.current_ampere,
-            'power': self.power,
-            'timestamp': self.last_update
-        }
+        with self.lock:
+            return {
+                'voltage': self.voltage,
+                'ampere': self.current_ampere,
+                'power': self.power,
+                'energy': self.energy,
+                'frequency': self.frequency,
+                'power_factor': self.power_factor,
+                'alarm': self.alarm,
+                'online': self.online,
+                'timestamp': self.last_update
+            }
 
 
 # Test standalone
@@ -147,6 +226,8 @@ if __name__ == "__main__":
             print(f"  Voltage: {data['voltage']:.1f} V")
             print(f"  Current: {data['ampere']:.2f} A")
             print(f"  Power:   {data['power']:.1f} W")
+            print(f"  Energy:  {data['energy']} Wh")
+            print(f"  Freq:    {data['frequency']:.1f} Hz  PF: {data['power_factor']:.2f}")
         else:
             print(f"\n❌ Failed to read data (attempt {i+1})")
         
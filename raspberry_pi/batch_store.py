@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+"""
+Batch Store Module
+Durable batch history in SQLite (WAL mode)
+
+Producers (weighing engine, relay poller, ampere sampler, safety supervisor,
+WebSocket handlers) only append rows to an in-memory queue; a background
+writer thread commits them in bulk every flush_interval_ms, so no I/O thread
+ever waits for the disk. Rows older than retention_days are pruned in small
+chunks, which keeps the database size (and index depth) flat over months of
+24/7 operation.
+
+Tables: batches (one row per batch), weighings (target vs actual per
+weighing job), events (relay changes, alarms, buttons; JSON payload) and
+ampere (mixer current curve while a batch is active). All are indexed by
+batch id and time.
+"""
+
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS batches (
+    batch_id TEXT PRIMARY KEY,
+    started_at REAL NOT NULL,
+    ended_at REAL,
+    info TEXT,
+    summary TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_batches_started ON batches (started_at);
+
+CREATE TABLE IF NOT EXISTS weighings (
+    id INTEGER PRIMARY KEY,
+    batch_id TEXT,
+    ts REAL NOT NULL,
+    job_id TEXT,
+    material TEXT,
+    target REAL,
+    actual REAL,
+    phase TEXT,
+    duration_s REAL,
+    close_latency_ms REAL
+);
+CREATE INDEX IF NOT EXISTS idx_weighings_batch ON weighings (batch_id, ts);
+CREATE INDEX IF NOT EXISTS idx_weighings_ts ON weighings (ts);
+
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    batch_id TEXT,
+    ts REAL NOT NULL,
+    type TEXT NOT NULL,
+    data TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_events_batch ON events (batch_id, ts);
+CREATE INDEX IF NOT EXISTS idx_events_ts ON events (ts);
+
+CREATE TABLE IF NOT EXISTS ampere (
+    id INTEGER PRIMARY KEY,
+    batch_id TEXT NOT NULL,
+    ts REAL NOT NULL,
+    ampere REAL,
+    power REAL
+);
+CREATE INDEX IF NOT EXISTS idx_ampere_batch ON ampere (batch_id, ts);
+CREATE INDEX IF NOT EXISTS idx_ampere_ts ON ampere (ts);
+"""
+
+# Row kind → INSERT statement (executemany per kind in one transaction)
+INSERTS = {
+    'weighing': "INSERT INTO weighings (batch_id, ts, job_id, material, target, actual, phase, "
+                "duration_s, close_latency_ms) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+    'event': "INSERT INTO events (batch_id, ts, type, data) VALUES (?, ?, ?, ?)",
+    'ampere': "INSERT INTO ampere (batch_id, ts, ampere, power) VALUES (?, ?, ?, ?)",
+    'batch_start': "INSERT OR REPLACE INTO batches (batch_id, started_at, info) VALUES (?, ?, ?)",
+    'batch_end': "UPDATE batches SET ended_at = ?, summary = ? WHERE batch_id = ?",
+}
+
+# Kinds applied in this order within one flush (a batch row exists before it is closed)
+FLUSH_ORDER = ('batch_start', 'weighing', 'event', 'ampere', 'batch_end')
+
+# Event types recorded from broadcast-style event listeners
+RECORDED_EVENTS = ('weighing_phase', 'mixer_overload', 'mixer_overload_cleared', 'mixer_plateau',
+                   'safety_trip', 'safety_recovered')
+
+
+class BatchStore:
+    def __init__(self, config: dict, weighing_engine=None, modbus_controller=None,
+                 ampere_reader=None, mixer_analytics=None, safety_supervisor=None):
+        self.config = config.get('batch_store', {})
+        self.path = self.config.get('path', 'batch_history.db')
+        self.flush_interval = self.config.get('flush_interval_ms', 1000) / 1000.0
+        self.max_queue = self.config.get('max_queue', 100000)
+        self.retention_days = self.config.get('retention_days', 365)
+        self.prune_interval = self.config.get('prune_interval_s', 3600)
+        self.prune_chunk = self.config.get('prune_chunk_rows', 5000)
+        self.retry_max = self.config.get('retry_max_s', 30.0)
+
+        self.rows = queue.Queue(self.max_queue)
+        self.pending: Dict[str, List[tuple]] = {}  # Taken off the queue, not committed yet
+        self.pending_count = 0
+        self.current_batch: Optional[str] = None
+        self.dropped = 0
+        self.written = 0
+        self.flushes = 0
+        self.errors = 0
+        self.last_error: Optional[str] = None
+        self.last_flush_ms = None
+        self.last_prune = 0.0
+        self.running = False
+        self.thread = None
+        self._wakeup = threading.Event()
+
+        # Create schema up front so queries work before the first flush
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        connection = self._connect()
+        connection.executescript(SCHEMA)
+        connection.close()
+
+        if weighing_engine:
+            weighing_engine.add_event_listener(self.on_event)
+        if mixer_analytics:
+            mixer_analytics.add_event_listener(self.on_event)
+        if safety_supervisor:
+            safety_supervisor.add_event_listener(self.on_event)
+        if modbus_controller:
+            modbus_controller.add_relay_listener(self.on_relay_change)
+        if ampere_reader:
+            ampere_reader.add_sample_listener(self.on_ampere_sample)
+
+        print(f"✅ Batch store: {self.path} (WAL, flush every {self.flush_interval * 1000:.0f}ms, "
+              f"retention {self.retention_days} days)")
+
+    def _connect(self, read_only: bool = False) -> sqlite3.Connection:
+        if read_only:
+            connection = sqlite3.connect(f"file:{os.path.abspath(self.path)}?mode=ro", uri=True)
+        else:
+            connection = sqlite3.connect(self.path)
+            connection.execute("PRAGMA journal_mode=WAL")
+            # WAL + NORMAL: durable across application crashes, fsync per checkpoint
+            connection.execute("PRAGMA synchronous=NORMAL")
+        connection.row_factory = sqlite3.Row
+        return connection
+
+    # Producers (any thread, never block)
+    def _put(self, kind: str, row: tuple):
+        try:
+            self.rows.put_nowait((kind, row))
+        except queue.Full:
+            self.dropped += 1
+
+    def start_batch(self, batch_id: str, info: dict = None):
+        self.current_batch = batch_id
+        self._put('batch_start', (batch_id, time.time(), json.dumps(info or {})))
+
+    def end_batch(self, summary: dict = None):
+        batch_id = self.current_batch
+        if batch_id is None:
+            return
+        self.current_batch = None
+        self._put('batch_end', (time.time(), json.dumps(summary or {}), batch_id))
+
+    def record_event(self, event_type: str, data: dict, timestamp: float = None):
+        self._put('event', (self.current_batch, timestamp or time.time(), event_type, json.dumps(data)))
+
+    def on_event(self, event: dict):
+        """Weighing engine / mixer analytics / safety supervisor listener"""
+        event_type = event.get('type')
+        timestamp = event.get('timestamp', time.time() * 1000) / 1000.0
+        if event_type == 'weighing_complete':
+            self._put('weighing', (
+                self.current_batch, timestamp, event.get('job_id'), event.get('material'),
+                event.get('target'), event.get('weight'), event.get('phase'),
+                event.get('duration_s'), event.get('close_latency_ms')
+            ))
+        elif event_type in RECORDED_EVENTS:
+            self.record_event(event_type, event, timestamp)
+
+    def on_relay_change(self, changes: Dict[str, bool]):
+        self.record_event('relay_update', changes)
+
+    def on_ampere_sample(self, data: dict, sample_time: float):
+        batch_id = self.current_batch
+        if batch_id is not None:
+            self._put('ampere', (batch_id, data.get('timestamp') or time.time(),
+                                 data.get('ampere'), data.get('power')))
+
+    # Writer thread
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._writer_loop, name='batch-store', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        self._wakeup.set()
+        if self.thread:
+            self.thread.join(timeout=5.0)
+
+    def _writer_loop(self):
+        """
+        Flush/prune until stopped. A failed flush keeps its rows for the next
+        attempt and the writer retries with exponential backoff (up to
+        retry_max_s), reopening the database, instead of exiting.
+        """
+        connection = None
+        delay = self.flush_interval
+        while True:
+            self._wakeup.wait(delay)
+            stopping = not self.running
+            try:
+                if connection is None:
+                    connection = self._connect()
+                self.flush(connection)
+                if not stopping and time.monotonic() - self.last_prune >= self.prune_interval:
+                    self.last_prune = time.monotonic()
+                    self.prune(connection)
+                delay = self.flush_interval
+            except Exception as e:
+                self.errors += 1
+                self.last_error = f"{type(e).__name__}: {e}"
+                delay = min(max(delay, self.flush_interval) * 2, self.retry_max)
+                print(f"❌ Batch store writer error ({self.pending_count} rows kept, "
+                      f"retry in {delay:.1f}s): {e}")
+                if connection is not None:
+                    connection.close()
+                    connection = None
+            if stopping:
+                break  # Final flush on shutdown done (or failed)
+        if connection is not None:
+            connection.close()
+
+    def flush(self, connection: sqlite3.Connection) -> int:
+        """
+        Commit everything queued so far in one transaction. On error the
+        transaction is rolled back and the rows stay pending; while max_queue
+        rows are pending, new rows wait in the queue (and overflow as dropped).
+        """
+        while self.pending_count < self.max_queue:
+            try:
+                kind, row = self.rows.get_nowait()
+            except queue.Empty:
+                break
+            self.pending.setdefault(kind, []).append(row)
+            self.pending_count += 1
+        if not self.pending_count:
+            return 0
+
+        start = time.perf_counter()
+        with connection:
+            for kind in FLUSH_ORDER:
+                if kind in self.pending:
+                    connection.executemany(INSERTS[kind], self.pending[kind])
+        count = self.pending_count
+        self.pending = {}
+        self.pending_count = 0
+        self.last_flush_ms = (time.perf_counter() - start) * 1000.0
+        self.written += count
+        self.flushes += 1
+        return count
+
+    def prune(self, connection: sqlite3.Connection) -> int:
+        """Delete rows past retention in chunks (short write transactions)"""
+        if not self.retention_days:
+            return 0
+        cutoff = time.time() - self.retention_days * 86400
+        deleted = 0
+        for table, column in (('ampere', 'ts'), ('events', 'ts'), ('weighings', 'ts'),
+                              ('batches', 'started_at')):
+            while True:
+                with connection:
+                    cursor = connection.execute(
+                        f"DELETE FROM {table} WHERE rowid IN "
+                        f"(SELECT rowid FROM {table} WHERE {column} < ? LIMIT ?)",
+                        (cutoff, self.prune_chunk)
+                    )
+                deleted += cursor.rowcount
+                if cursor.rowcount < self.prune_chunk:
+                    break
+                time.sleep(0)  # Let producers' rows queue up between chunks
+        if deleted:
+            print(f"🧹 Batch store: pruned {deleted} rows older than {self.retention_days} days")
+        return deleted
+
+    # Queries (blocking; run them in an executor from asyncio)
+    def recent_batches(self, limit: int = 20, before: float = None) -> List[dict]:
+        """Newest batches first; pass the last started_at as `before` to page"""
+        connection = self._connect(read_only=True)
+        try:
+            rows = connection.execute(
+                "SELECT batch_id, started_at, ended_at, info, summary FROM batches "
+                "WHERE started_at < ? ORDER BY started_at DESC LIMIT ?",
+                (before if before is not None else float('inf'), min(int(limit), 500))
+            ).fetchall()
+            return [self._batch_row(row) for row in rows]
+        finally:
+            connection.close()
+
+    def get_batch(self, batch_id: str, ampere_points: int = 600) -> Optional[dict]:
+        """One batch with its weighings, events and (downsampled) ampere curve"""
+        connection = self._connect(read_only=True)
+        try:
+            row = connection.execute(
+                "SELECT batch_id, started_at, ended_at, info, summary FROM batches WHERE batch_id = ?",
+                (batch_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            batch = self._batch_row(row)
+            batch['weighings'] = [dict(r) for r in connection.execute(
+                "SELECT ts, job_id, material, target, actual, phase, duration_s, close_latency_ms "
+                "FROM weighings WHERE batch_id = ? ORDER BY ts", (batch_id,))]
+            batch['events'] = [
+                {'ts': r['ts'], 'type': r['type'], 'data': json.loads(r['data'] or 'null')}
+                for r in connection.execute(
+                    "SELECT ts, type, data FROM events WHERE batch_id = ? ORDER BY ts", (batch_id,))
+            ]
+            count = connection.execute(
+                "SELECT COUNT(*) FROM ampere WHERE batch_id = ?", (batch_id,)).fetchone()[0]
+            step = max(1, -(-count // ampere_points))
+            batch['ampere'] = [
+                (r['ts'], r['ampere'], r['power']) for r in connection.execute(
+                    "SELECT ts, ampere, power FROM ("
+                    "SELECT ts, ampere, power, ROW_NUMBER() OVER (ORDER BY ts) - 1 AS n "
+                    "FROM ampere WHERE batch_id = ?) WHERE n % ? = 0 ORDER BY ts",
+                    (batch_id, step))
+            ]
+            return batch
+        finally:
+            connection.close()
+
+    @staticmethod
+    def _batch_row(row: sqlite3.Row) -> dict:
+        return {
+            'batch_id': row['batch_id'],
+            'started_at': row['started_at'],
+            'ended_at': row['ended_at'],
+            'info': json.loads(row['info'] or '{}'),
+            'summary': json.loads(row['summary'] or 'null'),
+        }
+
+    def get_stats(self) -> dict:
+        return {
+            'path': self.path,
+            'current_batch': self.current_batch,
+            'writer_alive': bool(self.thread and self.thread.is_alive()),
+            'queued': self.rows.qsize(),
+            'pending': self.pending_count,
+            'written': self.written,
+            'dropped': self.dropped,
+            'flushes': self.flushes,
+            'errors': self.errors,
+            'last_error': self.last_error,
+            'last_flush_ms': None if self.last_flush_ms is None else round(self.last_flush_ms, 2),
+        }
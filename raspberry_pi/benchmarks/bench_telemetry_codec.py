@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Telemetry Codec Microbenchmark
+Compares JSON (current weight_update / ampere_update messages) against the
+bp-bin.v1 binary frames (telemetry_codec.py): encode and decode cost per frame
+and bytes per frame
+
+Usage:
+    python benchmarks/bench_telemetry_codec.py
+"""
+
+import json
+import os
+import sys
+import time
+import timeit
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from telemetry_codec import TelemetryCodec
+
+SCALES = ['pasir', 'batu', 'semen', 'air']
+
+
+def sample_messages():
+    timestamp = int(time.time() * 1000)
+    return {
+        'weight keyframe': {
+            'type': 'weight_update', 'timestamp': timestamp, 'seq': 1042, 'keyframe': True,
+            'weights': {'pasir': 1250.5, 'batu': 873.0, 'semen': 312.4, 'air': 148.9},
+        },
+        'weight delta (1 scale)': {
+            'type': 'weight_update', 'timestamp': timestamp, 'seq': 1043, 'keyframe': False,
+            'weights': {'semen': 313.1},
+        },
+        'ampere + analytics': {
+            'type': 'ampere_update', 'timestamp': timestamp,
+            'data': {
+                'voltage': 229.8, 'ampere': 104.375, 'power': 21540.2, 'energy': 1834521,
+                'frequency': 50.0, 'power_factor': 0.91, 'alarm': False, 'online': True,
+                'timestamp': time.time(),
+            },
+            'analytics': {
+                'ampere': 104.375, 'rolling_mean': 103.2, 'rolling_peak': 109.8, 'window_s': 5.0,
+                'overload': False,
+                'batch': {
+                    'batch_id': 'B-0192', 'active': True, 'duration_s': 84.5, 'samples': 169,
+                    'batch_mean': 98.4, 'batch_peak': 131.2, 'energy_kwh': 0.4812,
+                    'water_dosed': True, 'time_to_plateau_s': 21.5, 'plateau_ampere': 103.4,
+                },
+            },
+        },
+    }
+
+
+def per_frame_ns(func, number: int = 20000, repeat: int = 5) -> float:
+    best = min(timeit.repeat(func, number=number, repeat=repeat))
+    return best / number * 1e9
+
+
+def main():
+    codec = TelemetryCodec(SCALES)
+    print("Telemetry codec benchmark (JSON text vs bp-bin.v1 binary)\n")
+    print(f"  {'message':<24} {'bytes':>12} {'encode ns':>16} {'decode ns':>16}")
+    print(f"  {'':<24} {'json/bin':>12} {'json/bin':>16} {'json/bin':>16}")
+
+    for label, message in sample_messages().items():
+        encode = codec.encoder_for(message['type'])
+        json_frame = json.dumps(message)
+        binary_frame = encode(message)
+
+        json_encode = per_frame_ns(lambda: json.dumps(message))
+        binary_encode = per_frame_ns(lambda: encode(message))
+        json_decode = per_frame_ns(lambda: json.loads(json_frame))
+        binary_decode = per_frame_ns(lambda: codec.decode(binary_frame))
+
+        print(f"  {label:<24} {len(json_frame.encode()):>5}/{len(binary_frame):<6}"
+              f" {json_encode:>7.0f}/{binary_encode:<8.0f} {json_decode:>7.0f}/{binary_decode:<8.0f}")
+
+    # Bandwidth at closed-loop display rates (one client, weights only)
+    keyframe = sample_messages()['weight keyframe']
+    json_bytes = len(json.dumps(keyframe).encode())
+    binary_bytes = len(codec.encode_weights(keyframe))
+    print()
+    for rate in (10, 50, 100):
+        print(f"  weights @ {rate:>3} Hz: JSON {json_bytes * rate / 1024:6.1f} KiB/s, "
+              f"binary {binary_bytes * rate / 1024:6.1f} KiB/s per client")
+
+
+if __name__ == "__main__":
+    main()
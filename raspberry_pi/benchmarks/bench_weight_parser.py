@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Weight Parser Microbenchmark
+Compares the bytes-level profile parser (weight_parser.py) against the
+previous string-based ScaleReader.parse_weight on recorded indicator frames
+
+Usage:
+    python benchmarks/bench_weight_parser.py [capture_file]
+
+capture_file is a raw byte capture of one or more indicators
+(e.g. `cat /dev/ttyUSB0 > pasir.cap`); defaults to sample_frames.txt.
+"""
+
+import os
+import re
+import sys
+import timeit
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from weight_parser import WeightParser, PROFILE_PATTERNS
+
+
+def legacy_parse_weight(data: str):
+    """ScaleReader.parse_weight before the profile parser (regex escaping fixed)"""
+    try:
+        # Remove common prefixes and units
+        cleaned = data.upper()
+        cleaned = cleaned.replace('WT:', '')
+        cleaned = cleaned.replace('GROSS:', '')
+        cleaned = cleaned.replace('NET:', '')
+        cleaned = cleaned.replace('KG', '')
+        cleaned = cleaned.replace('\r', '')
+        cleaned = cleaned.replace('\n', '')
+        cleaned = cleaned.strip()
+
+        # Extract floating point number (including negative)
+        match = re.search(r'[+-]?\d+\.?\d*', cleaned)
+        if match:
+            weight = float(match.group())
+            # Sanity check
+            if -10000 <= weight <= 10000:
+                return weight
+        return None
+    except Exception as e:
+        print(f"Error parsing weight from '{data}': {e}")
+        return None
+
+
+def load_frames(path: str):
+    with open(path, 'rb') as f:
+        return [line for line in f.read().split(b'\n') if line.strip()]
+
+
+def bench(label: str, func, frames, repeat: int = 5):
+    number = max(1, 20000 // len(frames))
+    best = min(timeit.repeat(lambda: [func(frame) for frame in frames],
+                             number=number, repeat=repeat))
+    ns_per_frame = best / (number * len(frames)) * 1e9
+    print(f"  {label:<34} {ns_per_frame:8.0f} ns/frame")
+    return ns_per_frame
+
+
+def main():
+    default_path = os.path.join(os.path.dirname(__file__), 'sample_frames.txt')
+    path = sys.argv[1] if len(sys.argv) > 1 else default_path
+    frames = load_frames(path)
+    print(f"Weight parser benchmark: {len(frames)} frames from {os.path.basename(path)}\n")
+
+    # Legacy parser got decoded text lines
+    legacy = bench("legacy parse_weight (decode+str)",
+                   lambda frame: legacy_parse_weight(frame.decode('ascii', errors='ignore')),
+                   frames)
+
+    generic = WeightParser('generic')
+    results = {"generic": bench("profile 'generic' (bytes)", generic.parse, frames)}
+
+    # Each dedicated profile on the frames it understands
+    for profile in PROFILE_PATTERNS:
+        if profile == 'generic':
+            continue
+        parser = WeightParser(profile)
+        matching = [frame for frame in frames if parser.parse(frame) is not None]
+        if not matching:
+            continue
+        legacy_subset = bench(f"legacy on {profile} frames ({len(matching)})",
+                              lambda frame: legacy_parse_weight(frame.decode('ascii', errors='ignore')),
+                              matching)
+        results[profile] = bench(f"profile '{profile}' (bytes)", parser.parse, matching)
+        print(f"  {'speedup':<34} {legacy_subset / results[profile]:8.1f}x\n")
+
+    print(f"Overall generic speedup: {legacy / results['generic']:.1f}x")
+
+    # Sanity: generic profile agrees with the legacy parser
+    mismatches = 0
+    for frame in frames:
+        old = legacy_parse_weight(frame.decode('ascii', errors='ignore'))
+        new = generic.parse(frame)
+        new_weight = None if new is None or new.overload else new.weight
+        if old != new_weight:
+            mismatches += 1
+    print(f"Frames where generic profile differs from legacy: {mismatches}")
+
+
+if __name__ == "__main__":
+    main()
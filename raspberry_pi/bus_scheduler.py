@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+Bus Scheduler Module
+Priority-scheduled arbiter for a half-duplex RS-485 Modbus RTU bus
+
+One worker thread owns the bus. Requests are served by priority class
+(emergency > safety writes > process writes > periodic reads), FIFO within a
+class, with a minimum silent gap between frames (per slave if configured).
+Requests sharing a batch key can be merged into one transaction.
+"""
+
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional
+
+# Priority classes (lower value = served first)
+PRIORITY_EMERGENCY = 0
+PRIORITY_SAFETY = 1
+PRIORITY_PROCESS = 2
+PRIORITY_READ = 3
+
+PRIORITY_NAMES = {
+    PRIORITY_EMERGENCY: 'emergency',
+    PRIORITY_SAFETY: 'safety',
+    PRIORITY_PROCESS: 'process',
+    PRIORITY_READ: 'read',
+}
+
+
+def rtu_frame_gap(baudrate: int) -> float:
+    """Modbus RTU inter-frame silence: 3.5 character times (11 bits/char), min 1.75ms"""
+    if baudrate > 19200:
+        return 0.00175
+    return 3.5 * 11.0 / baudrate
+
+
+class BusRequest:
+    __slots__ = ('func', 'args', 'future', 'priority', 'slave', 'batch_key', 'enqueued_at')
+
+    def __init__(self, func, args, future, priority, slave, batch_key):
+        self.func = func
+        self.args = args
+        self.future = future
+        self.priority = priority
+        self.slave = slave
+        self.batch_key = batch_key
+        self.enqueued_at = time.monotonic()
+
+
+class BusScheduler:
+    def __init__(self, name: str, inter_frame_gap: float = 0.004,
+                 slave_gaps: Optional[Dict[int, float]] = None,
+                 coalesce_window: float = 0.0):
+        """
+        Args:
+            name: Thread name / log label
+            inter_frame_gap: Minimum bus silence between any two frames (s)
+            slave_gaps: Extra turnaround per slave id (s), e.g. slow modules
+            coalesce_window: Time to wait for more batchable requests (s)
+        """
+        self.name = name
+        self.inter_frame_gap = inter_frame_gap
+        self.slave_gaps = slave_gaps or {}
+        self.coalesce_window = coalesce_window
+
+        self._heap: List[tuple] = []
+        self._collecting: List[BusRequest] = []  # Batch being coalesced (not yet on the bus)
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+        self._batch_handlers: Dict[str, Callable] = {}
+
+        self._last_frame_end = 0.0
+        self._last_slave_end: Dict[int, float] = {}
+
+        # Statistics per priority class
+        self._stats = {
+            priority: {'requests': 0, 'transactions': 0, 'wait_total': 0.0, 'wait_max': 0.0}
+            for priority in PRIORITY_NAMES
+        }
+
+    def register_batch_handler(self, batch_key: str, handler: Callable[[List[tuple]], List]):
+        """
+        handler(list_of_args) → list of results (one per request), executed as
+        a single bus transaction for requests with the same batch_key
+        """
+        self._batch_handlers[batch_key] = handler
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._worker, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """Stop after the queued requests have been served"""
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        if self._thread:
+            self._thread.join(timeout=timeout)
+
+    def submit(self, func: Callable, *args, priority: int = PRIORITY_PROCESS,
+               slave: Optional[int] = None, batch_key: Optional[str] = None) -> Future:
+        """
+        Queue a bus transaction
+        Returns:
+            concurrent.futures.Future with the transaction result
+        """
+        future = Future()
+        request = BusRequest(func, args, future, priority, slave, batch_key)
+
+        if threading.current_thread() is self._thread:
+            # Already on the bus: run inline instead of deadlocking
+            future.set_running_or_notify_cancel()
+            self._execute(request)
+            return future
+
+        with self._cond:
+            heapq.heappush(self._heap, (priority, next(self._counter), request))
+            self._stats[priority]['requests'] += 1
+            self._cond.notify()
+        return future
+
+    def take(self, predicate: Callable[[BusRequest], bool]) -> List[BusRequest]:
+        """
+        Remove requests matching predicate that have not reached the bus yet,
+        queued or waiting in a batch being coalesced, without resolving them
+        """
+        with self._cond:
+            kept, taken = [], []
+            for entry in self._heap:
+                (taken if predicate(entry[2]) else kept).append(entry)
+            heapq.heapify(kept)
+            self._heap = kept
+            taken = [request for _, _, request in taken]
+            for request in [queued for queued in self._collecting if predicate(queued)]:
+                self._collecting.remove(request)
+                taken.append(request)
+        return taken
+
+    def flush(self, predicate: Callable[[BusRequest], bool], result=None) -> int:
+        """
+        Drop requests matching predicate, resolving them with `result`
+        (e.g. discard pending relay-ON writes before an emergency stop)
+        """
+        dropped = self.take(predicate)
+        for request in dropped:
+            if request.future.set_running_or_notify_cancel():
+                request.future.set_result(result)
+        return len(dropped)
+
+    def queue_depth(self) -> Dict[str, int]:
+        with self._cond:
+            depth = {name: 0 for name in PRIORITY_NAMES.values()}
+            for priority, _, _ in self._heap:
+                depth[PRIORITY_NAMES[priority]] += 1
+            return depth
+
+    def get_stats(self) -> dict:
+        """Queue depth and wait times (ms) per priority class"""
+        depth = self.queue_depth()
+        stats = {}
+        for priority, name in PRIORITY_NAMES.items():
+            entry = self._stats[priority]
+            served = entry['transactions']
+            stats[name] = {
+                'queued': depth[name],
+                'requests': entry['requests'],
+                'served': served,
+                'wait_avg_ms': round(entry['wait_total'] / served * 1000.0, 2) if served else 0.0,
+                'wait_max_ms': round(entry['wait_max'] * 1000.0, 2),
+            }
+        return stats
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while self._running and not self._heap:
+                    self._cond.wait()
+                if not self._heap:
+                    break  # Stopped and drained
+                _, _, request = heapq.heappop(self._heap)
+                # take()/flush() can still remove requests from the batch
+                # until it leaves the lock
+                self._collecting = [request]
+
+                if request.batch_key in self._batch_handlers:
+                    deadline = time.monotonic() + self.coalesce_window
+                    while self._collecting:
+                        # Merge while the next request in line is batchable;
+                        # anything more urgent ends the batch immediately
+                        if self._heap:
+                            priority, _, queued = self._heap[0]
+                            if priority != request.priority or queued.batch_key != request.batch_key:
+                                break
+                            heapq.heappop(self._heap)
+                            self._collecting.append(queued)
+                            continue
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0 or not self._running:
+                            break
+                        self._cond.wait(remaining)
+                batch, self._collecting = self._collecting, []
+
+            batch = [queued for queued in batch if queued.future.set_running_or_notify_cancel()]
+            if not batch:
+                continue  # Superseded, or callers gave up before the bus was free
+            request = batch[0]
+
+            self._wait_for_gap(request.slave)
+            started = time.monotonic()
+            for queued in batch:
+                self._record_wait(queued, started)
+
+            if len(batch) == 1:
+                self._execute(batch[0])
+            else:
+                self._execute_batch(batch)
+
+            now = time.monotonic()
+            self._last_frame_end = now
+            if request.slave is not None:
+                self._last_slave_end[request.slave] = now
+
+    def _wait_for_gap(self, slave: Optional[int]):
+        ready_at = self._last_frame_end + self.inter_frame_gap
+        if slave is not None and slave in self.slave_gaps:
+            ready_at = max(ready_at, self._last_slave_end.get(slave, 0.0) + self.slave_gaps[slave])
+        delay = ready_at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def _record_wait(self, request: BusRequest, started: float):
+        wait = started - request.enqueued_at
+        entry = self._stats[request.priority]
+        entry['transactions'] += 1
+        entry['wait_total'] += wait
+        if wait > entry['wait_max']:
+            entry['wait_max'] = wait
+
+    def _execute(self, request: BusRequest):
+        try:
+            request.future.set_result(request.func(*request.args))
+        except Exception as e:
+            request.future.set_exception(e)
+
+    def _execute_batch(self, batch: List[BusRequest]):
+        handler = self._batch_handlers[batch[0].batch_key]
+        try:
+            results = handler([queued.args for queued in batch])
+        except Exception as e:
+            for queued in batch:
+                queued.future.set_exception(e)
+            return
+        for queued, result in zip(batch, results):
+            queued.future.set_result(result)
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Client Outbox Module
+Per-client bounded send queue for WebSocket broadcasts
+
+Each connected client gets its own sender task, so one slow consumer never
+delays the others or the broadcast loop. Frames posted with a topic (e.g.
+"weights") are latest-value-wins: a newer frame replaces one that has not been
+sent yet. Frames without a topic (events, deltas) are queued in order; a client
+that lets more than max_pending of them pile up, or whose send stalls longer
+than stall_timeout, is disconnected.
+
+Subscription holds the topics a client asked for and its max update rate.
+"""
+
+import asyncio
+from collections import deque
+from typing import Dict, Iterable, Optional, Union
+
+TOPICS = ('weights', 'motion', 'ampere', 'relays', 'buttons', 'alarms', 'weighing')
+
+# High-rate topics: latest-value-wins and subject to max_rate_hz
+STREAM_TOPICS = ('weights', 'motion', 'ampere')
+
+
+class Subscription:
+    """Topics a client receives and the minimum interval per stream topic"""
+
+    def __init__(self):
+        self.topics = set(TOPICS)               # Default: everything, full rate
+        self.min_interval: Dict[str, float] = {}
+        self.last_sent: Dict[str, float] = {}
+        self.weight_seq = 0                     # Last weight_update seq queued
+
+    def update(self, topics: Optional[Iterable[str]],
+               max_rate_hz: Union[float, Dict[str, float], None]) -> dict:
+        """
+        Args:
+            topics: Topic names (None = keep current); unknown names are ignored
+            max_rate_hz: One rate for all stream topics, {topic: rate}, or None/0 = unlimited
+        """
+        if topics is not None:
+            self.topics = {topic for topic in topics if topic in TOPICS}
+
+        if isinstance(max_rate_hz, dict):
+            rates = max_rate_hz
+        else:
+            rates = {topic: max_rate_hz for topic in STREAM_TOPICS}
+        self.min_interval = {
+            topic: 1.0 / float(rate) for topic, rate in rates.items()
+            if topic in STREAM_TOPICS and rate
+        }
+        return {
+            'topics': sorted(self.topics),
+            'max_rate_hz': {topic: round(1.0 / interval, 3) for topic, interval in self.min_interval.items()},
+        }
+
+    def wants(self, topic: Optional[str]) -> bool:
+        return topic is None or topic in self.topics
+
+    def due(self, topic: str, now: float) -> bool:
+        """True if a rate-limited stream topic may be sent again"""
+        interval = self.min_interval.get(topic)
+        if not interval:
+            return True
+        last = self.last_sent.get(topic)
+        return last is None or now - last >= interval
+
+    def mark(self, topic: str, now: float):
+        self.last_sent[topic] = now
+
+
+class ClientOutbox:
+    def __init__(self, websocket, client_id: str, max_pending: int = 64,
+                 stall_timeout: float = 5.0, binary: bool = False):
+        self.websocket = websocket
+        self.client_id = client_id
+        self.binary = binary                     # Negotiated binary telemetry frames
+        self.subscription = Subscription()
+        self.max_pending = max_pending
+        self.stall_timeout = stall_timeout
+
+        self.queue = deque()                     # Ordered frames
+        self.latest: Dict[str, object] = {}      # topic → newest unsent frame
+        self.closed = False
+        self.sent = 0
+        self.superseded = 0                      # Topic frames replaced before sending
+
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._sender())
+
+    def post(self, frame, topic: Optional[str] = None) -> bool:
+        """
+        Queue an encoded frame (str or bytes) without waiting
+        Returns:
+            False if the client is over its limit and is being disconnected
+        """
+        if self.closed:
+            return False
+        if topic is not None:
+            if topic in self.latest:
+                self.superseded += 1
+            self.latest[topic] = frame
+        elif len(self.queue) >= self.max_pending:
+            self.close(f"outbox full ({self.max_pending} frames)")
+            return False
+        else:
+            self.queue.append(frame)
+        self._wakeup.set()
+        return True
+
+    def pending(self) -> int:
+        return len(self.queue) + len(self.latest)
+
+    def close(self, reason: str = None):
+        """Stop the sender and close the connection (idempotent)"""
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.clear()
+        self.latest.clear()
+        self._task.cancel()
+        if reason:
+            print(f"⚠️  Disconnecting slow client {self.client_id}: {reason}")
+            # 1008 = policy violation
+            asyncio.ensure_future(self.websocket.close(code=1008, reason='slow consumer'))
+
+    async def _sender(self):
+        try:
+            while not self.closed:
+                await self._wakeup.wait()
+                self._wakeup.clear()
+
+                while self.queue or self.latest:
+                    if self.queue:
+                        frame = self.queue.popleft()
+                    else:
+                        topic = next(iter(self.latest))
+                        frame = self.latest.pop(topic)
+
+                    try:
+                        await asyncio.wait_for(self.websocket.send(frame), self.stall_timeout)
+                    except asyncio.TimeoutError:
+                        self.close(f"send stalled > {self.stall_timeout}s")
+                        return
+                    self.sent += 1
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            # Connection closed; handle_client cleans up
+            self.closed = True
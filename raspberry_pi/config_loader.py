@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+Config Loader Module
+Loads config_autonics.json and applies a named profile on top of it
+
+A profile is an entry of the top-level "profiles" block holding only the
+keys that differ, merged recursively into the base config (dicts merge,
+everything else replaces), e.g. "simulator" points every port at the
+pseudo-terminals created by the hardware simulator.
+"""
+
+import json
+from typing import Optional
+
+
+def deep_merge(base: dict, override: dict) -> dict:
+    """Copy of base with override merged in (nested dicts merge, other values replace)"""
+    merged = dict(base)
+    for key, value in override.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = deep_merge(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
+def load_config(config_file: str, profile: Optional[str] = None) -> dict:
+    with open(config_file, 'r') as f:
+        config = json.load(f)
+    if profile:
+        profiles = config.get('profiles', {})
+        if profile not in profiles:
+            raise ValueError(f"Unknown config profile '{profile}' (available: {', '.join(profiles) or 'none'})")
+        config = deep_merge(config, profiles[profile])
+        config['profile'] = profile
+    return config
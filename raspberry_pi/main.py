@@ -10,7 +10,7 @@ Features:
 - Safety monitoring and watchdog timer
 """
 
-import json
+import argparse
 import time
 import signal
 import sys
@@ -23,19 +23,25 @@ from scale_reader import ScaleReader
 from modbus_controller import ModbusController
 from websocket_server import WebSocketServer
 from ampere_reader import AmpereReader
+from mixer_analytics import MixerAnalytics
+from physical_buttons import PhysicalButtons
+from weighing_engine import WeighingEngine
+from safety_supervisor import SafetySupervisor
+from batch_store import BatchStore
+from traffic_recorder import TrafficRecorder
+from config_loader import load_config
 from utils.logger import setup_logger
 
 class BatchPlantController:
-    def __init__(self, config_file='config_autonics.json'):
+    def __init__(self, config_file='config_autonics.json', profile=None):
         print("=" * 60)
         print("  BATCH PLANT CONTROLLER - Autonics System")
         print("=" * 60)
         
-        # Load configuration
-        with open(config_file, 'r') as f:
-            self.config = json.load(f)
+        # Load configuration (plus profile overrides, e.g. "simulator")
+        self.config = load_config(config_file, profile)
         
-        print(f"✅ Configuration loaded from {config_file}")
+        print(f"✅ Configuration loaded from {config_file}{f' (profile {profile})' if profile else ''}")
         
         # Setup logger
         self.logger = setup_logger('BatchPlant', 'batch_plant.log')
@@ -43,23 +49,76 @@ class BatchPlantController:
         # Initialize modules
         print("\\nInitializing modules...")
         
-        self.scale_reader = ScaleReader(self.config)
-        self.modbus_controller = ModbusController(self.config)
+        # Raw serial / Modbus / HMI capture for offline replay (default off)
+        self.traffic_recorder = None
+        if self.config.get('traffic_capture', {}).get('enabled', False):
+            self.traffic_recorder = TrafficRecorder(self.config)
+            self.traffic_recorder.start()
+        
+        self.scale_reader = ScaleReader(self.config, self.traffic_recorder)
+        self.modbus_controller = ModbusController(self.config, self.traffic_recorder)
         
         # Initialize ampere meter (optional)
         self.ampere_reader = None
         if self.config.get('ampere_meter', {}).get('enabled', False):
             try:
-                self.ampere_reader = AmpereReader(self.config)
+                self.ampere_reader = AmpereReader(self.config, self.traffic_recorder)
                 print("✅ Ampere meter (PZEM-016) initialized")
             except Exception as e:
                 print(f"⚠️ Ampere meter disabled: {e}")
         
+        # Mixer load-curve analytics on the ampere meter stream (default on)
+        self.mixer_analytics = None
+        if self.ampere_reader and self.config.get('mixer_analytics', {}).get('enabled', True):
+            self.mixer_analytics = MixerAnalytics(self.config, self.ampere_reader)
+        
+        # Initialize closed-loop weighing engine (default on)
+        self.weighing_engine = None
+        if self.config.get('weighing_engine', {}).get('enabled', True):
+            self.weighing_engine = WeighingEngine(
+                self.config,
+                self.scale_reader,
+                self.modbus_controller
+            )
+        
+        # Watchdog / door / weight-spike supervision on its own thread
+        self.safety_supervisor = SafetySupervisor(
+            self.config,
+            self.scale_reader,
+            self.modbus_controller,
+            self.weighing_engine
+        )
+        
+        # Durable batch history (SQLite WAL, background bulk writer)
+        self.batch_store = None
+        if self.config.get('batch_store', {}).get('enabled', True):
+            self.batch_store = BatchStore(
+                self.config,
+                self.weighing_engine,
+                self.modbus_controller,
+                self.ampere_reader,
+                self.mixer_analytics,
+                self.safety_supervisor
+            )
+        
+        # Server-side actions for ESP32 panel buttons
+        self.physical_buttons = PhysicalButtons(
+            self.config,
+            self.modbus_controller,
+            self.weighing_engine
+        )
+        
         self.websocket_server = WebSocketServer(
             self.config,
             self.scale_reader,
             self.modbus_controller,
-            self.ampere_reader
+            self.ampere_reader,
+            self.weighing_engine,
+            self.mixer_analytics,
+            self.physical_buttons,
+            self.safety_supervisor,
+            self.batch_store,
+            self.traffic_recorder
         )
         
         # Setup signal handlers for graceful shutdown
@@ -81,6 +140,11 @@ class BatchPlantController:
         try:
             # Start scale reader
             self.scale_reader.start()
+            if self.ampere_reader:
+                self.ampere_reader.start()
+            self.safety_supervisor.start()
+            if self.batch_store:
+                self.batch_store.start()
             time.sleep(1)  # Give scales time to initialize
             
             # Start WebSocket server (blocking)
@@ -104,7 +168,12 @@ class BatchPlantController:
         
         # Stop all modules
         self.websocket_server.running = False
+        self.safety_supervisor.stop()
         self.scale_reader.stop()
+        if self.ampere_reader:
+            self.ampere_reader.stop()
+        if self.weighing_engine:
+            self.weighing_engine.cancel_all()
         
         # Turn off all relays
         print("🔌 Turning off all relays...")
@@ -113,15 +182,26 @@ class BatchPlantController:
         # Cleanup Modbus
         self.modbus_controller.cleanup()
         
+        # Flush the batch log last (records the shutdown's relay changes)
+        if self.batch_store:
+            self.batch_store.stop()
+        if self.traffic_recorder:
+            self.traffic_recorder.stop()
+        
         print("✅ Shutdown complete\\n")
 
 def main():
     """Main entry point"""
     
+    parser = argparse.ArgumentParser(description="Batch Plant Controller (Autonics System)")
+    parser.add_argument('--config', default='config_autonics.json', help="Configuration file")
+    parser.add_argument('--profile', help="Config profile to apply (e.g. simulator)")
+    args = parser.parse_args()
+    
     print("✅ Starting Batch Plant Controller (Autonics System)")
     
     # Create and start controller
-    controller = BatchPlantController()
+    controller = BatchPlantController(args.config, args.profile)
     controller.start()
 
 if __name__ == "__main__":
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Mixer Analytics Module
+Streaming load-curve statistics for the mixer motor, computed on every
+PZEM-016 sample: rolling mean/peak, batch energy (kWh), time-to-plateau after
+water dosing (the plateau current is what the slump estimate is based on) and
+a mixer-overload event raised at sample time.
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Callable, List, Optional
+from sample_buffer import SampleRing
+
+
+class MixerBatch:
+    """Per-batch accumulators; all updated incrementally, O(1) per sample"""
+
+    def __init__(self, batch_id: str, history_size: int, started_at: float):
+        self.batch_id = batch_id
+        self.started_at = started_at
+        self.ended_at: Optional[float] = None
+        self.series = SampleRing(history_size)   # Mixer current over the batch
+
+        self.samples = 0
+        self.ampere_sum = 0.0
+        self.peak_ampere = 0.0
+        self.energy_kwh = 0.0
+        self.last_time: Optional[float] = None
+        self.last_power = 0.0
+
+        self.water_dosed_at: Optional[float] = None
+        self.plateau_at: Optional[float] = None
+        self.plateau_ampere: Optional[float] = None
+
+    def add(self, t: float, ampere: float, power: float):
+        self.series.append(t, ampere)
+        self.samples += 1
+        self.ampere_sum += ampere
+        if ampere > self.peak_ampere:
+            self.peak_ampere = ampere
+
+        # Trapezoidal integral of active power
+        if self.last_time is not None:
+            dt = t - self.last_time
+            self.energy_kwh += (self.last_power + power) * 0.5 * dt / 3600000.0
+        self.last_time = t
+        self.last_power = power
+
+    def to_dict(self, now: float) -> dict:
+        end = self.ended_at if self.ended_at is not None else now
+        time_to_plateau = None
+        if self.plateau_at is not None:
+            time_to_plateau = round(self.plateau_at - self.water_dosed_at, 2)
+        return {
+            'batch_id': self.batch_id,
+            'active': self.ended_at is None,
+            'duration_s': round(end - self.started_at, 2),
+            'samples': self.samples,
+            'batch_mean': round(self.ampere_sum / self.samples, 3) if self.samples else 0.0,
+            'batch_peak': round(self.peak_ampere, 3),
+            'energy_kwh': round(self.energy_kwh, 4),
+            'water_dosed': self.water_dosed_at is not None,
+            'time_to_plateau_s': time_to_plateau,
+            'plateau_ampere': (round(self.plateau_ampere, 2)
+                               if self.plateau_ampere is not None else None),
+        }
+
+
+class MixerAnalytics:
+    def __init__(self, config: dict, ampere_reader):
+        self.config = config.get('mixer_analytics', {})
+        self.ampere_reader = ampere_reader
+
+        self.window = self.config.get('window_seconds', 5.0)
+        self.history_size = self.config.get('history_size', 7200)
+        self.overload_ampere = self.config.get('overload_ampere', 140.0)
+        self.overload_clear_ampere = self.config.get('overload_clear_ampere',
+                                                     self.overload_ampere - 10.0)
+        self.overload_samples = self.config.get('overload_samples', 2)
+        self.plateau_band = self.config.get('plateau_band_ratio', 0.03)
+        self.plateau_min_band = self.config.get('plateau_min_band_ampere', 1.0)
+
+        # Rolling window: running sum plus monotonic deques for max/min
+        self.window_samples = deque()   # (t, ampere)
+        self.window_sum = 0.0
+        self.window_max = deque()
+        self.window_min = deque()
+
+        self.latest_ampere = 0.0
+        self.overload = False
+        self.overload_count = 0
+
+        self.batch: Optional[MixerBatch] = None
+        self.lock = threading.Lock()
+        self.event_listeners: List[Callable[[dict], None]] = []
+
+        ampere_reader.add_sample_listener(self.on_sample)
+
+        print("✅ Mixer analytics initialized")
+
+    def add_event_listener(self, callback: Callable[[dict], None]):
+        """Register callback(event) for overload/plateau events"""
+        self.event_listeners.append(callback)
+
+    def start_batch(self, batch_id: str) -> dict:
+        """Start a new per-batch series (replaces any previous batch)"""
+        with self.lock:
+            self.batch = MixerBatch(batch_id, self.history_size, time.monotonic())
+            print(f"🌀 Mixer analytics: batch {batch_id} started")
+            return self.batch.to_dict(self.batch.started_at)
+
+    def end_batch(self) -> Optional[dict]:
+        """Freeze the current batch and return its summary"""
+        with self.lock:
+            if not self.batch:
+                return None
+            if self.batch.ended_at is None:
+                self.batch.ended_at = time.monotonic()
+            return self.batch.to_dict(self.batch.ended_at)
+
+    def mark_water_dosed(self) -> bool:
+        """Start the time-to-plateau measurement (after water has been dosed)"""
+        with self.lock:
+            if not self.batch or self.batch.ended_at is not None:
+                return False
+            self.batch.water_dosed_at = time.monotonic()
+            self.batch.plateau_at = None
+            self.batch.plateau_ampere = None
+            return True
+
+    def on_sample(self, data: dict, t: float):
+        """AmpereReader sample (sampler thread)"""
+        ampere = data['ampere']
+        events = []
+
+        with self.lock:
+            self.latest_ampere = ampere
+            self._update_window(t, ampere)
+
+            batch = self.batch
+            if batch and batch.ended_at is None:
+                batch.add(t, ampere, data['power'])
+                if batch.water_dosed_at is not None and batch.plateau_at is None:
+                    if self._check_plateau(batch):
+                        events.append(self._event('mixer_plateau', batch.to_dict(t)))
+
+            # Overload: N consecutive samples above the limit, latched with hysteresis
+            if not self.overload:
+                self.overload_count = self.overload_count + 1 if ampere >= self.overload_ampere else 0
+                if self.overload_count >= self.overload_samples:
+                    self.overload = True
+                    events.append(self._event('mixer_overload', {'ampere': ampere,
+                                                                 'limit': self.overload_ampere}))
+            elif ampere < self.overload_clear_ampere:
+                self.overload = False
+                self.overload_count = 0
+                events.append(self._event('mixer_overload_cleared', {'ampere': ampere}))
+
+        for event in events:
+            if event['type'] == 'mixer_overload':
+                print(f"🚨 Mixer overload: {ampere:.1f}A ≥ {self.overload_ampere}A")
+            for callback in self.event_listeners:
+                try:
+                    callback(event)
+                except Exception as e:
+                    print(f"⚠️  Mixer analytics listener error: {e}")
+
+    def _update_window(self, t: float, ampere: float):
+        self.window_samples.append((t, ampere))
+        self.window_sum += ampere
+        while self.window_max and self.window_max[-1][1] <= ampere:
+            self.window_max.pop()
+        self.window_max.append((t, ampere))
+        while self.window_min and self.window_min[-1][1] >= ampere:
+            self.window_min.pop()
+        self.window_min.append((t, ampere))
+
+        cutoff = t - self.window
+        while self.window_samples[0][0] < cutoff:
+            _, old = self.window_samples.popleft()
+            self.window_sum -= old
+        while self.window_max[0][0] < cutoff:
+            self.window_max.popleft()
+        while self.window_min[0][0] < cutoff:
+            self.window_min.popleft()
+
+    def _check_plateau(self, batch: MixerBatch) -> bool:
+        """Plateau = a full window after dosing whose spread is within the band"""
+        window_start = self.window_samples[0][0]
+        latest = self.window_samples[-1][0]
+        if window_start < batch.water_dosed_at or latest - window_start < self.window * 0.9:
+            return False
+        mean = self.window_sum / len(self.window_samples)
+        spread = self.window_max[0][1] - self.window_min[0][1]
+        if spread > max(self.plateau_band * mean, self.plateau_min_band):
+            return False
+        batch.plateau_at = window_start
+        batch.plateau_ampere = mean
+        return True
+
+    def _event(self, event_type: str, payload: dict) -> dict:
+        event = {'type': event_type, 'timestamp': int(time.time() * 1000)}
+        event.update(payload)
+        return event
+
+    def get_snapshot(self) -> dict:
+        """Rolling and per-batch statistics (no I/O)"""
+        with self.lock:
+            count = len(self.window_samples)
+            snapshot = {
+                'ampere': round(self.latest_ampere, 3),
+                'rolling_mean': round(self.window_sum / count, 3) if count else 0.0,
+                'rolling_peak': round(self.window_max[0][1], 3) if count else 0.0,
+                'window_s': self.window,
+                'overload': self.overload,
+                'batch': None,
+            }
+            if self.batch:
+                snapshot['batch'] = self.batch.to_dict(time.monotonic())
+            return snapshot
+
+    def get_series(self, since_seq: int = 0) -> Optional[dict]:
+        """Batch current series since a cursor; times relative to batch start (s)"""
+        with self.lock:
+            batch = self.batch
+        if not batch:
+            return None
+        samples = batch.series.get_since(since_seq)
+        return {
+            'batch_id': batch.batch_id,
+            'first_seq': samples.first_seq,
+            'next_seq': samples.next_seq,
+            'missed': samples.missed,
+            't': [round(t - batch.started_at, 3) for t in samples.timestamps],
+            'ampere': [round(value, 3) for value in samples.values],
+        }
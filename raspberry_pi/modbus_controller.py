@@ -3,22 +3,98 @@
 Modbus Controller Module
 Controls 24 relay outputs via Autonics ARM-DO08P-4S + 2x ARX-DO08P-4S
 Using Modbus RTU protocol over RS-485
+
+All bus transactions go through a priority BusScheduler (bus_scheduler.py)
+with a single bus-worker thread: emergency > safety writes > process writes >
+periodic reads. A new write to a coil supersedes any write to the same coil
+not yet on the bus, so the last request wins regardless of priority. Synchronous
+methods wait for their result; *_async methods await it from the asyncio loop,
+so a slow or absent module only delays the caller, never the event loop.
+
+A background poller reads the coils every poll_interval_ms; get_status answers
+from that readback while it is fresh, and relay listeners are told which coils
+changed in hardware.
 """
 
 from pymodbus.client import ModbusSerialClient
 from pymodbus.exceptions import ModbusException
+import asyncio
+import threading
 import time
-from typing import Dict, Optional
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Dict, Optional, Callable, List
+from bus_scheduler import (
+    BusScheduler, rtu_frame_gap,
+    PRIORITY_EMERGENCY, PRIORITY_PROCESS, PRIORITY_READ
+)
+
+# ARM-DO08P-4S + 2x ARX-DO08P-4S
+COIL_COUNT = 24
+
+# Batch key for coalescable single-coil writes
+COIL_WRITE = 'coil_write'
+
+# Client calls captured by a TrafficRecorder
+RECORDED_CALLS = ('write_coil', 'write_coils', 'read_coils')
+
+def bits_to_mask(bits) -> int:
+    """Coil bit list (index = coil address) → integer bitmask"""
+    mask = 0
+    for coil_address, bit in enumerate(bits):
+        if bit:
+            mask |= 1 << coil_address
+    return mask
+
+def iter_bits(mask: int):
+    """Yield coil addresses of the set bits in a mask (lowest first)"""
+    while mask:
+        low_bit = mask & -mask
+        yield low_bit.bit_length() - 1
+        mask ^= low_bit
 
 class ModbusController:
-    def __init__(self, config: dict):
+    def __init__(self, config: dict, recorder=None, client=None):
+        """
+        Args:
+            recorder: TrafficRecorder capturing every bus call (optional)
+            client: Bus client to use instead of a ModbusSerialClient on
+                modbus.port (e.g. the simulated module of traffic_replay.py)
+        """
         self.config = config
         self.modbus_config = config['modbus']
         self.relay_mapping = config['relay_mapping']
-        self.relay_states = {}
+        
+        # Forward / reverse indexes built once from relay_mapping
+        self.coil_by_name: Dict[str, int] = dict(self.relay_mapping)
+        self.name_by_coil: Dict[int, str] = {
+            coil_address: name for name, coil_address in self.relay_mapping.items()
+        }
+        self.all_coils_mask = (1 << COIL_COUNT) - 1
+        
+        # Default time an async caller waits for its bus transaction
+        self.request_timeout = self.modbus_config.get('request_timeout', 2.0)
+        
+        # Coil write coalescing: single-coil writes queued while the bus is busy
+        # (or arriving within the window) go out as one FC15 transaction
+        self.coalesce_writes = self.modbus_config.get('coalesce_writes', True)
+        
+        # Shadow image of all coils as a bitmask (bit n = coil n), updated on
+        # every write and readback. Only the bus worker thread modifies it.
+        self.coil_image = 0
+        self.last_readback_diff = 0
+        self._status_cache = (None, {})
+        
+        # Background coil readback (FC01) shared by all status requests
+        self.poll_interval = self.modbus_config.get('poll_interval_ms', 250) / 1000.0
+        self.status_max_age = self.modbus_config.get('status_max_age_ms', 1000) / 1000.0
+        self.hardware_image = 0  # Last coil readback from the modules
+        self.last_readback_at = 0.0
+        self.relay_listeners: List[Callable] = []
+        self._poll_stop = threading.Event()
+        self._poll_thread = None
         
         # Initialize Modbus RTU client
-        self.client = ModbusSerialClient(
+        self.client = client or ModbusSerialClient(
             port=self.modbus_config['port'],
             baudrate=self.modbus_config['baudrate'],
             bytesize=self.modbus_config['bytesize'],
@@ -26,6 +102,8 @@ class ModbusController:
             stopbits=self.modbus_config['stopbits'],
             timeout=self.modbus_config['timeout']
         )
+        if recorder:
+            self.client = recorder.wrap_client(self.client, 'arm', RECORDED_CALLS)
         
         # Connect to ARM module
         if not self.client.connect():
@@ -33,15 +111,133 @@ class ModbusController:
         else:
             print(f"✅ Modbus RTU connected on {self.modbus_config['port']} @ {self.modbus_config['baudrate']} baud")
         
-        # Initialize all relay states
-        for relay_name in self.relay_mapping.keys():
-            self.relay_states[relay_name] = False
+        # Start the bus scheduler (RTU frame gap, optional extra gap per slave)
+        gap_ms = self.modbus_config.get('inter_frame_gap_ms')
+        self.scheduler = BusScheduler(
+            'modbus-bus',
+            inter_frame_gap=(gap_ms / 1000.0 if gap_ms is not None
+                             else rtu_frame_gap(self.modbus_config['baudrate'])),
+            slave_gaps={
+                int(slave_id): gap / 1000.0
+                for slave_id, gap in self.modbus_config.get('slave_gap_ms', {}).items()
+            },
+            coalesce_window=self.modbus_config.get('coalesce_window_ms', 0) / 1000.0
+        )
+        if self.coalesce_writes:
+            self.scheduler.register_batch_handler(COIL_WRITE, self._write_coil_batch)
+        self.scheduler.start()
         
         # Turn all relays OFF on startup
         self.set_all_off()
         
+        if self.poll_interval > 0:
+            self._poll_thread = threading.Thread(target=self._poll_loop, name='modbus-poll', daemon=True)
+            self._poll_thread.start()
+        
         print(f"✅ Modbus Controller initialized with {len(self.relay_mapping)} relays")
     
+    def submit(self, func: Callable, *args, priority: int = PRIORITY_PROCESS,
+               batch_key: str = None) -> Future:
+        """
+        Queue a bus transaction for the ARM module
+        Returns:
+            concurrent.futures.Future with the transaction result
+        """
+        return self.scheduler.submit(
+            func, *args,
+            priority=priority,
+            slave=self.modbus_config['arm_slave_id'],
+            batch_key=batch_key
+        )
+    
+    def _submit_write(self, coil_address: int, state: bool, relay_name: str,
+                      priority: int) -> Future:
+        # Latest write per coil wins: an older write not on the bus yet (queued,
+        # possibly at a lower priority, or waiting in a batch) must not undo it.
+        # It is dropped and reports the outcome of the write replacing it.
+        superseded = self.scheduler.take(
+            lambda request: request.batch_key == COIL_WRITE and request.args[0] == coil_address
+        )
+        future = self.submit(self._write_coil, coil_address, state, relay_name,
+                             priority=priority, batch_key=COIL_WRITE)
+        for request in superseded:
+            self._follow(request.future, future)
+        return future
+    
+    @staticmethod
+    def _follow(superseded: Future, future: Future):
+        """Resolve a superseded write's future with the result of its replacement"""
+        def resolve(done: Future):
+            if not superseded.set_running_or_notify_cancel():
+                return  # Its caller gave up meanwhile
+            if done.cancelled():
+                superseded.set_result(False)
+            elif done.exception() is not None:
+                superseded.set_exception(done.exception())
+            else:
+                superseded.set_result(done.result())
+        future.add_done_callback(resolve)
+    
+    def _submit_all_off(self) -> Future:
+        # Pending writes queued (or being coalesced) before the stop must not
+        # switch anything back on; they report False, they were never sent
+        dropped = self.scheduler.flush(lambda request: request.batch_key == COIL_WRITE, False)
+        if dropped:
+            print(f"🚨 Dropped {dropped} pending relay writes")
+        return self.submit(self._write_all_off, priority=PRIORITY_EMERGENCY)
+    
+    def add_relay_listener(self, callback: Callable[[Dict[str, bool]], None]):
+        """
+        Register callback(changes) for coils whose readback changed
+        changes = {relay_name: state}; called on the bus worker thread
+        """
+        self.relay_listeners.append(callback)
+    
+    def status_age(self) -> Optional[float]:
+        """Seconds since the last successful coil readback (None = never read)"""
+        if not self.last_readback_at:
+            return None
+        return time.monotonic() - self.last_readback_at
+    
+    def _readback_fresh(self, max_age: Optional[float]) -> bool:
+        age = self.status_age()
+        return age is not None and age <= (self.status_max_age if max_age is None else max_age)
+    
+    def _poll_loop(self):
+        """Read the coils periodically so status requests do not each hit the bus"""
+        while not self._poll_stop.wait(self.poll_interval):
+            future = self.submit(self._read_status, priority=PRIORITY_READ)
+            try:
+                future.result(timeout=self.request_timeout)
+            except Exception as e:
+                future.cancel()
+                print(f"⚠️  Coil poll failed: {e or 'timeout'}")
+    
+    def get_bus_stats(self) -> dict:
+        """Queue depth and wait time per priority class"""
+        return self.scheduler.get_stats()
+    
+    async def _await(self, future: Future, timeout: Optional[float], default):
+        """Await a bus future from asyncio; a timeout only affects this caller"""
+        try:
+            return await asyncio.wait_for(
+                asyncio.wrap_future(future),
+                self.request_timeout if timeout is None else timeout
+            )
+        except asyncio.TimeoutError:
+            future.cancel()  # Drop it if it has not reached the bus yet
+            print(f"⚠️  Modbus request timed out (queue {self.scheduler.queue_depth()})")
+            return default
+    
+    def _wait(self, future: Future, timeout: Optional[float], default):
+        """Wait for a bus future from a plain thread, bounded like _await"""
+        try:
+            return future.result(self.request_timeout if timeout is None else timeout)
+        except FutureTimeoutError:
+            future.cancel()  # Drop it if it has not reached the bus yet
+            print(f"⚠️  Modbus request timed out (queue {self.scheduler.queue_depth()})")
+            return default
+    
     def set_relay(self, relay_name: str, state: bool) -> bool:
         """
         Set relay state via Modbus
@@ -58,21 +254,100 @@ class ModbusController:
         coil_address = self.relay_mapping[relay_name]
         return self.set_relay_by_coil(coil_address, state, relay_name)
     
-    def set_relay_by_coil(self, coil_address: int, state: bool, relay_name: str = None) -> bool:
+    def set_relay_by_coil(self, coil_address: int, state: bool, relay_name: str = None,
+                          priority: int = PRIORITY_PROCESS, timeout: float = None) -> bool:
         """
         Set relay by coil address directly
         Args:
             coil_address: Modbus coil address (0-23)
             state: True = ON, False = OFF
             relay_name: Optional name for logging
+            priority: Bus priority class (PRIORITY_SAFETY for protective writes)
+            timeout: Seconds to wait (default request_timeout)
         Returns:
-            True if successful
+            True if successful, False on error or timeout
         """
+        future = self._submit_write(coil_address, state, relay_name, priority)
+        return self._wait(future, timeout, False)
+    
+    def set_relay_by_coil_nowait(self, coil_address: int, state: bool, relay_name: str = None,
+                                 priority: int = PRIORITY_PROCESS) -> Future:
+        """Queue a relay write without waiting (e.g. from the scale reader thread)"""
+        return self._submit_write(coil_address, state, relay_name, priority)
+    
+    def set_relay_by_pin(self, coil_address: int, state: bool) -> bool:
+        """
+        Set relay by coil address (compatibility with GPIO pin interface)
+        Args:
+            coil_address: Modbus coil address (0-23)
+            state: True = ON, False = OFF
+        """
+        return self.set_relay_by_coil(coil_address, state, self.name_by_coil.get(coil_address))
+    
+    def set_all_off(self, timeout: float = None) -> bool:
+        """
+        Emergency: Turn all 24 relays OFF
+        Uses Write Multiple Coils (FC15) for atomic operation
+        Returns False on error or timeout
+        """
+        return self._wait(self._submit_all_off(), timeout, False)
+    
+    def set_all_off_nowait(self) -> Future:
+        """Queue an emergency all-OFF without waiting (e.g. from a button handler)"""
+        return self._submit_all_off()
+    
+    def get_status(self, max_age: float = None, timeout: float = None) -> Dict[str, bool]:
+        """
+        Get status of all relays
+        Answers from the poller's readback if it is at most max_age seconds
+        old (default status_max_age_ms), otherwise reads from the ARM module
+        Returns:
+            Dictionary of relay_name: state (last known states on timeout)
+        """
+        if self._readback_fresh(max_age):
+            return self.get_cached_status()
+        future = self.submit(self._read_status, priority=PRIORITY_READ)
+        return self._wait(future, timeout, self.get_cached_status())
+    
+    async def set_relay_async(self, relay_name: str, state: bool, timeout: float = None) -> bool:
+        """Async set_relay; returns False on error or timeout"""
+        if relay_name not in self.relay_mapping:
+            print(f"⚠️  Unknown relay: {relay_name}")
+            return False
+        
+        coil_address = self.relay_mapping[relay_name]
+        return await self.set_relay_by_coil_async(coil_address, state, relay_name, timeout)
+    
+    async def set_relay_by_coil_async(self, coil_address: int, state: bool,
+                                      relay_name: str = None, timeout: float = None) -> bool:
+        """Async set_relay_by_coil; returns False on error or timeout"""
+        future = self._submit_write(coil_address, state, relay_name, PRIORITY_PROCESS)
+        return await self._await(future, timeout, False)
+    
+    async def set_all_off_async(self, timeout: float = None) -> bool:
+        """Async set_all_off; returns False on error or timeout"""
+        return await self._await(self._submit_all_off(), timeout, False)
+    
+    async def get_status_async(self, timeout: float = None, max_age: float = None) -> Dict[str, bool]:
+        """Async get_status; returns the last known states on timeout"""
+        if self._readback_fresh(max_age):
+            return self.get_cached_status()
+        future = self.submit(self._read_status, priority=PRIORITY_READ)
+        return await self._await(future, timeout, self.get_cached_status())
+    
+    # Bus transactions below run on the bus worker thread only
+    
+    def _ensure_connected(self) -> bool:
         if not self.client.is_socket_open():
             print(f"⚠️  Modbus connection closed, attempting reconnect...")
             if not self.client.connect():
                 print(f"❌ Modbus reconnection failed")
                 return False
+        return True
+    
+    def _write_coil(self, coil_address: int, state: bool, relay_name: str = None) -> bool:
+        if not self._ensure_connected():
+            return False
         
         try:
             # Write single coil (Function Code 05)
@@ -84,8 +359,10 @@ class ModbusController:
                 return False
             
             # Update state tracking
-            if relay_name:
-                self.relay_states[relay_name] = state
+            if state:
+                self.coil_image |= 1 << coil_address
+            else:
+                self.coil_image &= ~(1 << coil_address)
             
             status = "ON" if state else "OFF"
             name_str = f"{relay_name} " if relay_name else ""
@@ -100,27 +377,62 @@ class ModbusController:
             print(f"❌ Error setting relay: {e}")
             return False
     
-    def set_relay_by_pin(self, coil_address: int, state: bool) -> bool:
-        """
-        Set relay by coil address (compatibility with GPIO pin interface)
-        Args:
-            coil_address: Modbus coil address (0-23)
-            state: True = ON, False = OFF
-        """
-        # Find relay name by coil address
-        relay_name = None
-        for name, addr in self.relay_mapping.items():
-            if addr == coil_address:
-                relay_name = name
-                break
+    def _write_coil_batch(self, requests: List[tuple]) -> List[bool]:
+        """Write several queued coil changes with one FC15 over the affected range"""
+        changes = {}
+        for coil_address, state, relay_name in requests:
+            changes[coil_address] = (state, relay_name)  # Later request wins
         
-        return self.set_relay_by_coil(coil_address, state, relay_name)
+        try:
+            success = self._write_coil_range(changes)
+        except Exception as e:
+            print(f"❌ Error setting relays: {e}")
+            success = False
+        
+        # Every requester gets its own ack
+        return [success] * len(requests)
     
-    def set_all_off(self) -> bool:
+    def _write_coil_range(self, changes: Dict[int, tuple]) -> bool:
         """
-        Emergency: Turn all 24 relays OFF
-        Uses Write Multiple Coils (FC15) for atomic operation
+        Apply {coil: (state, relay_name)} to the shadow image and write the
+        covered range (FC15). Unchanged coils in the range keep their shadow state.
         """
+        if not self._ensure_connected():
+            return False
+        
+        low, high = min(changes), max(changes)
+        image = self.coil_image
+        for coil_address, (state, _) in changes.items():
+            if state:
+                image |= 1 << coil_address
+            else:
+                image &= ~(1 << coil_address)
+        values = [bool(image >> coil_address & 1) for coil_address in range(low, high + 1)]
+        
+        try:
+            # Write multiple coils (Function Code 15)
+            slave_id = self.modbus_config['arm_slave_id']
+            result = self.client.write_coils(low, values, slave=slave_id)
+            
+            if result.isError():
+                print(f"❌ Modbus error writing coils {low}-{high}: {result}")
+                return False
+            
+            # Update state tracking
+            self.coil_image = image
+            
+            summary = ", ".join(
+                f"{relay_name or coil_address}→{'ON' if state else 'OFF'}"
+                for coil_address, (state, relay_name) in sorted(changes.items())
+            )
+            print(f"🔌 Relays (Coil {low}-{high}, 1 transaction): {summary}")
+            return True
+            
+        except ModbusException as e:
+            print(f"❌ Modbus exception: {e}")
+            return False
+    
+    def _write_all_off(self) -> bool:
         print("🚨 EMERGENCY STOP - All relays OFF")
         
         if not self.client.is_socket_open():
@@ -139,8 +451,7 @@ class ModbusController:
                 return False
             
             # Update all state tracking
-            for relay_name in self.relay_states.keys():
-                self.relay_states[relay_name] = False
+            self.coil_image = 0
             
             print("✅ All 24 relays turned OFF")
             return True
@@ -149,15 +460,10 @@ class ModbusController:
             print(f"❌ Error in emergency stop: {e}")
             return False
     
-    def get_status(self) -> Dict[str, bool]:
-        """
-        Get status of all relays by reading from ARM module
-        Returns:
-            Dictionary of relay_name: state
-        """
+    def _read_status(self) -> Dict[str, bool]:
         if not self.client.is_socket_open():
             print(f"⚠️  Modbus connection closed")
-            return self.relay_states.copy()
+            return self.get_cached_status()
         
         try:
             # Read coils (Function Code 01)
@@ -166,25 +472,78 @@ class ModbusController:
             
             if result.isError():
                 print(f"⚠️  Modbus error reading status: {result}")
-                return self.relay_states.copy()
+                return self.get_cached_status()
             
             # Update state tracking from actual hardware
-            for relay_name, coil_addr in self.relay_mapping.items():
-                if coil_addr < len(result.bits):
-                    self.relay_states[relay_name] = result.bits[coil_addr]
+            readback = bits_to_mask(result.bits[:COIL_COUNT])
+            changed = readback ^ self.hardware_image
+            self.last_readback_diff = self.diff(readback)
+            self.coil_image = readback
+            self.hardware_image = readback
+            self.last_readback_at = time.monotonic()
             
-            return self.relay_states.copy()
+            if changed:
+                self._notify_relay_change(changed, readback)
+            
+            return self.get_cached_status()
             
         except Exception as e:
             print(f"⚠️  Error reading relay status: {e}")
-            return self.relay_states.copy()
+            return self.get_cached_status()
+    
+    def _notify_relay_change(self, changed: int, readback: int):
+        changes = self.mask_to_relays(changed, readback)
+        for listener in self.relay_listeners:
+            try:
+                listener(changes)
+            except Exception as e:
+                print(f"⚠️  Relay listener error: {e}")
+    
+    @property
+    def relay_states(self) -> Dict[str, bool]:
+        """Relay name → state view of the shadow image"""
+        return self.get_cached_status()
+    
+    def get_cached_status(self) -> Dict[str, bool]:
+        """Relay states from the shadow image (no bus I/O); rebuilt only when it changes"""
+        image = self.coil_image
+        cached_image, cached_status = self._status_cache
+        if image != cached_image:
+            cached_status = {
+                name: bool(image >> coil_address & 1)
+                for name, coil_address in self.coil_by_name.items()
+            }
+            self._status_cache = (image, cached_status)
+        return cached_status.copy()
+    
+    def is_on(self, relay_name: str) -> bool:
+        """Shadow state of one relay"""
+        return bool(self.coil_image >> self.coil_by_name[relay_name] & 1)
+    
+    def diff(self, readback_mask: int) -> int:
+        """Bitmask of coils whose readback differs from the shadow image"""
+        return (self.coil_image ^ readback_mask) & self.all_coils_mask
+    
+    def mask_to_relays(self, mask: int, image: int = None) -> Dict[str, bool]:
+        """
+        Relay name → state for the coils set in mask
+        Args:
+            mask: Coils to report (e.g. a diff)
+            image: Image to take states from (default: shadow image)
+        """
+        if image is None:
+            image = self.coil_image
+        return {
+            self.get_relay_name_by_coil(coil_address): bool(image >> coil_address & 1)
+            for coil_address in iter_bits(mask)
+        }
     
     def get_relay_name_by_coil(self, coil_address: int) -> str:
         """Get relay name from coil address"""
-        for name, addr in self.relay_mapping.items():
-            if addr == coil_address:
-                return name
-        return f"unknown_coil_{coil_address}"
+        name = self.name_by_coil.get(coil_address)
+        if name is None:
+            return f"unknown_coil_{coil_address}"
+        return name
     
     def is_connected(self) -> bool:
         """Check if Modbus connection is alive"""
@@ -193,7 +552,14 @@ class ModbusController:
     def cleanup(self):
         """Cleanup Modbus connection"""
         print("Cleaning up Modbus...")
+        self._poll_stop.set()
+        if self._poll_thread:
+            self._poll_thread.join(timeout=2)
         self.set_all_off()
+        
+        # Stop the bus worker after pending transactions
+        self.scheduler.stop()
+        
         if self.client.is_socket_open():
             self.client.close()
         print("✅ Modbus cleanup complete")
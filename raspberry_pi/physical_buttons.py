@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Physical Buttons Module
+Server-side actions for operator panel buttons reported by ESP32 panels
+
+Configured buttons act on the relay coils as soon as the press arrives
+(no browser round trip); HMIs are only notified. Actions:
+- "emergency_stop": cancel weighing jobs and turn all relays OFF (on press);
+                    while it is held, momentary and toggle presses are refused
+- "momentary":      relay ON while the button is held on any panel (klakson,
+                    conveyor jog)
+- "toggle":         flip the relay on each press
+- "notify":         no coil action, HMIs decide (default for unlisted buttons)
+
+Button state is kept per (panel, button), so panels do not mask each other.
+
+Panels either send one JSON physical_button_state per change, or announce
+their button order with panel_hello and then send batched binary frames:
+
+  <B H 3s 3s>  0x10, seq, state mask (24 bit LE), changed mask (24 bit LE)
+
+Heartbeats (0x11) use the same layout with the full state and no changed
+bits; the server answers each with <B H> 0x12 + seq and resyncs from it.
+"""
+
+import struct
+import threading
+from concurrent.futures import Future
+from typing import Dict, Iterable, Optional, Tuple
+from bus_scheduler import PRIORITY_PROCESS, PRIORITY_SAFETY
+
+FRAME_BUTTONS = 0x10
+FRAME_HEARTBEAT = 0x11
+FRAME_HEARTBEAT_ACK = 0x12
+_BUTTON_FRAME = struct.Struct('<BH3s3s')
+_HEARTBEAT_ACK = struct.Struct('<BH')
+
+
+def decode_button_frame(frame: bytes) -> Tuple[int, int, int, int]:
+    """Binary panel frame → (frame_type, seq, state_mask, changed_mask)"""
+    if len(frame) != _BUTTON_FRAME.size or frame[0] not in (FRAME_BUTTONS, FRAME_HEARTBEAT):
+        raise ValueError(f"Invalid button frame ({len(frame)} bytes)")
+    frame_type, seq, state, changed = _BUTTON_FRAME.unpack(frame)
+    return frame_type, seq, int.from_bytes(state, 'little'), int.from_bytes(changed, 'little')
+
+
+def heartbeat_ack(seq: int) -> bytes:
+    return _HEARTBEAT_ACK.pack(FRAME_HEARTBEAT_ACK, seq)
+
+
+ACTION_NOTIFY = 'notify'
+ACTION_EMERGENCY_STOP = 'emergency_stop'
+ACTION_MOMENTARY = 'momentary'
+ACTION_TOGGLE = 'toggle'
+ACTION_BLOCKED = 'blocked'  # Reported for presses refused while an E-stop is held
+
+ACTIONS = (ACTION_NOTIFY, ACTION_EMERGENCY_STOP, ACTION_MOMENTARY, ACTION_TOGGLE)
+
+
+class PhysicalButtons:
+    def __init__(self, config: dict, modbus_controller, weighing_engine=None):
+        self.config = config.get('physical_buttons', {})
+        self.modbus_controller = modbus_controller
+        self.weighing_engine = weighing_engine
+
+        # WebSocket path the panels connect to
+        self.path = self.config.get('path', '/esp32')
+
+        # button → (action, coil_address, relay_name)
+        self.actions: Dict[str, tuple] = {}
+        for button, spec in self.config.get('actions', {}).items():
+            action = spec.get('action', ACTION_NOTIFY)
+            if action not in ACTIONS:
+                raise ValueError(f"Unknown physical button action '{action}' for {button}")
+            relay_name = spec.get('relay')
+            coil_address = None
+            if action in (ACTION_MOMENTARY, ACTION_TOGGLE):
+                if relay_name not in modbus_controller.coil_by_name:
+                    raise ValueError(f"Physical button {button}: unknown relay '{relay_name}'")
+                coil_address = modbus_controller.coil_by_name[relay_name]
+            self.actions[button] = (action, coil_address, relay_name)
+
+        self.pressed: Dict[Tuple[str, str], bool] = {}        # (panel, button) held
+        self.pending_press: Dict[Tuple[str, str], Future] = {}  # Momentary ON writes not yet done
+        self.lock = threading.Lock()
+
+        print(f"✅ Physical buttons: {len(self.actions)} server-side actions on {self.path}")
+
+    def action_for(self, button: str) -> str:
+        return self.actions.get(button, (ACTION_NOTIFY,))[0]
+
+    def _press_done(self, key: Tuple[str, str], future: Future):
+        with self.lock:
+            if self.pending_press.get(key) is future:
+                del self.pending_press[key]
+
+    def handle(self, button: str, pressed: bool, panel: str = 'panel') -> Optional[str]:
+        """
+        Apply the configured action for a press/release edge
+        Args:
+            button: Button name as reported by the panel
+            pressed: New state
+            panel: Stable id of the reporting panel (connection)
+        Returns:
+            The action taken (ACTION_BLOCKED for a refused press), or None if
+            the state did not change (repeated report / resync)
+        """
+        key = (panel, button)
+        with self.lock:
+            if self.pressed.get(key, False) == pressed:
+                return None
+            if pressed:
+                self.pressed[key] = True
+            else:
+                del self.pressed[key]
+            still_held = any(held == button for _, held in self.pressed)  # On another panel
+            estop_held = any(self.action_for(held) == ACTION_EMERGENCY_STOP for _, held in self.pressed)
+
+        action, coil_address, relay_name = self.actions.get(button, (ACTION_NOTIFY, None, None))
+
+        if pressed and estop_held and action in (ACTION_MOMENTARY, ACTION_TOGGLE):
+            print(f"⛔ Physical button {button} refused: emergency stop held")
+            return ACTION_BLOCKED
+
+        if action == ACTION_EMERGENCY_STOP:
+            if pressed:
+                print(f"🚨 Physical EMERGENCY STOP ({button})")
+                if self.weighing_engine:
+                    self.weighing_engine.cancel_all()
+                self.modbus_controller.set_all_off_nowait()
+
+        elif action == ACTION_MOMENTARY:
+            if pressed:
+                press = self.modbus_controller.set_relay_by_coil_nowait(
+                    coil_address, True, relay_name, PRIORITY_PROCESS)
+                with self.lock:
+                    self.pending_press[key] = press
+                press.add_done_callback(lambda done: self._press_done(key, done))
+            else:
+                with self.lock:
+                    press = self.pending_press.pop(key, None)
+                if press:
+                    press.cancel()
+                if not still_held:
+                    # Releasing a jog button is protective, so it jumps the queue;
+                    # a press still waiting for the bus must not be served after it
+                    self.modbus_controller.set_relay_by_coil_nowait(
+                        coil_address, False, relay_name, PRIORITY_SAFETY)
+
+        elif action == ACTION_TOGGLE:
+            if pressed:
+                state = not self.modbus_controller.is_on(relay_name)
+                self.modbus_controller.set_relay_by_coil_nowait(coil_address, state, relay_name)
+
+        return action
+
+    def release_all(self, buttons: Iterable[str], panel: str = 'panel') -> Dict[str, Optional[str]]:
+        """Treat a panel's buttons as released (e.g. the panel disconnected)"""
+        return {button: self.handle(button, False, panel) for button in list(buttons)}
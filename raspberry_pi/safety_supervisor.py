@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Safety Supervisor Module
+Implements the "safety" config block on its own high-priority thread,
+independent of the asyncio loop (a stalled event loop is one of the faults
+it has to catch).
+
+Checks, every check_interval_ms:
+- Heartbeats: each controlling HMI ("hmi:<host>") and the server event loop
+  ("event_loop") must feed the watchdog within watchdog_timeout_seconds.
+  Loss while any relay is ON → cancel weighing jobs and all relays OFF.
+- Doors: a door/gate relay ON (coil image) for longer than
+  max_door_open_seconds → that relay OFF at SAFETY priority and the weighing
+  job driving it cancelled.
+- Weight spikes: a jump of more than weight_spike_threshold_kg between two
+  despiked samples of one scale → jobs on that scale cancelled (gates closed).
+
+Reaction latency (fault detectable → action queued on the bus) and ack
+latency (→ bus write done) are kept as metrics.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List
+from bus_scheduler import PRIORITY_SAFETY
+
+SOURCE_HMI = 'hmi'
+SOURCE_EVENT_LOOP = 'event_loop'
+
+
+class LatencyStats:
+    """Recent latencies in ms (last, mean, max over the window)"""
+
+    def __init__(self, size: int = 256):
+        self.values = deque(maxlen=size)
+        self.count = 0
+
+    def add(self, value_ms: float):
+        self.values.append(value_ms)
+        self.count += 1
+
+    def to_dict(self) -> dict:
+        values = list(self.values)
+        if not values:
+            return {'count': 0, 'last_ms': None, 'mean_ms': None, 'max_ms': None}
+        return {
+            'count': self.count,
+            'last_ms': round(values[-1], 3),
+            'mean_ms': round(sum(values) / len(values), 3),
+            'max_ms': round(max(values), 3),
+        }
+
+
+class SafetySupervisor:
+    def __init__(self, config: dict, scale_reader, modbus_controller, weighing_engine=None):
+        self.config = config.get('safety', {})
+        self.modbus_controller = modbus_controller
+        self.weighing_engine = weighing_engine
+
+        self.watchdog_timeout = float(self.config.get('watchdog_timeout_seconds', 5))
+        self.max_door_open = float(self.config.get('max_door_open_seconds', 30))
+        self.spike_threshold = float(self.config.get('weight_spike_threshold_kg', 50))
+        self.check_interval = self.config.get('check_interval_ms', 50) / 1000.0
+        self.realtime_priority = self.config.get('realtime_priority', 50)
+
+        # Door/gate relays (default: every "pintu_*" relay that opens something)
+        mapping = modbus_controller.relay_mapping
+        door_relays = self.config.get('door_relays') or [
+            name for name in mapping if name.startswith('pintu_') and not name.endswith('_tutup')
+        ]
+        self.doors = [(mapping[name], name) for name in door_relays if name in mapping]
+        self.door_open_since: Dict[int, float] = {}
+
+        # Watchdog sources are armed by their first feed
+        self.last_feed: Dict[str, float] = {}
+        self.tripped_sources = set()
+
+        self.last_weight: Dict[str, float] = {}
+        self.spikes = deque()                 # (scale, previous, weight, sample_time)
+
+        self.reaction = LatencyStats()
+        self.ack = LatencyStats()
+        self.trips = 0
+        self.scheduler = 'SCHED_OTHER'
+        self.event_listeners: List[Callable[[dict], None]] = []
+
+        self._wakeup = threading.Event()
+        self.running = False
+        self.thread = None
+
+        scale_reader.add_sample_listener(self.on_sample)
+
+        print(f"✅ Safety supervisor: watchdog {self.watchdog_timeout}s, doors {self.max_door_open}s "
+              f"({len(self.doors)} relays), spike {self.spike_threshold}kg")
+
+    def add_event_listener(self, callback: Callable[[dict], None]):
+        """Register callback(event) for safety_trip / safety_recovered events"""
+        self.event_listeners.append(callback)
+
+    def _emit(self, event: dict):
+        event['timestamp'] = int(time.time() * 1000)
+        for callback in self.event_listeners:
+            try:
+                callback(event)
+            except Exception as e:
+                print(f"⚠️  Safety event listener error: {e}")
+
+    def feed(self, source: str):
+        """Heartbeat from a watchdog source (any thread)"""
+        self.last_feed[source] = time.monotonic()
+
+    def on_sample(self, scale_name: str, weight: float, sample_time: float, raw: float):
+        """
+        ScaleReader sample listener: only detects, the supervisor thread acts.
+        Spikes are judged on the despiked reading: a single garbled frame is
+        replaced by the Hampel stage, a genuine jump passes it after two samples.
+        """
+        previous = self.last_weight.get(scale_name)
+        self.last_weight[scale_name] = weight
+        if previous is not None and abs(weight - previous) > self.spike_threshold:
+            self.spikes.append((scale_name, previous, weight, sample_time))
+            self._wakeup.set()
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name='safety-supervisor', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        self._wakeup.set()
+        if self.thread:
+            self.thread.join(timeout=1.0)
+
+    def _set_realtime(self):
+        """SCHED_FIFO for this thread where permitted (root / CAP_SYS_NICE)"""
+        try:
+            os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(self.realtime_priority))
+            self.scheduler = f"SCHED_FIFO:{self.realtime_priority}"
+        except (AttributeError, OSError) as e:
+            print(f"⚠️  Safety supervisor runs without real-time priority: {e}")
+
+    def _run(self):
+        self._set_realtime()
+        print(f"🛡️  Safety supervisor running ({self.scheduler}, every {self.check_interval * 1000:.0f}ms)")
+        while self.running:
+            self._wakeup.wait(self.check_interval)
+            self._wakeup.clear()
+            try:
+                self.check(time.monotonic())
+            except Exception as e:
+                print(f"❌ Safety supervisor error: {e}")
+
+    def check(self, now: float):
+        """One supervision pass (also callable directly)"""
+        while self.spikes:
+            scale_name, previous, weight, sample_time = self.spikes.popleft()
+            self._trip_spike(scale_name, previous, weight, sample_time)
+        self._check_heartbeats(now)
+        self._check_doors(now)
+
+    def _check_heartbeats(self, now: float):
+        for source, fed in list(self.last_feed.items()):
+            deadline = fed + self.watchdog_timeout
+            if now <= deadline:
+                if source in self.tripped_sources:
+                    self.tripped_sources.discard(source)
+                    print(f"✅ Safety: {source} heartbeat restored")
+                    self._emit({'type': 'safety_recovered', 'reason': 'heartbeat', 'source': source})
+                continue
+            if source in self.tripped_sources:
+                continue
+            self.tripped_sources.add(source)
+
+            relays_on = self.modbus_controller.coil_image != 0
+            print(f"🚨 Safety: {source} heartbeat lost ({now - fed:.1f}s)"
+                  f"{' - all relays OFF' if relays_on else ''}")
+            future = None
+            if relays_on:
+                if self.weighing_engine:
+                    self.weighing_engine.cancel_all()
+                future = self.modbus_controller.set_all_off_nowait()
+            self._record('heartbeat_lost', deadline, future,
+                         source=source, silent_s=round(now - fed, 2), action='all_off' if relays_on else 'none')
+
+    def _check_doors(self, now: float):
+        image = self.modbus_controller.coil_image
+        for coil_address, relay_name in self.doors:
+            if not image >> coil_address & 1:
+                self.door_open_since.pop(coil_address, None)
+                continue
+            since = self.door_open_since.setdefault(coil_address, now)
+            deadline = since + self.max_door_open
+            if now <= deadline:
+                continue
+
+            print(f"🚨 Safety: {relay_name} open for {now - since:.1f}s - closing")
+            del self.door_open_since[coil_address]
+            if self.weighing_engine:
+                self.weighing_engine.cancel_jobs_on(coil_address=coil_address)
+            future = self.modbus_controller.set_relay_by_coil_nowait(
+                coil_address, False, relay_name, PRIORITY_SAFETY)
+            self._record('door_open_too_long', deadline, future,
+                         relay=relay_name, open_s=round(now - since, 2), action='close')
+
+    def _trip_spike(self, scale_name: str, previous: float, weight: float, sample_time: float):
+        cancelled = []
+        if self.weighing_engine:
+            cancelled = self.weighing_engine.cancel_jobs_on(scale=scale_name)
+        print(f"🚨 Safety: {scale_name} weight spike {previous:.1f} → {weight:.1f}kg"
+              f"{f' - cancelled {cancelled}' if cancelled else ''}")
+        self._record('weight_spike', sample_time, None,
+                     scale=scale_name, previous=round(previous, 2), weight=round(weight, 2),
+                     action='close_gates' if cancelled else 'none', jobs=cancelled)
+
+    def _record(self, reason: str, detectable_at: float, future, **details):
+        """Metrics + event for one trip"""
+        self.trips += 1
+        reaction_ms = (time.monotonic() - detectable_at) * 1000.0
+        self.reaction.add(reaction_ms)
+
+        if future is not None:
+            def on_done(_future):
+                self.ack.add((time.monotonic() - detectable_at) * 1000.0)
+            future.add_done_callback(on_done)
+
+        event = {'type': 'safety_trip', 'reason': reason, 'reaction_ms': round(reaction_ms, 3)}
+        event.update(details)
+        self._emit(event)
+
+    def get_metrics(self) -> dict:
+        now = time.monotonic()
+        return {
+            'scheduler': self.scheduler,
+            'check_interval_ms': round(self.check_interval * 1000, 1),
+            'trips': self.trips,
+            'reaction': self.reaction.to_dict(),
+            'ack': self.ack.to_dict(),
+            'heartbeats': {
+                source: {'age_s': round(now - fed, 2), 'lost': source in self.tripped_sources}
+                for source, fed in self.last_feed.items()
+            },
+            'doors_open': {
+                self.modbus_controller.get_relay_name_by_coil(coil): round(now - since, 1)
+                for coil, since in self.door_open_since.items()
+            },
+        }
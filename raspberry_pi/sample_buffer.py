@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Sample Buffer Module
+Fixed-size, array-backed ring buffer of (monotonic timestamp, value) samples
+with sequence numbers, for bounded-memory history of high-rate streams
+"""
+
+import threading
+from array import array
+from typing import NamedTuple, Optional, Tuple
+
+
+class SampleSlice(NamedTuple):
+    """Contiguous run of samples copied out of a SampleRing"""
+    first_seq: int          # Sequence number of timestamps[0]
+    next_seq: int           # Cursor to pass to get_since() for the next read
+    missed: int             # Samples requested but already overwritten
+    timestamps: array       # array('d') of time.monotonic() values
+    values: array           # array('d') of sample values
+
+    def __len__(self):
+        return len(self.values)
+
+
+class SampleRing:
+    def __init__(self, capacity: int):
+        """
+        Args:
+            capacity: Number of samples kept; memory is 16 bytes per sample
+        """
+        if capacity <= 0:
+            raise ValueError("SampleRing capacity must be positive")
+        self.capacity = capacity
+        self.timestamps = array('d', bytes(8 * capacity))
+        self.values = array('d', bytes(8 * capacity))
+        self.seq = 0  # Total samples ever appended (= next sequence number)
+        self.lock = threading.Lock()
+
+    def append(self, timestamp: float, value: float) -> int:
+        """Store a sample, overwriting the oldest when full. Returns its seq."""
+        with self.lock:
+            seq = self.seq
+            index = seq % self.capacity
+            self.timestamps[index] = timestamp
+            self.values[index] = value
+            self.seq = seq + 1
+            return seq
+
+    def __len__(self):
+        return min(self.seq, self.capacity)
+
+    @property
+    def oldest_seq(self) -> int:
+        return max(0, self.seq - self.capacity)
+
+    def latest(self) -> Optional[Tuple[float, float]]:
+        """Most recent (timestamp, value), or None if empty"""
+        with self.lock:
+            if self.seq == 0:
+                return None
+            index = (self.seq - 1) % self.capacity
+            return self.timestamps[index], self.values[index]
+
+    def _copy(self, first_seq: int, end_seq: int, missed: int) -> SampleSlice:
+        """Copy samples [first_seq, end_seq) out of the ring (lock held)"""
+        count = end_seq - first_seq
+        start = first_seq % self.capacity
+        stop = start + count
+        if stop <= self.capacity:
+            timestamps = self.timestamps[start:stop]
+            values = self.values[start:stop]
+        else:
+            # Wrapped: two memcpy-style array slices
+            stop -= self.capacity
+            timestamps = self.timestamps[start:] + self.timestamps[:stop]
+            values = self.values[start:] + self.values[:stop]
+        return SampleSlice(first_seq, end_seq, missed, timestamps, values)
+
+    def get_since(self, seq: int) -> SampleSlice:
+        """
+        Samples with sequence number >= seq
+        Use the returned next_seq as the cursor for the following call.
+        """
+        with self.lock:
+            oldest = max(0, self.seq - self.capacity)
+            first = min(max(seq, oldest), self.seq)
+            missed = max(0, oldest - seq)
+            return self._copy(first, self.seq, missed)
+
+    def get_window(self, seconds: float, now: Optional[float] = None) -> SampleSlice:
+        """
+        Samples with timestamp >= (now - seconds)
+        Args:
+            seconds: Window length
+            now: Reference time (defaults to the latest sample timestamp)
+        """
+        with self.lock:
+            oldest = max(0, self.seq - self.capacity)
+            if self.seq == oldest:
+                return self._copy(oldest, oldest, 0)
+
+            if now is None:
+                now = self.timestamps[(self.seq - 1) % self.capacity]
+            cutoff = now - seconds
+
+            # Binary search over logical positions (timestamps are monotonic)
+            low, high = oldest, self.seq
+            while low < high:
+                mid = (low + high) // 2
+                if self.timestamps[mid % self.capacity] < cutoff:
+                    low = mid + 1
+                else:
+                    high = mid
+            return self._copy(low, self.seq, 0)
@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""
+Scale Filters Module
+Per-scale streaming filter stage between frame parsing and publication
+
+Stages (each optional, run per sample, O(window) state):
+- "hampel":  running median outlier rejector. A sample further than
+             threshold * 1.4826 * MAD (at least min_deviation_kg) from the
+             median of the previous window, and as far from the trend of the
+             last two samples, is replaced by that median, so a garbled frame
+             that still parses never reaches the gate logic while material
+             flowing in after a steady spell passes with one sample of delay.
+- smoother:  "ema" (exponential moving average) or "kalman" (1-D, constant
+             level with process noise), or "none"
+
+Latency is reported per stage: compute time per sample, and lag in samples /
+ms (EMA and Kalman: steady-state lag of the filter; Hampel: longest run of
+rejected samples, i.e. how long a genuine step was held back).
+
+MotionEstimator runs on the filtered value: steady flag (standard deviation
+over a time window below a threshold) and smoothed flow rate in kg/s.
+"""
+
+import time
+from bisect import bisect_left, insort
+from collections import deque
+from typing import Dict, Optional, Tuple
+
+# MAD → standard deviation for normally distributed noise
+MAD_SCALE = 1.4826
+
+
+def _median(ordered: list) -> float:
+    count = len(ordered)
+    middle = count // 2
+    return ordered[middle] if count % 2 else (ordered[middle - 1] + ordered[middle]) / 2.0
+
+
+class HampelFilter:
+    """Causal Hampel identifier over the last `window` raw samples"""
+
+    def __init__(self, window: int = 7, threshold: float = 3.0, min_deviation_kg: float = 5.0):
+        if window < 3:
+            raise ValueError("Hampel window must be at least 3 samples")
+        self.window = window
+        self.threshold = threshold
+        self.min_deviation = min_deviation_kg
+
+        self.samples = deque()        # Raw samples in arrival order
+        self.sorted = []              # Same samples, sorted (median by index)
+        self.outliers = 0
+        self.rejected_run = 0
+        self.max_rejected_run = 0
+
+    def update(self, value: float) -> Tuple[float, bool]:
+        """Returns (output value, rejected)"""
+        rejected = False
+        output = value
+        if len(self.samples) >= 3:
+            median = _median(self.sorted)
+            mad = _median(sorted(abs(sample - median) for sample in self.sorted))
+            limit = max(self.threshold * MAD_SCALE * mad, self.min_deviation)
+            # A ramp leaves the median behind; only reject when the sample
+            # does not continue the trend of the last two samples either
+            predicted = 2.0 * self.samples[-1] - self.samples[-2]
+            if abs(value - median) > limit and abs(value - predicted) > limit:
+                rejected = True
+                output = median
+
+        if rejected:
+            self.outliers += 1
+            self.rejected_run += 1
+            self.max_rejected_run = max(self.max_rejected_run, self.rejected_run)
+        else:
+            self.rejected_run = 0
+
+        # The raw value joins the window either way, so a genuine step is
+        # accepted on its third sample (the trend is flat again)
+        self.samples.append(value)
+        insort(self.sorted, value)
+        if len(self.samples) > self.window:
+            oldest = self.samples.popleft()
+            del self.sorted[bisect_left(self.sorted, oldest)]
+        return output, rejected
+
+    def lag_samples(self) -> float:
+        return float(self.max_rejected_run)
+
+
+class EmaFilter:
+    def __init__(self, alpha: float = 0.5):
+        if not 0.0 < alpha <= 1.0:
+            raise ValueError("EMA alpha must be in (0, 1]")
+        self.alpha = alpha
+        self.value: Optional[float] = None
+
+    def update(self, value: float) -> float:
+        if self.value is None:
+            self.value = value
+        else:
+            self.value += self.alpha * (value - self.value)
+        return self.value
+
+    def lag_samples(self) -> float:
+        return (1.0 - self.alpha) / self.alpha
+
+
+class KalmanFilter:
+    """1-D Kalman filter for a slowly moving level (weight) in white noise"""
+
+    def __init__(self, process_noise: float = 1.0, measurement_noise: float = 4.0):
+        self.q = process_noise          # kg² per sample the true weight may move
+        self.r = measurement_noise      # kg² indicator noise
+        self.value: Optional[float] = None
+        self.p = measurement_noise
+        self.gain = 1.0
+
+    def update(self, value: float) -> float:
+        if self.value is None:
+            self.value = value
+            return value
+        p = self.p + self.q
+        self.gain = p / (p + self.r)
+        self.value += self.gain * (value - self.value)
+        self.p = (1.0 - self.gain) * p
+        return self.value
+
+    def lag_samples(self) -> float:
+        return (1.0 - self.gain) / self.gain if self.gain else 0.0
+
+
+SMOOTHERS = {
+    'ema': lambda spec: EmaFilter(spec.get('alpha', 0.5)),
+    'kalman': lambda spec: KalmanFilter(spec.get('process_noise', 1.0), spec.get('measurement_noise', 4.0)),
+}
+
+
+class ScaleFilterChain:
+    """Hampel → smoother for one scale, with per-stage timing"""
+
+    def __init__(self, spec: dict):
+        hampel = spec.get('hampel', {})
+        self.hampel = None
+        if hampel.get('enabled', True):
+            self.hampel = HampelFilter(
+                hampel.get('window', 7),
+                hampel.get('threshold', 3.0),
+                hampel.get('min_deviation_kg', 5.0)
+            )
+
+        smoother = spec.get('smoother', {})
+        smoother_type = smoother.get('type', 'ema')
+        if smoother_type != 'none' and smoother_type not in SMOOTHERS:
+            raise ValueError(f"Unknown scale smoother: {smoother_type}")
+        self.smoother_type = smoother_type
+        self.smoother = SMOOTHERS[smoother_type](smoother) if smoother_type != 'none' else None
+
+        self.samples = 0
+        self.hampel_ns = 0
+        self.smoother_ns = 0
+        self.last_time: Optional[float] = None
+        self.interval = None            # EMA of the sample interval (s)
+        self.raw = 0.0
+        self.despiked = 0.0             # After Hampel, before the smoother (no smoothing lag)
+        self.filtered = 0.0
+
+    def update(self, raw: float, sample_time: float) -> float:
+        if self.last_time is not None:
+            dt = sample_time - self.last_time
+            self.interval = dt if self.interval is None else self.interval + 0.05 * (dt - self.interval)
+        self.last_time = sample_time
+        self.samples += 1
+        self.raw = raw
+
+        value = raw
+        if self.hampel:
+            start = time.perf_counter_ns()
+            value, _ = self.hampel.update(value)
+            self.hampel_ns += time.perf_counter_ns() - start
+        self.despiked = value
+        if self.smoother:
+            start = time.perf_counter_ns()
+            value = self.smoother.update(value)
+            self.smoother_ns += time.perf_counter_ns() - start
+
+        self.filtered = value
+        return value
+
+    def _stage_stats(self, stage, total_ns: int) -> dict:
+        lag = stage.lag_samples()
+        return {
+            'compute_us': round(total_ns / self.samples / 1000.0, 3) if self.samples else None,
+            'lag_samples': round(lag, 2),
+            'lag_ms': round(lag * self.interval * 1000.0, 1) if self.interval else None,
+        }
+
+    def get_stats(self) -> dict:
+        stats = {
+            'raw': round(self.raw, 2),
+            'filtered': round(self.filtered, 2),
+            'samples': self.samples,
+            'sample_interval_ms': round(self.interval * 1000.0, 1) if self.interval else None,
+        }
+        if self.hampel:
+            stats['hampel'] = self._stage_stats(self.hampel, self.hampel_ns)
+            stats['hampel']['outliers'] = self.hampel.outliers
+        if self.smoother:
+            stats[self.smoother_type] = self._stage_stats(self.smoother, self.smoother_ns)
+        return stats
+
+
+def build_filters(config: dict, scales) -> Dict[str, ScaleFilterChain]:
+    """
+    One filter chain per scale from the "scale_filters" config block
+    ({} if disabled). Per-scale overrides go in scale_filters.scales.<name>.
+    """
+    filter_config = config.get('scale_filters', {})
+    if not filter_config.get('enabled', False):
+        return {}
+    overrides = filter_config.get('scales', {})
+    chains = {}
+    for scale_name in scales:
+        spec = {
+            'hampel': dict(filter_config.get('hampel', {}), **overrides.get(scale_name, {}).get('hampel', {})),
+            'smoother': dict(filter_config.get('smoother', {}), **overrides.get(scale_name, {}).get('smoother', {})),
+        }
+        chains[scale_name] = ScaleFilterChain(spec)
+    return chains
+
+
+class MotionEstimator:
+    """
+    Steady flag and flow rate of one scale over a sliding time window, from
+    running sums (count, Σt, Σw, Σt², Σtw, Σw²); O(1) per sample plus
+    evicting samples older than the window
+    """
+
+    REBASE_S = 60.0  # Re-reference times and recompute sums (bounded rounding error)
+
+    def __init__(self, window_s: float = 1.0, steady_threshold_kg: float = 0.5,
+                 min_samples: int = 3, flow_alpha: float = 0.3):
+        self.window = window_s
+        self.steady_threshold = steady_threshold_kg
+        self.min_samples = min_samples
+        self.flow_alpha = flow_alpha
+
+        self.samples = deque()            # (t - base, weight)
+        self.base: Optional[float] = None
+        self.n = 0
+        self.sum_t = self.sum_w = self.sum_tt = self.sum_tw = self.sum_ww = 0.0
+
+        self.steady = False
+        self.std_kg = None
+        self.flow = 0.0                   # Smoothed kg/s (+ filling, - discharging)
+
+    def _add(self, t: float, w: float, sign: float):
+        self.n += int(sign)
+        self.sum_t += sign * t
+        self.sum_w += sign * w
+        self.sum_tt += sign * t * t
+        self.sum_tw += sign * t * w
+        self.sum_ww += sign * w * w
+
+    def _rebase(self, sample_time: float):
+        shift = sample_time - self.base if self.base is not None else 0.0
+        self.base = sample_time
+        self.samples = deque((t - shift, w) for t, w in self.samples)
+        self.n = 0
+        self.sum_t = self.sum_w = self.sum_tt = self.sum_tw = self.sum_ww = 0.0
+        for t, w in self.samples:
+            self._add(t, w, 1.0)
+
+    def update(self, sample_time: float, weight: float) -> Tuple[bool, float]:
+        """Returns (steady, flow_kg_s)"""
+        if self.base is None or sample_time - self.base > self.REBASE_S:
+            self._rebase(sample_time)
+        t = sample_time - self.base
+        self.samples.append((t, weight))
+        self._add(t, weight, 1.0)
+        while self.samples and t - self.samples[0][0] > self.window:
+            old_t, old_w = self.samples.popleft()
+            self._add(old_t, old_w, -1.0)
+
+        n = self.n
+        if n < self.min_samples:
+            self.steady = False
+            self.std_kg = None
+            return self.steady, self.flow
+
+        mean = self.sum_w / n
+        variance = max(self.sum_ww / n - mean * mean, 0.0)
+        self.std_kg = variance ** 0.5
+        self.steady = self.std_kg <= self.steady_threshold
+
+        # Least-squares slope of weight over time in the window
+        denominator = n * self.sum_tt - self.sum_t * self.sum_t
+        slope = (n * self.sum_tw - self.sum_t * self.sum_w) / denominator if denominator > 1e-12 else 0.0
+        self.flow += self.flow_alpha * (slope - self.flow)
+        return self.steady, self.flow
+
+    def get_state(self) -> dict:
+        return {
+            'steady': self.steady,
+            'flow_kg_s': round(self.flow, 2),
+            'std_kg': None if self.std_kg is None else round(self.std_kg, 3),
+        }
+
+
+def build_motion(config: dict, scales) -> Dict[str, MotionEstimator]:
+    """One motion estimator per scale from the "scale_motion" config block"""
+    motion_config = config.get('scale_motion', {})
+    return {
+        scale_name: MotionEstimator(
+            motion_config.get('window_s', 1.0),
+            motion_config.get('steady_threshold_kg', 0.5),
+            motion_config.get('min_samples', 3),
+            motion_config.get('flow_alpha', 0.3)
+        )
+        for scale_name in scales
+    }
@@ -2,100 +2,188 @@
 """
 RS232 Scale Reader Module
 Reads weight data from 4 RS232 indicators in parallel
+
+Reader modes (serial_config.reader_mode):
+- "selector": one thread waits on all ports (POSIX, default on Linux)
+- "blocking": one thread per port, blocking reads with timeout (default on Windows)
+- "polling":  one thread per port polling in_waiting every 10ms (legacy)
 """
 
+import os
+import selectors
 import serial
 import threading
 import time
-import re
 import json
-from typing import Dict, Optional
+from typing import Dict, Optional, Callable, List
+from sample_buffer import SampleRing, SampleSlice
+from weight_parser import WeightParser, WeightFrame
+from scale_filters import MotionEstimator, ScaleFilterChain, build_filters, build_motion
+
+# Unterminated bytes kept per port before the buffer is discarded
+MAX_PENDING_BYTES = 4096
 
 class ScaleReader:
-    def __init__(self, config: dict):
+    def __init__(self, config: dict, recorder=None):
         self.config = config
+        self.recorder = recorder  # TrafficRecorder: raw chunks are captured as received
         self.serial_ports = config['serial_ports']
         self.serial_config = config['serial_config']
-        self.weights = {
-            'pasir': 0.0,
-            'batu': 0.0,
-            'semen': 0.0,
-            'air': 0.0
-        }
+        self.reader_mode = self.serial_config.get('reader_mode', 'auto')
+        if self.reader_mode == 'auto':
+            self.reader_mode = 'selector' if os.name == 'posix' else 'blocking'
+        elif self.reader_mode == 'selector' and os.name != 'posix':
+            print("⚠️  Selector reader mode needs POSIX serial ports, using blocking mode")
+            self.reader_mode = 'blocking'
+        self.weights = {scale_name: 0.0 for scale_name in self.serial_ports}
+        self.raw_weights = dict(self.weights)  # Before the filter stage
         self.lock = threading.Lock()
         self.running = False
         self.threads = []
         self.serial_connections = {}
+        self.buffers: Dict[str, bytearray] = {
+            scale_name: bytearray() for scale_name in self.serial_ports
+        }
         
-    def parse_weight(self, data: str) -> Optional[float]:
+        # Per-port frame format (see weight_parser.py), default "generic"
+        profiles = config.get('indicator_profiles', {})
+        self.parsers: Dict[str, WeightParser] = {
+            scale_name: WeightParser.from_config(profiles.get(scale_name))
+            for scale_name in self.serial_ports
+        }
+        self.status: Dict[str, Dict[str, Optional[bool]]] = {
+            scale_name: {'stable': None, 'overload': False, 'net': None}
+            for scale_name in self.serial_ports
+        }
+        
+        # Bounded per-scale sample history (16 bytes per sample)
+        history_size = self.serial_config.get('history_size', 6000)
+        self.history: Dict[str, SampleRing] = {
+            scale_name: SampleRing(history_size) for scale_name in self.serial_ports
+        }
+        
+        # Outlier rejection + smoothing per scale (scale_filters block);
+        # published weights and history are filtered, raw values kept aside
+        self.filters: Dict[str, ScaleFilterChain] = build_filters(config, self.serial_ports)
+        self.raw_history: Dict[str, SampleRing] = {
+            scale_name: SampleRing(history_size) for scale_name in self.filters
+        }
+        
+        # Steady flag + flow rate per scale (scale_motion block)
+        self.motion: Dict[str, MotionEstimator] = build_motion(config, self.serial_ports)
+        self.sample_listeners: List[Callable[[str, float, float, float], None]] = []
+        
+    def add_sample_listener(self, callback: Callable[[str, float, float, float], None]):
         """
-        Parse weight from indicator data
-        Common formats:
-        - "WT:  125.5 kg\\r\\n"
-        - "GROSS:340.2KG\\r\\n"
-        - "+089.7\\r\\n"
-        - "  125.5  \\r\\n"
+        Register callback(scale_name, weight, monotonic_time, raw) called from
+        the reader thread for every parsed sample. Keep callbacks fast.
+        weight is outlier-rejected but not smoothed, so closed-loop control
+        does not inherit the smoother's lag; raw is the parsed reading.
         """
-        try:
-            # Remove common prefixes and units
-            cleaned = data.upper()
-            cleaned = cleaned.replace('WT:', '')
-            cleaned = cleaned.replace('GROSS:', '')
-            cleaned = cleaned.replace('NET:', '')
-            cleaned = cleaned.replace('KG', '')
-            cleaned = cleaned.replace('\\r', '')
-            cleaned = cleaned.replace('\\n', '')
-            cleaned = cleaned.strip()
+        self.sample_listeners.append(callback)
+    
+    def publish_sample(self, scale_name: str, weight: float):
+        """Filter and store a parsed sample, then notify listeners"""
+        sample_time = time.monotonic()
+        raw = control = weight
+        chain = self.filters.get(scale_name)
+        if chain:
+            weight = chain.update(raw, sample_time)
+            control = chain.despiked
+            self.raw_history[scale_name].append(sample_time, raw)
+        with self.lock:
+            self.weights[scale_name] = weight
+            self.raw_weights[scale_name] = raw
+            self.motion[scale_name].update(sample_time, weight)
+        self.history[scale_name].append(sample_time, weight)
+        
+        for callback in self.sample_listeners:
+            try:
+                callback(scale_name, control, sample_time, raw)
+            except Exception as e:
+                print(f"⚠️  Sample listener error on {scale_name}: {e}")
+        
+    def open_serial(self, port: str, timeout=None) -> serial.Serial:
+        """Open an indicator serial port with the shared serial settings"""
+        return serial.Serial(
+            port=port,
+            baudrate=self.serial_config['baudrate'],
+            bytesize=self.serial_config['bytesize'],
+            parity=self.serial_config['parity'],
+            stopbits=self.serial_config['stopbits'],
+            timeout=self.serial_config['timeout'] if timeout is None else timeout
+        )
+    
+    def handle_frame(self, scale_name: str, frame: WeightFrame):
+        """Record indicator status bits and publish the weight if valid"""
+        with self.lock:
+            status = self.status[scale_name]
+            status['stable'] = frame.stable
+            status['overload'] = frame.overload
+            status['net'] = frame.net
+        
+        # Overload / out-of-range readings are not published as weights
+        if not frame.overload:
+            self.publish_sample(scale_name, frame.weight)
+    
+    def handle_data(self, scale_name: str, data: bytes):
+        """
+        Append raw bytes from an indicator and process complete lines
+        Frames are scanned by index inside a reusable per-port bytearray and
+        parsed in place; consumed bytes are dropped once per chunk, so a
+        backlog of N frames drains in O(N).
+        """
+        if self.recorder:
+            self.recorder.record_serial(scale_name, data)
+        buffer = self.buffers[scale_name]
+        buffer += data
+        parse = self.parsers[scale_name].parse
+        
+        # Process complete lines
+        start = 0
+        end = buffer.find(b'\n')
+        while end >= 0:
+            frame = parse(buffer, start, end)
             
-            # Extract floating point number (including negative)
-            match = re.search(r'[+-]?\\d+\\.?\\d*', cleaned)
-            if match:
-                weight = float(match.group())
-                # Sanity check
-                if -10000 <= weight <= 10000:
-                    return weight
-            return None
-        except Exception as e:
-            print(f"Error parsing weight from '{data}': {e}")
-            return None
+            if frame is not None:
+                self.handle_frame(scale_name, frame)
+            
+            start = end + 1
+            end = buffer.find(b'\n', start)
+        
+        if start:
+            del buffer[:start]
+        elif len(buffer) > MAX_PENDING_BYTES:
+            # No line terminator in sight: wrong baudrate or garbage on the line
+            buffer.clear()
     
     def read_scale(self, scale_name: str, port: str):
-        """Read from a single scale continuously"""
+        """Read from a single scale continuously (one thread per port)"""
         print(f"Starting reader for {scale_name} on {port}")
         
         try:
             # Open serial connection
-            ser = serial.Serial(
-                port=port,
-                baudrate=self.serial_config['baudrate'],
-                bytesize=self.serial_config['bytesize'],
-                parity=self.serial_config['parity'],
-                stopbits=self.serial_config['stopbits'],
-                timeout=self.serial_config['timeout']
-            )
+            ser = self.open_serial(port)
             
             self.serial_connections[scale_name] = ser
             print(f"✅ Connected to {scale_name} indicator at {port}")
             
-            buffer = ""
-            
             while self.running:
                 try:
-                    # Read data from serial port
-                    if ser.in_waiting > 0:
-                        data = ser.read(ser.in_waiting).decode('ascii', errors='ignore')
-                        buffer += data
-                        
-                        # Process complete lines
-                        while '\\n' in buffer:
-                            line, buffer = buffer.split('\\n', 1)
-                            weight = self.parse_weight(line)
-                            
-                            if weight is not None:
-                                with self.lock:
-                                    self.weights[scale_name] = weight
-                                    
-                    time.sleep(0.01)  # 10ms sleep
+                    if self.reader_mode == 'polling':
+                        # Legacy mode: poll in_waiting every 10ms
+                        if ser.in_waiting > 0:
+                            self.handle_data(scale_name, ser.read(ser.in_waiting))
+                        time.sleep(0.01)  # 10ms sleep
+                    else:
+                        # Blocking mode: wake as soon as the first byte lands,
+                        # then drain whatever else is already buffered
+                        data = ser.read(1)
+                        if data:
+                            waiting = ser.in_waiting
+                            if waiting:
+                                data += ser.read(waiting)
+                            self.handle_data(scale_name, data)
                     
                 except serial.SerialException as e:
                     print(f"Serial error on {scale_name}: {e}")
@@ -107,40 +195,93 @@ class ScaleReader:
             
         finally:
             if scale_name in self.serial_connections:
-                self.serial_connections[scale_name].close()
-                del self.serial_connections[scale_name]
+                self.serial_connections.pop(scale_name).close()
+    
+    def read_all_scales(self):
+        """
+        Read all scales from a single thread (POSIX only)
+        Waits on every indicator file descriptor at once with selectors
+        (epoll on Linux) and processes bytes as soon as they arrive.
+        """
+        selector = selectors.DefaultSelector()
+        
+        # Reusable read buffer; handle_data copies bytes out of it
+        chunk = bytearray(4096)
+        chunk_view = memoryview(chunk)
+        
+        for scale_name, port in self.serial_ports.items():
+            try:
+                # Non-blocking port, reads are driven by the selector
+                ser = self.open_serial(port, timeout=0)
+                self.serial_connections[scale_name] = ser
+                selector.register(ser.fileno(), selectors.EVENT_READ, scale_name)
+                print(f"✅ Connected to {scale_name} indicator at {port}")
+            except Exception as e:
+                print(f"❌ Failed to connect to {scale_name} at {port}: {e}")
+                print(f"   Make sure the device is connected and you have permission")
+        
+        try:
+            while self.running and selector.get_map():
+                for key, _ in selector.select(timeout=0.5):
+                    scale_name = key.data
+                    try:
+                        count = os.readv(key.fd, [chunk_view])
+                    except BlockingIOError:
+                        continue
+                    except OSError as e:
+                        count = 0
+                        print(f"Serial error on {scale_name}: {e}")
+                    
+                    if not count:
+                        # Port closed / device gone
+                        print(f"⚠️  Indicator {scale_name} disconnected")
+                        selector.unregister(key.fd)
+                        self.serial_connections.pop(scale_name).close()
+                        continue
+                    
+                    self.handle_data(scale_name, chunk_view[:count])
+        finally:
+            selector.close()
+            for scale_name in list(self.serial_connections.keys()):
+                self.serial_connections.pop(scale_name).close()
     
     def start(self):
         """Start reading from all scales"""
         self.running = True
         
-        # Start a thread for each scale
-        for scale_name, port in self.serial_ports.items():
-            thread = threading.Thread(
-                target=self.read_scale,
-                args=(scale_name, port),
-                daemon=True
-            )
+        if self.reader_mode == 'selector':
+            # One thread waits on all ports
+            thread = threading.Thread(target=self.read_all_scales, daemon=True)
             thread.start()
             self.threads.append(thread)
+        else:
+            # Start a thread for each scale
+            for scale_name, port in self.serial_ports.items():
+                thread = threading.Thread(
+                    target=self.read_scale,
+                    args=(scale_name, port),
+                    daemon=True
+                )
+                thread.start()
+                self.threads.append(thread)
             
-        print(f"✅ Scale reader started with {len(self.threads)} threads")
+        print(f"✅ Scale reader started ({self.reader_mode} mode, {len(self.threads)} threads)")
     
     def stop(self):
         """Stop all reading threads"""
         print("Stopping scale reader...")
         self.running = False
         
-        # Close all serial connections
-        for ser in self.serial_connections.values():
+        # Wait for threads to finish (they close their own ports)
+        for thread in self.threads:
+            thread.join(timeout=2)
+        
+        # Close any connection left behind by a stuck thread
+        for ser in list(self.serial_connections.values()):
             try:
                 ser.close()
             except:
                 pass
-        
-        # Wait for threads to finish
-        for thread in self.threads:
-            thread.join(timeout=2)
             
         print("✅ Scale reader stopped")
     
@@ -148,6 +289,43 @@ class ScaleReader:
         """Get current weights (thread-safe)"""
         with self.lock:
             return self.weights.copy()
+    
+    def get_motion(self) -> Dict[str, dict]:
+        """Per scale: steady flag, flow rate (kg/s) and window std dev (thread-safe)"""
+        with self.lock:
+            return {scale_name: motion.get_state() for scale_name, motion in self.motion.items()}
+    
+    def get_snapshot(self) -> Dict[str, dict]:
+        """Per scale: filtered + raw weight, steady flag and flow rate"""
+        with self.lock:
+            return {
+                scale_name: dict(motion.get_state(), weight=self.weights[scale_name],
+                                 raw=self.raw_weights[scale_name])
+                for scale_name, motion in self.motion.items()
+            }
+    
+    def get_raw_weights(self) -> Dict[str, float]:
+        """Current weights before the filter stage (thread-safe)"""
+        with self.lock:
+            return self.raw_weights.copy()
+    
+    def get_filter_stats(self) -> Dict[str, dict]:
+        """Per scale: raw/filtered value, outliers, compute time and lag per stage"""
+        return {scale_name: chain.get_stats() for scale_name, chain in self.filters.items()}
+    
+    def get_scale_status(self) -> Dict[str, Dict[str, Optional[bool]]]:
+        """Get last indicator status bits per scale (stable / overload / net)"""
+        with self.lock:
+            return {name: status.copy() for name, status in self.status.items()}
+    
+    def get_window(self, scale_name: str, seconds: float, raw: bool = False) -> SampleSlice:
+        """Samples of one scale from the last `seconds` (array-backed copy)"""
+        history = self.raw_history if raw and scale_name in self.raw_history else self.history
+        return history[scale_name].get_window(seconds, time.monotonic())
+    
+    def get_since(self, scale_name: str, seq: int) -> SampleSlice:
+        """Samples of one scale with sequence number >= seq; pass next_seq back in"""
+        return self.history[scale_name].get_since(seq)
 
 # Test standalone
 if __name__ == "__main__":
@@ -0,0 +1,19 @@
+"""
+Batch plant hardware simulator (Linux)
+
+Stands in for the plant so the controller can run and be load-tested on any
+Linux box:
+- indicators.py:  one pseudo-terminal per weight indicator, emitting frames
+                  in the configured indicator profile at a configurable rate
+- rtu_slave.py:   Modbus RTU slaves on pseudo-terminals: the ARM/ARX relay
+                  coils (FC01/05/15) and the PZEM-016 (FC04)
+- physics.py:     material flow between bins, scales and the mixer driven by
+                  the relay coils, mixer current from its load
+
+Run `python -m simulator --profile simulator`, then
+`python main.py --profile simulator`.
+"""
+
+from .plant_simulator import PlantSimulator
+
+__all__ = ['PlantSimulator']
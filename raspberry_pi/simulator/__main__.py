@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Run the hardware simulator until Ctrl+C
+
+Usage (from raspberry_pi/):
+    python -m simulator [--config config_autonics.json] [--profile simulator]
+                        [--rate-hz 50] [--seed 1] [--status-s 5]
+"""
+
+import argparse
+import json
+import signal
+import threading
+from config_loader import load_config
+from .plant_simulator import PlantSimulator
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch plant hardware simulator (pseudo-terminals)")
+    parser.add_argument('--config', default='config_autonics.json', help="Controller configuration")
+    parser.add_argument('--profile', default='simulator', help="Config profile naming the simulated ports")
+    parser.add_argument('--rate-hz', type=float, help="Frame rate of every indicator (overrides the config)")
+    parser.add_argument('--seed', type=int, help="Noise seed (overrides simulator.seed)")
+    parser.add_argument('--status-s', type=float, default=0, help="Print plant state every N seconds")
+    args = parser.parse_args()
+
+    config = load_config(args.config, args.profile)
+    simulator = PlantSimulator(config, args.rate_hz, args.seed)
+
+    stop = threading.Event()
+    signal.signal(signal.SIGINT, lambda signum, frame: stop.set())
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+
+    simulator.start()
+    print(f"✅ Simulator running - start the controller with: python main.py --profile {args.profile}")
+    while not stop.wait(args.status_s or None):
+        print(f"📊 [sim] {json.dumps(simulator.physics.get_state())}")
+
+    simulator.stop()
+    print(f"✅ Simulator stopped: {json.dumps(simulator.get_stats())}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Virtual Weight Indicators
+One pseudo-terminal per scale, streaming frames in the format of the
+indicator profile the controller parses for that port (weight_parser.py)
+"""
+
+import random
+from typing import Callable, Dict
+from .ports import open_pty, close_pty, write_frame
+
+
+def _generic(weight: float, moving: bool, overload: bool) -> str:
+    return f"{weight:8.1f} kg"
+
+
+def _wt(weight: float, moving: bool, overload: bool) -> str:
+    return f"WT:{weight:8.1f} kg"
+
+
+def _gross_net(weight: float, moving: bool, overload: bool) -> str:
+    return f"GROSS:{weight:.1f}KG"
+
+
+def _fixed_width(weight: float, moving: bool, overload: bool) -> str:
+    return f"{weight:+07.1f}"
+
+
+def _st_gs(weight: float, moving: bool, overload: bool) -> str:
+    status = 'OL' if overload else 'US' if moving else 'ST'
+    return f"{status},GS,{weight:+08.1f}kg"
+
+
+FRAME_FORMATS: Dict[str, Callable[[float, bool, bool], str]] = {
+    'generic': _generic,
+    'wt': _wt,
+    'gross_net': _gross_net,
+    'fixed_width': _fixed_width,
+    'st_gs': _st_gs,
+}
+
+
+class IndicatorPort:
+    def __init__(self, scale: str, link: str, frame_format: str = 'generic', rate_hz: float = 10.0,
+                 noise_kg: float = 0.2, resolution_kg: float = 0.1, capacity_kg: float = 5000.0,
+                 rng: random.Random = None):
+        if frame_format not in FRAME_FORMATS:
+            raise ValueError(f"Simulator indicator {scale}: unknown format '{frame_format}'")
+        self.scale = scale
+        self.link = link
+        self.frame_format = frame_format
+        self.format = FRAME_FORMATS[frame_format]
+        self.interval = 1.0 / rate_hz
+        self.noise = noise_kg
+        self.resolution = resolution_kg
+        self.capacity = capacity_kg
+        self.rng = rng or random.Random()
+
+        self.master, self.slave, self.device = open_pty(link)
+        self.next_due = 0.0
+        self.frames = 0
+        self.dropped = 0
+
+    def send(self, weight: float, moving: bool):
+        if self.noise:
+            weight += self.rng.gauss(0.0, self.noise)
+        if self.resolution:
+            weight = round(weight / self.resolution) * self.resolution
+        frame = (self.format(weight, moving, weight > self.capacity) + "\r\n").encode()
+        if write_frame(self.master, self.slave, frame):
+            self.frames += 1
+        else:
+            self.dropped += 1
+
+    def close(self):
+        close_pty(self.master, self.slave, self.link)
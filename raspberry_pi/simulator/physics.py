@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Plant Physics
+Material levels on the scales and in the mixer, moved by the relay coils
+
+Each flow ("simulator.flows") moves material from a source (a scale, or an
+endless bin/silo when "from" is null) to a target (a scale, "mixer", or out
+of the plant when "to" is null) at kg_s while its relay coil is ON. The rate
+follows the coil with a first-order lag (flow_time_constant_s), so material
+still in flight keeps landing after a gate closes, as on the real plant.
+
+The mixer motor (pzem.relay) draws no_load_a plus a_per_kg per kg of
+material in the drum; the PZEM-016 registers are derived from that current.
+"""
+
+import random
+import threading
+from typing import Dict, List, Optional, Tuple
+
+MIXER = 'mixer'
+
+DEFAULT_FLOWS = [
+    {'relay': 'pintu_pasir_1', 'from': None, 'to': 'pasir', 'kg_s': 40.0},
+    {'relay': 'pintu_pasir_2', 'from': None, 'to': 'pasir', 'kg_s': 40.0},
+    {'relay': 'pintu_batu_1', 'from': None, 'to': 'batu', 'kg_s': 40.0},
+    {'relay': 'pintu_batu_2', 'from': None, 'to': 'batu', 'kg_s': 40.0},
+    {'relay': 'silo_1', 'from': None, 'to': 'semen', 'kg_s': 15.0},
+    {'relay': 'silo_2', 'from': None, 'to': 'semen', 'kg_s': 15.0},
+    {'relay': 'dump_material', 'from': 'pasir', 'to': MIXER, 'kg_s': 80.0},
+    {'relay': 'dump_material_2', 'from': 'batu', 'to': MIXER, 'kg_s': 80.0},
+    {'relay': 'tuang_air', 'from': 'air', 'to': MIXER, 'kg_s': 20.0},
+    {'relay': 'pintu_mixer_buka', 'from': MIXER, 'to': None, 'kg_s': 150.0},
+]
+
+# Below this a flow counts as stopped (indicator "stable")
+MOVING_KG_S = 0.05
+
+
+class MaterialFlow:
+    def __init__(self, relay: str, coil: int, source: Optional[str], target: Optional[str], kg_s: float):
+        self.relay = relay
+        self.coil = coil
+        self.source = source
+        self.target = target
+        self.kg_s = kg_s
+        self.rate = 0.0
+
+
+class PlantPhysics:
+    def __init__(self, config: dict, scales: List[str], relay_mapping: Dict[str, int], seed: int = None):
+        sim = config.get('simulator', {})
+        self.time_constant = sim.get('flow_time_constant_s', 0.3)
+        self.rng = random.Random(sim.get('seed') if seed is None else seed)
+
+        initial = sim.get('initial_kg', {})
+        self.levels: Dict[str, float] = {name: float(initial.get(name, 0.0)) for name in list(scales) + [MIXER]}
+
+        self.flows: List[MaterialFlow] = []
+        for spec in sim.get('flows', DEFAULT_FLOWS):
+            relay = spec['relay']
+            if relay not in relay_mapping:
+                raise ValueError(f"Simulator flow: unknown relay '{relay}'")
+            for end in (spec.get('from'), spec.get('to')):
+                if end is not None and end not in self.levels:
+                    raise ValueError(f"Simulator flow {relay}: unknown scale '{end}'")
+            self.flows.append(MaterialFlow(relay, relay_mapping[relay], spec.get('from'),
+                                           spec.get('to'), float(spec.get('kg_s', 10.0))))
+
+        pzem = sim.get('pzem', {})
+        self.mixer_coil = relay_mapping.get(pzem.get('relay', 'mixer'))
+        self.voltage = pzem.get('voltage', 230.0)
+        self.frequency = pzem.get('frequency', 50.0)
+        self.power_factor = pzem.get('power_factor', 0.85)
+        self.no_load_a = pzem.get('no_load_a', 35.0)
+        self.a_per_kg = pzem.get('a_per_kg', 0.02)
+        self.current_noise = pzem.get('noise_a', 0.5)
+        self.energy_wh = 0.0
+        self.current = 0.0
+
+        self.coil_image = 0
+        self.lock = threading.Lock()
+
+    def set_coils(self, image: int):
+        with self.lock:
+            self.coil_image = image
+
+    def step(self, dt: float):
+        """Advance the plant by dt seconds"""
+        with self.lock:
+            alpha = min(1.0, dt / self.time_constant) if self.time_constant > 0 else 1.0
+            image = self.coil_image
+            for flow in self.flows:
+                target_rate = flow.kg_s if image >> flow.coil & 1 else 0.0
+                flow.rate += alpha * (target_rate - flow.rate)
+                amount = flow.rate * dt
+                if flow.source is not None:
+                    amount = min(amount, self.levels[flow.source])
+                    self.levels[flow.source] -= amount
+                if flow.target is not None:
+                    self.levels[flow.target] += amount
+
+            if self.mixer_coil is not None and image >> self.mixer_coil & 1:
+                self.current = self.no_load_a + self.a_per_kg * self.levels[MIXER]
+                self.energy_wh += self.voltage * self.current * self.power_factor * dt / 3600.0
+            else:
+                self.current = 0.0
+
+    def reading(self, scale: str) -> Tuple[float, bool]:
+        """(kg on the scale, material moving on/off it)"""
+        with self.lock:
+            moving = any(
+                abs(flow.rate) > MOVING_KG_S and scale in (flow.source, flow.target)
+                for flow in self.flows
+            )
+            return self.levels[scale], moving
+
+    def pzem_registers(self) -> List[int]:
+        """PZEM-016 input registers 0x0000-0x0009 (32-bit values low word first)"""
+        with self.lock:
+            current = self.current
+            if current:
+                current = max(current + self.rng.gauss(0.0, self.current_noise), 0.0)
+            voltage = self.voltage + self.rng.gauss(0.0, 0.5)
+            power = voltage * current * self.power_factor
+            energy = int(self.energy_wh)
+        amps = int(current * 1000)
+        watts = int(power * 10)
+        return [
+            int(voltage * 10) & 0xFFFF,
+            amps & 0xFFFF, amps >> 16 & 0xFFFF,
+            watts & 0xFFFF, watts >> 16 & 0xFFFF,
+            energy & 0xFFFF, energy >> 16 & 0xFFFF,
+            int(self.frequency * 10),
+            int(self.power_factor * 100) if current else 0,
+            0,
+        ]
+
+    def reset_energy(self):
+        with self.lock:
+            self.energy_wh = 0.0
+
+    def get_state(self) -> dict:
+        with self.lock:
+            return {
+                'levels': {name: round(level, 1) for name, level in self.levels.items()},
+                'flows': {flow.relay: round(flow.rate, 1) for flow in self.flows if flow.rate > MOVING_KG_S},
+                'mixer_a': round(self.current, 1),
+            }
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Plant Simulator
+Wires the physics, virtual indicators and Modbus slaves to the ports named
+in the (profile-merged) controller config:
+
+- serial_ports.<scale>  → indicator pseudo-terminal per scale
+- modbus.port           → ARM/ARX coils at modbus.arm_slave_id
+- ampere_meter.port     → PZEM-016 at ampere_meter.slave_id (if enabled;
+                          shares the bus when it is the same port)
+
+One thread steps the physics every tick_ms and sends indicator frames when
+due; each bus answers requests on its own thread.
+"""
+
+import threading
+import time
+from typing import Dict
+from .indicators import IndicatorPort
+from .physics import PlantPhysics
+from .rtu_slave import CoilSlave, PzemSlave, RtuSlaveBus
+
+# ARM-DO08P-4S + 2x ARX-DO08P-4S
+COIL_COUNT = 24
+
+
+class PlantSimulator:
+    def __init__(self, config: dict, rate_hz: float = None, seed: int = None):
+        sim = config.get('simulator', {})
+        self.tick = sim.get('tick_ms', 10) / 1000.0
+        self.name_by_coil = {coil: name for name, coil in config['relay_mapping'].items()}
+        self.coil_image = 0
+
+        self.physics = PlantPhysics(config, list(config['serial_ports']), config['relay_mapping'], seed)
+
+        # Frame format per scale: simulator override, else the controller's indicator profile
+        defaults = sim.get('indicators', {})
+        overrides = sim.get('scales', {})
+        profiles = config.get('indicator_profiles', {})
+        self.indicators = []
+        for scale, port in config['serial_ports'].items():
+            spec = dict(defaults, **overrides.get(scale, {}))
+            profile = profiles.get(scale, 'generic')
+            frame_format = spec.get('format') or (profile if isinstance(profile, str)
+                                                  else profile.get('format', 'generic'))
+            self.indicators.append(IndicatorPort(
+                scale, port, frame_format,
+                rate_hz or spec.get('rate_hz', 10.0),
+                spec.get('noise_kg', 0.2),
+                spec.get('resolution_kg', 0.1),
+                spec.get('capacity_kg', 5000.0),
+                self.physics.rng
+            ))
+
+        bus_config = sim.get('modbus', {})
+        self.buses: Dict[str, RtuSlaveBus] = {}
+        modbus = config['modbus']
+        self._bus(modbus['port'], modbus['baudrate'], bus_config).add_slave(
+            modbus['arm_slave_id'], CoilSlave(COIL_COUNT, self.on_coils))
+        ampere = config.get('ampere_meter', {})
+        if ampere.get('enabled', False):
+            self._bus(ampere.get('port', 'COM6'), ampere.get('baudrate', 9600), bus_config).add_slave(
+                ampere.get('slave_id', 10), PzemSlave(self.physics))
+
+        self.running = False
+        self.thread = None
+
+    def _bus(self, port: str, baudrate: int, bus_config: dict) -> RtuSlaveBus:
+        if port not in self.buses:
+            self.buses[port] = RtuSlaveBus(
+                port, baudrate,
+                bus_config.get('turnaround_ms', 5.0),
+                bus_config.get('line_speed', True)
+            )
+        return self.buses[port]
+
+    def on_coils(self, image: int):
+        """Coil write on the ARM bus (bus thread)"""
+        changed = image ^ self.coil_image
+        self.coil_image = image
+        self.physics.set_coils(image)
+        for coil in range(COIL_COUNT):
+            if changed >> coil & 1:
+                name = self.name_by_coil.get(coil, f"coil {coil}")
+                print(f"🔌 [sim] {name} → {'ON' if image >> coil & 1 else 'OFF'}")
+
+    def start(self):
+        self.running = True
+        for bus in self.buses.values():
+            bus.start()
+        self.thread = threading.Thread(target=self._run, name='plant-sim', daemon=True)
+        self.thread.start()
+        for indicator in self.indicators:
+            print(f"⚖️  [sim] {indicator.scale}: {indicator.link} → {indicator.device} "
+                  f"({indicator.frame_format}, {1.0 / indicator.interval:g} Hz)")
+        for port, bus in self.buses.items():
+            print(f"🔌 [sim] Modbus RTU slaves {sorted(bus.slaves)}: {port} → {bus.device}")
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout=1.0)
+        for bus in self.buses.values():
+            bus.stop()
+        for indicator in self.indicators:
+            indicator.close()
+
+    def _run(self):
+        last = time.monotonic()
+        for indicator in self.indicators:
+            indicator.next_due = last
+        next_tick = last
+        while self.running:
+            now = time.monotonic()
+            self.physics.step(now - last)
+            last = now
+
+            # Rates above 1 / tick_ms send several frames per tick
+            for indicator in self.indicators:
+                if now - indicator.next_due > 1.0:
+                    indicator.next_due = now  # Fell far behind: skip missed frames
+                if now >= indicator.next_due:
+                    weight, moving = self.physics.reading(indicator.scale)
+                    while now >= indicator.next_due:
+                        indicator.send(weight, moving)
+                        indicator.next_due += indicator.interval
+
+            next_tick += self.tick
+            delay = next_tick - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_tick = time.monotonic()
+
+    def get_stats(self) -> dict:
+        stats = self.physics.get_state()
+        stats['indicators'] = {
+            indicator.scale: {'frames': indicator.frames, 'dropped': indicator.dropped}
+            for indicator in self.indicators
+        }
+        stats['buses'] = {port: bus.get_stats() for port, bus in self.buses.items()}
+        return stats
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Pseudo-terminal ports
+The simulator keeps the master side; the controller opens the slave device
+through a stable symlink (the path configured as its serial port).
+"""
+
+import os
+import termios
+import tty
+from typing import Tuple
+
+
+def open_pty(link: str) -> Tuple[int, int, str]:
+    """
+    Create a pseudo-terminal and point `link` at its slave device
+    Returns:
+        (master fd, slave fd, slave device name). The slave fd stays open so
+        the device exists until close_pty.
+    """
+    master, slave = os.openpty()
+    # Raw mode before anyone connects: no echo, no line editing, binary safe
+    tty.setraw(slave)
+    os.set_blocking(master, False)
+    device = os.ttyname(slave)
+
+    directory = os.path.dirname(os.path.abspath(link))
+    os.makedirs(directory, exist_ok=True)
+    if os.path.islink(link):
+        os.unlink(link)
+    elif os.path.exists(link):
+        os.close(master)
+        os.close(slave)
+        raise ValueError(f"{link} exists and is not a simulator symlink")
+    os.symlink(device, link)
+    return master, slave, device
+
+
+def close_pty(master: int, slave: int, link: str):
+    for fd in (master, slave):
+        try:
+            os.close(fd)
+        except OSError:
+            pass
+    if os.path.islink(link):
+        os.unlink(link)
+
+
+def write_frame(master: int, slave: int, frame: bytes) -> bool:
+    """
+    Write without blocking. With nobody reading, the pty buffer fills up:
+    drop the backlog (like a line nobody listens to) and write fresh data.
+    Returns False if the frame was dropped.
+    """
+    try:
+        os.write(master, frame)
+        return True
+    except BlockingIOError:
+        termios.tcflush(slave, termios.TCIFLUSH)
+        try:
+            os.write(master, frame)
+            return True
+        except BlockingIOError:
+            return False
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Modbus RTU Slaves
+A pseudo-terminal RS-485 bus answering for one or more slave ids
+
+- CoilSlave: ARM-DO08P-4S + ARX-DO08P-4S coils (FC01 read, FC05 write
+  single, FC15 write multiple)
+- PzemSlave: PZEM-016 input registers (FC04; FC03 answered the same) and the
+  0x42 energy reset
+
+Requests are delimited by their function code's length and checked by CRC.
+Frames for other slave ids are ignored, as on a shared bus. Each response
+waits for the request and response wire time at the bus baudrate plus
+turnaround_ms, so bus timing matches the real line.
+"""
+
+import os
+import select
+import struct
+import threading
+import time
+from typing import Callable, Dict, Optional
+from .ports import open_pty, close_pty
+
+ILLEGAL_FUNCTION = 0x01
+ILLEGAL_ADDRESS = 0x02
+ILLEGAL_VALUE = 0x03
+
+# Bits per character on the wire (start + 8 data + parity/stop)
+BITS_PER_CHAR = 10
+
+
+def _crc_table():
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xA001 if crc & 1 else crc >> 1
+        table.append(crc)
+    return table
+
+
+_CRC_TABLE = _crc_table()
+
+
+def crc16(data: bytes) -> int:
+    """Modbus CRC-16 (sent low byte first)"""
+    crc = 0xFFFF
+    for byte in data:
+        crc = (crc >> 8) ^ _CRC_TABLE[(crc ^ byte) & 0xFF]
+    return crc
+
+
+def request_length(buffer: bytearray) -> Optional[int]:
+    """Full length of the request at the start of buffer, None if not known yet"""
+    function = buffer[1]
+    if function in (0x01, 0x02, 0x03, 0x04, 0x05, 0x06):
+        return 8
+    if function in (0x0F, 0x10):
+        return 9 + buffer[6] if len(buffer) >= 7 else None
+    if function == 0x42:
+        return 4
+    return len(buffer)  # Unknown function: one write = one frame on a pty
+
+
+class SlaveException(Exception):
+    def __init__(self, code: int):
+        super().__init__(f"Modbus exception {code}")
+        self.code = code
+
+
+class CoilSlave:
+    def __init__(self, coil_count: int, on_write: Callable[[int], None]):
+        self.coil_count = coil_count
+        self.on_write = on_write
+        self.image = 0
+
+    def _check_range(self, address: int, count: int):
+        if count < 1 or address + count > self.coil_count:
+            raise SlaveException(ILLEGAL_ADDRESS)
+
+    def handle(self, function: int, data: bytes) -> bytes:
+        if function == 0x01:
+            address, count = struct.unpack_from('>HH', data)
+            self._check_range(address, count)
+            size = (count + 7) // 8
+            bits = self.image >> address & ((1 << count) - 1)
+            return bytes([size]) + bits.to_bytes(size, 'little')
+
+        if function == 0x05:
+            address, value = struct.unpack_from('>HH', data)
+            self._check_range(address, 1)
+            if value not in (0xFF00, 0x0000):
+                raise SlaveException(ILLEGAL_VALUE)
+            if value:
+                self.image |= 1 << address
+            else:
+                self.image &= ~(1 << address)
+            self.on_write(self.image)
+            return data[:4]
+
+        if function == 0x0F:
+            address, count, size = struct.unpack_from('>HHB', data)
+            self._check_range(address, count)
+            mask = (1 << count) - 1
+            values = int.from_bytes(data[5:5 + size], 'little') & mask
+            self.image = self.image & ~(mask << address) | values << address
+            self.on_write(self.image)
+            return data[:4]
+
+        raise SlaveException(ILLEGAL_FUNCTION)
+
+
+class PzemSlave:
+    def __init__(self, physics, register_count: int = 10):
+        self.physics = physics
+        self.register_count = register_count
+
+    def handle(self, function: int, data: bytes) -> bytes:
+        if function in (0x03, 0x04):
+            address, count = struct.unpack_from('>HH', data)
+            if count < 1 or address + count > self.register_count:
+                raise SlaveException(ILLEGAL_ADDRESS)
+            registers = self.physics.pzem_registers()[address:address + count]
+            return bytes([count * 2]) + struct.pack(f'>{count}H', *registers)
+        if function == 0x42:
+            self.physics.reset_energy()
+            return b''
+        raise SlaveException(ILLEGAL_FUNCTION)
+
+
+class RtuSlaveBus:
+    def __init__(self, link: str, baudrate: int = 9600, turnaround_ms: float = 5.0,
+                 line_speed: bool = True):
+        self.link = link
+        self.char_time = BITS_PER_CHAR / baudrate if line_speed else 0.0
+        self.turnaround = turnaround_ms / 1000.0
+        self.slaves: Dict[int, object] = {}
+
+        self.master, self.slave, self.device = open_pty(link)
+        self.buffer = bytearray()
+        self.requests = 0
+        self.exceptions = 0
+        self.crc_errors = 0
+
+        self.running = False
+        self.thread = None
+
+    def add_slave(self, slave_id: int, handler):
+        self.slaves[int(slave_id)] = handler
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name=f"rtu-{os.path.basename(self.link)}", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout=1.0)
+        close_pty(self.master, self.slave, self.link)
+
+    def _run(self):
+        while self.running:
+            ready, _, _ = select.select([self.master], [], [], 0.2)
+            if not ready:
+                continue
+            try:
+                self.buffer += os.read(self.master, 512)
+            except (BlockingIOError, OSError):
+                continue
+            self._process()
+
+    def _process(self):
+        buffer = self.buffer
+        while len(buffer) >= 4:
+            length = request_length(buffer)
+            if length is None or len(buffer) < length:
+                return
+            frame = bytes(buffer[:length])
+            if crc16(frame[:-2]) != int.from_bytes(frame[-2:], 'little'):
+                # Line noise or a partial frame: resync one byte later
+                self.crc_errors += 1
+                del buffer[0]
+                continue
+            del buffer[:length]
+            self._answer(frame)
+
+    def _answer(self, frame: bytes):
+        slave_id, function = frame[0], frame[1]
+        handler = self.slaves.get(slave_id)
+        if handler is None:
+            return
+        self.requests += 1
+        try:
+            pdu = bytes([slave_id, function]) + handler.handle(function, frame[2:-2])
+        except (SlaveException, struct.error) as e:
+            self.exceptions += 1
+            code = e.code if isinstance(e, SlaveException) else ILLEGAL_VALUE
+            pdu = bytes([slave_id, function | 0x80, code])
+        response = pdu + crc16(pdu).to_bytes(2, 'little')
+
+        delay = (len(frame) + len(response)) * self.char_time + self.turnaround
+        if delay:
+            time.sleep(delay)
+        try:
+            os.write(self.master, response)
+        except BlockingIOError:
+            pass  # Master not reading; it times out as on a dead line
+
+    def get_stats(self) -> dict:
+        return {
+            'device': self.device,
+            'requests': self.requests,
+            'exceptions': self.exceptions,
+            'crc_errors': self.crc_errors,
+        }
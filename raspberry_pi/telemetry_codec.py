@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Telemetry Codec Module
+Compact binary encoding of weight_update / ampere_update for clients that
+negotiate the "bp-bin.v1" WebSocket subprotocol. All other messages (acks,
+events) stay JSON text frames on the same connection.
+
+Frames (little endian, first byte = frame type):
+
+  0x01 index   <B B>  type, scale count, then per scale: <B> name length + UTF-8 name
+               Sent once after connect; scale i in weight frames refers to entry i.
+  0x02 weights <B B I Q H> type, flags (bit0 = keyframe), seq, timestamp ms,
+               scale mask (bit i = scale i present), then <f> kg per present scale
+  0x03 ampere  <B B Q f f f I f f f f> type, flags (bit0 = online, bit1 = alarm,
+               bit2 = mixer overload), timestamp ms, voltage, ampere, power, energy Wh, frequency,
+               power factor, rolling mean A, rolling peak A
+               Batch statistics are not in the frame; they arrive as JSON
+               (mixer_analytics, mixer_plateau, batch_started/batch_summary).
+"""
+
+import struct
+from typing import Callable, Dict, List, Optional
+
+SUBPROTOCOL = 'bp-bin.v1'
+
+FRAME_INDEX = 0x01
+FRAME_WEIGHTS = 0x02
+FRAME_AMPERE = 0x03
+
+FLAG_KEYFRAME = 0x01
+FLAG_ONLINE = 0x01
+FLAG_ALARM = 0x02
+FLAG_OVERLOAD = 0x04
+
+_INDEX_HEADER = struct.Struct('<BB')
+_WEIGHTS_HEADER = struct.Struct('<BBIQH')
+_AMPERE = struct.Struct('<BBQfffIffff')
+
+
+class TelemetryCodec:
+    def __init__(self, scales: List[str]):
+        """
+        Args:
+            scales: Scale names in index order (at most 16)
+        """
+        if len(scales) > 16:
+            raise ValueError("Binary weight frames support at most 16 scales")
+        self.scales = list(scales)
+        self.scale_index = {name: index for index, name in enumerate(self.scales)}
+
+        # Pre-built value structs for every possible scale count
+        self._values = [struct.Struct(f'<{count}f') for count in range(len(self.scales) + 1)]
+
+        self._encoders: Dict[str, Callable[[dict], bytes]] = {
+            'weight_update': self.encode_weights,
+            'ampere_update': self.encode_ampere,
+        }
+
+    def encoder_for(self, message_type: str) -> Optional[Callable[[dict], bytes]]:
+        """Binary encoder for a message type, or None if it stays JSON"""
+        return self._encoders.get(message_type)
+
+    def index_frame(self) -> bytes:
+        parts = [_INDEX_HEADER.pack(FRAME_INDEX, len(self.scales))]
+        for name in self.scales:
+            encoded = name.encode('utf-8')
+            parts.append(bytes((len(encoded),)) + encoded)
+        return b''.join(parts)
+
+    def encode_weights(self, message: dict) -> bytes:
+        scale_index = self.scale_index
+        mask = 0
+        values = []
+        # Values must follow bit order, so walk the index table
+        weights = message['weights']
+        if len(weights) == len(self.scales):
+            mask = (1 << len(self.scales)) - 1
+            values = [weights[name] for name in self.scales]
+        else:
+            for name in sorted(weights, key=scale_index.__getitem__):
+                mask |= 1 << scale_index[name]
+                values.append(weights[name])
+
+        flags = FLAG_KEYFRAME if message.get('keyframe', True) else 0
+        return (_WEIGHTS_HEADER.pack(FRAME_WEIGHTS, flags, message.get('seq', 0),
+                                     message['timestamp'], mask)
+                + self._values[len(values)].pack(*values))
+
+    def encode_ampere(self, message: dict) -> bytes:
+        data = message['data']
+        analytics = message.get('analytics') or {}
+        flags = ((FLAG_ONLINE if data.get('online', True) else 0) | (FLAG_ALARM if data.get('alarm') else 0)
+                 | (FLAG_OVERLOAD if analytics.get('overload') else 0))
+        return _AMPERE.pack(
+            FRAME_AMPERE, flags, message['timestamp'],
+            data['voltage'], data['ampere'], data['power'],
+            int(data.get('energy', 0)), data.get('frequency', 0.0), data.get('power_factor', 0.0),
+            analytics.get('rolling_mean', 0.0), analytics.get('rolling_peak', 0.0)
+        )
+
+    def decode(self, frame: bytes) -> dict:
+        """Binary frame → message dict (Python clients, tests and benchmarks)"""
+        frame_type = frame[0]
+        if frame_type == FRAME_WEIGHTS:
+            _, flags, seq, timestamp, mask = _WEIGHTS_HEADER.unpack_from(frame)
+            present = [name for index, name in enumerate(self.scales) if mask >> index & 1]
+            values = self._values[len(present)].unpack_from(frame, _WEIGHTS_HEADER.size)
+            return {
+                'type': 'weight_update',
+                'timestamp': timestamp,
+                'seq': seq,
+                'keyframe': bool(flags & FLAG_KEYFRAME),
+                'weights': dict(zip(present, values)),
+            }
+        if frame_type == FRAME_AMPERE:
+            (_, flags, timestamp, voltage, ampere, power, energy,
+             frequency, power_factor, rolling_mean, rolling_peak) = _AMPERE.unpack(frame)
+            return {
+                'type': 'ampere_update',
+                'timestamp': timestamp,
+                'data': {
+                    'voltage': voltage, 'ampere': ampere, 'power': power, 'energy': energy,
+                    'frequency': frequency, 'power_factor': power_factor,
+                    'online': bool(flags & FLAG_ONLINE), 'alarm': bool(flags & FLAG_ALARM),
+                },
+                'analytics': {'rolling_mean': rolling_mean, 'rolling_peak': rolling_peak,
+                              'overload': bool(flags & FLAG_OVERLOAD)},
+            }
+        if frame_type == FRAME_INDEX:
+            count = frame[1]
+            offset = _INDEX_HEADER.size
+            scales = []
+            for _ in range(count):
+                length = frame[offset]
+                scales.append(frame[offset + 1:offset + 1 + length].decode('utf-8'))
+                offset += 1 + length
+            return {'type': 'telemetry_index', 'scales': scales}
+        raise ValueError(f"Unknown telemetry frame type: {frame_type}")
@@ -0,0 +1,62 @@
+import os
+import sys
+import time
+
+import pytest
+
+# Modules live flat in raspberry_pi/ and are imported by name, as in main.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modbus_controller import ModbusController  # noqa: E402
+from traffic_replay import SimulatedArmClient  # noqa: E402
+
+SCALES = ('pasir', 'batu', 'semen', 'air')
+RELAY_MAPPING = {'pintu_pasir_1': 4, 'klakson': 15}
+
+
+class FakeScaleReader:
+    """ScaleReader stand-in: samples are fed by the test instead of a serial port"""
+
+    def __init__(self, scales=SCALES):
+        self.serial_ports = {scale: None for scale in scales}
+        self.weights = {scale: 0.0 for scale in scales}
+        self.sample_listeners = []
+
+    def add_sample_listener(self, callback):
+        self.sample_listeners.append(callback)
+
+    def get_weights(self):
+        return dict(self.weights)
+
+    def feed(self, scale: str, weight: float, sample_time: float = None):
+        self.weights[scale] = weight
+        sample_time = time.monotonic() if sample_time is None else sample_time
+        for callback in self.sample_listeners:
+            callback(scale, weight, sample_time, weight)
+
+
+def make_controller(coalesce_writes: bool = True, **modbus) -> ModbusController:
+    config = {
+        'modbus': {
+            'port': 'simulated',
+            'baudrate': 9600,
+            'arm_slave_id': 1,
+            'coalesce_writes': coalesce_writes,
+            'poll_interval_ms': 0,
+            **modbus,
+        },
+        'relay_mapping': dict(RELAY_MAPPING),
+    }
+    return ModbusController(config, client=SimulatedArmClient(time.monotonic))
+
+
+@pytest.fixture
+def scale_reader():
+    return FakeScaleReader()
+
+
+@pytest.fixture
+def controller():
+    controller = make_controller()
+    yield controller
+    controller.cleanup()
@@ -0,0 +1,57 @@
+import asyncio
+import json
+
+from batch_store import BatchStore
+from bus_scheduler import PRIORITY_READ
+from weighing_engine import WeighingEngine
+from websocket_server import WebSocketServer
+
+
+class FakeWebSocket:
+    remote_address = ('127.0.0.1', 50000)
+
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, message):
+        self.sent.append(json.loads(message))
+
+
+def test_weighing_is_linked_to_the_hmi_batch(tmp_path, scale_reader, controller):
+    engine = WeighingEngine({}, scale_reader, controller)
+    store = BatchStore({'batch_store': {'path': str(tmp_path / 'batches.db')}},
+                       weighing_engine=engine)
+    server = WebSocketServer({
+        'websocket_host': '127.0.0.1',
+        'websocket_port': 0,
+        'update_frequency_hz': 10,
+        'serial_ports': scale_reader.serial_ports,
+    }, scale_reader, controller, weighing_engine=engine, batch_store=store)
+    hmi = FakeWebSocket()
+
+    async def send(message: dict):
+        await server.handle_message(hmi, json.dumps(message))
+        return hmi.sent[-1]
+
+    # What useProductionSequence sends at production start / weighing / completion
+    started = asyncio.run(send({'type': 'batch_start', 'batch_id': 'batch_1', 'jumlah_mixing': 1}))
+    assert started['batch_id'] == 'batch_1'
+    ack = asyncio.run(send({'type': 'weigh_material', 'job_id': 'pasir1', 'material': 'pasir1',
+                            'scales': ['pasir'], 'relays': ['pintu_pasir_1'],
+                            'target': 100, 'tolerance': 2}))
+    assert ack['success'] is True
+
+    for weight in (20.0, 50.0, 80.0, 99.0):
+        scale_reader.feed('pasir', weight)
+    controller.submit(lambda: None, priority=PRIORITY_READ).result(timeout=2)  # Gate close acked
+    asyncio.run(send({'type': 'batch_end'}))
+
+    connection = store._connect()
+    store.flush(connection)
+    connection.close()
+
+    batch = store.get_batch('batch_1')
+    assert batch['info'] == {'jumlah_mixing': 1}
+    assert batch['ended_at'] is not None
+    assert [(w['job_id'], w['phase'], w['actual']) for w in batch['weighings']] == [
+        ('pasir1', 'complete', 99.0)]
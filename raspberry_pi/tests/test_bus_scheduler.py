@@ -0,0 +1,77 @@
+import threading
+import time
+
+from bus_scheduler import (
+    BusScheduler, PRIORITY_EMERGENCY, PRIORITY_PROCESS, PRIORITY_READ, PRIORITY_SAFETY
+)
+
+
+def hold(scheduler: BusScheduler) -> threading.Event:
+    """Occupy the bus until the returned event is set"""
+    release = threading.Event()
+    busy = scheduler.submit(release.wait, priority=PRIORITY_EMERGENCY)
+    while not busy.running():
+        time.sleep(0.001)
+    return release
+
+
+def test_priority_classes_then_fifo():
+    scheduler = BusScheduler('test-bus', inter_frame_gap=0.0)
+    scheduler.start()
+    try:
+        served = []
+        release = hold(scheduler)
+        futures = [
+            scheduler.submit(served.append, name, priority=priority)
+            for name, priority in (('read', PRIORITY_READ), ('process-1', PRIORITY_PROCESS),
+                                   ('safety', PRIORITY_SAFETY), ('process-2', PRIORITY_PROCESS),
+                                   ('emergency', PRIORITY_EMERGENCY))
+        ]
+        release.set()
+        for future in futures:
+            future.result(timeout=2)
+
+        assert served == ['emergency', 'safety', 'process-1', 'process-2', 'read']
+    finally:
+        scheduler.stop()
+
+
+def test_requests_with_a_batch_key_share_one_transaction():
+    scheduler = BusScheduler('test-bus', inter_frame_gap=0.0)
+    transactions = []
+
+    def write_batch(args_list):
+        transactions.append([args[0] for args in args_list])
+        return [args[0] * 10 for args in args_list]
+
+    scheduler.register_batch_handler('write', write_batch)
+    scheduler.start()
+    try:
+        release = hold(scheduler)
+        futures = [scheduler.submit(None, value, batch_key='write') for value in (1, 2, 3)]
+        safety = scheduler.submit(lambda: 'safety', priority=PRIORITY_SAFETY)
+        release.set()
+
+        assert [future.result(timeout=2) for future in futures] == [10, 20, 30]
+        assert safety.result(timeout=2) == 'safety'
+        assert transactions == [[1, 2, 3]]
+    finally:
+        scheduler.stop()
+
+
+def test_take_removes_without_resolving_and_flush_resolves():
+    scheduler = BusScheduler('test-bus', inter_frame_gap=0.0)
+    scheduler.start()
+    try:
+        release = hold(scheduler)
+        first = scheduler.submit(lambda: 'sent', priority=PRIORITY_PROCESS)
+        second = scheduler.submit(lambda: 'sent', priority=PRIORITY_READ)
+
+        taken = scheduler.take(lambda request: request.future is first)
+        assert [request.future for request in taken] == [first]
+        assert not first.done()
+        assert scheduler.flush(lambda request: request.priority == PRIORITY_READ, 'dropped') == 1
+        assert second.result(timeout=2) == 'dropped'
+        release.set()
+    finally:
+        scheduler.stop()
@@ -0,0 +1,85 @@
+import threading
+import time
+
+import pytest
+
+from bus_scheduler import PRIORITY_EMERGENCY, PRIORITY_PROCESS, PRIORITY_SAFETY
+from conftest import make_controller
+
+COIL = 15
+
+
+@pytest.mark.parametrize('coalesce_writes', [True, False])
+def test_safety_off_wins_over_queued_process_on(coalesce_writes):
+    controller = make_controller(coalesce_writes)
+    try:
+        # Hold the bus so both writes are queued together
+        release = threading.Event()
+        busy = controller.submit(release.wait, priority=PRIORITY_EMERGENCY)
+        while not busy.running():
+            time.sleep(0.001)
+
+        on = controller.set_relay_by_coil_nowait(COIL, True, 'klakson', PRIORITY_PROCESS)
+        off = controller.set_relay_by_coil_nowait(COIL, False, 'klakson', PRIORITY_SAFETY)
+        release.set()
+
+        assert off.result(timeout=2) is True
+        assert on.result(timeout=2) is True  # Superseded, never sent: reports the OFF
+        controller.submit(lambda: None, priority=PRIORITY_PROCESS).result(timeout=2)
+
+        assert not controller.client.image >> COIL & 1
+        assert not controller.coil_image >> COIL & 1
+    finally:
+        controller.cleanup()
+
+
+def wait_for_coalescing(controller):
+    while not controller.scheduler._collecting:
+        time.sleep(0.001)
+
+
+def test_write_waiting_in_a_batch_is_superseded():
+    controller = make_controller(True, coalesce_window_ms=500)
+    try:
+        on = controller.set_relay_by_coil_nowait(COIL, True, 'klakson', PRIORITY_PROCESS)
+        wait_for_coalescing(controller)
+        off = controller.set_relay_by_coil_nowait(COIL, False, 'klakson', PRIORITY_SAFETY)
+
+        assert off.result(timeout=2) is True
+        assert on.result(timeout=2) is True
+        assert not any(image >> COIL & 1 for _, image in controller.client.transitions)
+    finally:
+        controller.cleanup()
+
+
+def test_all_off_drops_a_write_waiting_in_a_batch():
+    controller = make_controller(True, coalesce_window_ms=500)
+    try:
+        on = controller.set_relay_by_coil_nowait(COIL, True, 'klakson', PRIORITY_PROCESS)
+        wait_for_coalescing(controller)
+
+        assert controller.set_all_off_nowait().result(timeout=2) is True
+        assert on.result(timeout=2) is False  # Dropped by the emergency stop
+        controller.submit(lambda: None, priority=PRIORITY_PROCESS).result(timeout=2)
+        assert not any(image >> COIL & 1 for _, image in controller.client.transitions)
+        assert not controller.coil_image >> COIL & 1
+    finally:
+        controller.cleanup()
+
+
+def test_sync_calls_time_out_while_the_bus_is_held():
+    controller = make_controller(True)
+    try:
+        release = threading.Event()
+        busy = controller.submit(release.wait, priority=PRIORITY_EMERGENCY)
+        while not busy.running():
+            time.sleep(0.001)
+
+        assert controller.set_relay_by_coil(COIL, True, 'klakson', timeout=0.05) is False
+        assert controller.get_status(max_age=0, timeout=0.05) == controller.get_cached_status()
+        release.set()
+        controller.submit(lambda: None, priority=PRIORITY_PROCESS).result(timeout=2)
+
+        assert not controller.client.image >> COIL & 1  # Timed-out write was dropped
+    finally:
+        controller.cleanup()
@@ -0,0 +1,46 @@
+from physical_buttons import ACTION_BLOCKED, ACTION_MOMENTARY, PhysicalButtons
+
+COIL = 15
+
+
+def make_buttons(controller) -> PhysicalButtons:
+    return PhysicalButtons({'physical_buttons': {'actions': {
+        'klakson': {'action': 'momentary', 'relay': 'klakson'},
+        'stop': {'action': 'emergency_stop'},
+        'pintu': {'action': 'toggle', 'relay': 'pintu_pasir_1'},
+    }}}, controller)
+
+
+def settle(controller):
+    controller.submit(lambda: None).result(timeout=2)
+
+
+def test_momentary_held_on_two_panels(controller):
+    buttons = make_buttons(controller)
+
+    assert buttons.handle('klakson', True, 'a') == ACTION_MOMENTARY
+    assert buttons.handle('klakson', True, 'b') == ACTION_MOMENTARY
+    assert buttons.handle('klakson', False, 'a') == ACTION_MOMENTARY
+    settle(controller)
+    assert controller.coil_image >> COIL & 1  # Still held on panel b
+
+    buttons.handle('klakson', False, 'b')
+    settle(controller)
+    assert not controller.coil_image >> COIL & 1
+    assert not buttons.pending_press
+
+
+def test_held_emergency_stop_refuses_relay_actions(controller):
+    buttons = make_buttons(controller)
+
+    buttons.handle('stop', True, 'a')
+    assert buttons.handle('klakson', True, 'b') == ACTION_BLOCKED
+    assert buttons.handle('pintu', True, 'b') == ACTION_BLOCKED
+    settle(controller)
+    assert controller.coil_image == 0
+
+    buttons.handle('klakson', False, 'b')
+    buttons.handle('stop', False, 'a')
+    assert buttons.handle('klakson', True, 'b') == ACTION_MOMENTARY
+    settle(controller)
+    assert controller.coil_image >> COIL & 1
@@ -0,0 +1,23 @@
+from safety_supervisor import SafetySupervisor
+from scale_filters import HampelFilter
+
+
+def feed(supervisor: SafetySupervisor, hampel: HampelFilter, values):
+    for index, raw in enumerate(values):
+        weight, _ = hampel.update(raw)
+        supervisor.on_sample('pasir', weight, float(index), raw)
+
+
+def test_garbled_frame_does_not_count_as_a_spike(scale_reader, controller):
+    supervisor = SafetySupervisor({}, scale_reader, controller)
+    feed(supervisor, HampelFilter(), [1500.0] * 7 + [150.0, 1500.0, 1500.0])
+
+    assert not supervisor.spikes
+
+
+def test_genuine_jump_counts_as_a_spike(scale_reader, controller):
+    supervisor = SafetySupervisor({}, scale_reader, controller)
+    feed(supervisor, HampelFilter(), [1500.0] * 7 + [1300.0] * 4)
+
+    assert [(scale, previous, weight) for scale, previous, weight, _ in supervisor.spikes] == [
+        ('pasir', 1500.0, 1300.0)]
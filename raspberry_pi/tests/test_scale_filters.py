@@ -0,0 +1,48 @@
+import pytest
+
+from scale_filters import HampelFilter
+
+
+def run(hampel: HampelFilter, values):
+    return [hampel.update(value) for value in values]
+
+
+@pytest.mark.parametrize('rate', [4.0, 8.0, 20.0])
+def test_hampel_passes_a_ramp_after_a_steady_spell(rate):
+    hampel = HampelFilter(window=7, threshold=3.0, min_deviation_kg=5.0)
+    run(hampel, [192.0] * 7)
+
+    ramp = [192.0 + rate * i for i in range(1, 11)]
+    outputs = [output for output, _ in run(hampel, ramp)]
+
+    # At most the first sample of the ramp is held back, then it is tracked exactly
+    assert outputs[1:] == ramp[1:]
+    assert hampel.max_rejected_run <= 1
+
+
+def test_hampel_rejects_an_isolated_garbled_frame():
+    hampel = HampelFilter(window=7, threshold=3.0, min_deviation_kg=5.0)
+    run(hampel, [1500.0, 1501.0, 1499.0, 1500.0, 1500.5, 1499.5, 1500.0])
+
+    assert hampel.update(150.0) == (1500.0, True)  # Dropped digit
+    assert hampel.update(1500.0) == (1500.0, False)
+    assert hampel.outliers == 1
+
+
+def test_hampel_rejects_a_garbled_frame_during_a_ramp():
+    hampel = HampelFilter(window=7, threshold=3.0, min_deviation_kg=5.0)
+    run(hampel, [100.0 + 4.0 * i for i in range(10)])
+
+    output, rejected = hampel.update(14.0)  # 140 kg with the decimal point shifted
+    assert rejected
+    assert output == pytest.approx(124.0)
+    assert hampel.update(144.0) == (144.0, False)
+
+
+def test_hampel_accepts_a_genuine_step():
+    hampel = HampelFilter(window=7, threshold=3.0, min_deviation_kg=5.0)
+    run(hampel, [1500.0] * 7)
+
+    results = run(hampel, [1400.0] * 4)
+    assert [rejected for _, rejected in results] == [True, True, False, False]
+    assert results[-1][0] == 1400.0
@@ -0,0 +1,47 @@
+from telemetry_codec import FRAME_WEIGHTS, TelemetryCodec
+
+SCALES = ['pasir', 'batu', 'semen', 'air']
+
+
+def test_weight_keyframe_round_trip():
+    codec = TelemetryCodec(SCALES)
+    message = {'type': 'weight_update', 'timestamp': 1760688000123, 'seq': 42, 'keyframe': True,
+               'weights': {'pasir': 1234.5, 'batu': 0.0, 'semen': 250.25, 'air': -1.5}}
+
+    frame = codec.encode_weights(message)
+    assert frame[0] == FRAME_WEIGHTS
+    assert codec.decode(frame) == message
+
+
+def test_weight_delta_carries_only_the_changed_scales():
+    codec = TelemetryCodec(SCALES)
+    message = {'type': 'weight_update', 'timestamp': 1760688000200, 'seq': 43, 'keyframe': False,
+               'weights': {'air': 80.5, 'batu': 512.0}}
+
+    frame = codec.encode_weights(message)
+    assert len(frame) == len(codec.encode_weights(dict(message, weights={'air': 1.0}))) + 4
+    decoded = codec.decode(frame)
+    assert decoded == message
+    assert list(decoded['weights']) == ['batu', 'air']  # Index order
+
+
+def test_ampere_round_trip_with_flags():
+    codec = TelemetryCodec(SCALES)
+    message = {
+        'type': 'ampere_update',
+        'timestamp': 1760688000300,
+        'data': {'voltage': 230.5, 'ampere': 142.25, 'power': 30000.0, 'energy': 12345,
+                 'frequency': 50.0, 'power_factor': 0.5, 'online': True, 'alarm': True},
+        'analytics': {'rolling_mean': 120.5, 'rolling_peak': 150.0, 'overload': True},
+    }
+
+    assert codec.decode(codec.encode_ampere(message)) == message
+
+    quiet = dict(message, data=dict(message['data'], online=False, alarm=False),
+                 analytics=dict(message['analytics'], overload=False))
+    assert codec.decode(codec.encode_ampere(quiet)) == quiet
+
+
+def test_index_frame_round_trip():
+    codec = TelemetryCodec(SCALES)
+    assert codec.decode(codec.index_frame()) == {'type': 'telemetry_index', 'scales': SCALES}
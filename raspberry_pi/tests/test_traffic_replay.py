@@ -0,0 +1,40 @@
+import time
+
+from conftest import RELAY_MAPPING, SCALES
+from physical_buttons import PhysicalButtons
+from traffic_recorder import TrafficRecorder
+from traffic_replay import TrafficReplay
+from websocket_server import WebSocketServer
+
+COIL = RELAY_MAPPING['klakson']
+
+
+def test_panel_button_edges_are_recorded_and_replayed(tmp_path, scale_reader, controller):
+    config = {
+        'websocket_host': '127.0.0.1',
+        'websocket_port': 0,
+        'update_frequency_hz': 10,
+        'serial_ports': {scale: f'/dev/null-{scale}' for scale in SCALES},
+        'serial_config': {},
+        'modbus': {'port': 'simulated', 'baudrate': 9600, 'arm_slave_id': 1, 'poll_interval_ms': 0},
+        'relay_mapping': dict(RELAY_MAPPING),
+        'physical_buttons': {'actions': {'klakson': {'action': 'momentary', 'relay': 'klakson'}}},
+        'traffic_capture': {'directory': str(tmp_path)},
+    }
+    recorder = TrafficRecorder(config)
+    server = WebSocketServer(config, scale_reader, controller,
+                             physical_buttons=PhysicalButtons(config, controller), recorder=recorder)
+    panel = {'id': 'panel@10.0.0.5:4000', 'key': '10.0.0.5:4000', 'pressed': set()}
+    server.on_physical_button(panel, 'klakson', True)
+    time.sleep(0.05)  # Held long enough for the ON to reach the bus in a 1x replay
+    server.on_physical_button(panel, 'klakson', False)
+    recorder.flush()
+    recorder.file.close()
+
+    replay = TrafficReplay(config, speed=1)
+    try:
+        replay.run(recorder.path)
+        assert replay.commands == {'physical_button': 2}
+        assert [image >> COIL & 1 for _, image in replay.arm.transitions] == [1, 0]
+    finally:
+        replay.close()
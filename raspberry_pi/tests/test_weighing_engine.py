@@ -0,0 +1,101 @@
+import time
+
+from bus_scheduler import PRIORITY_READ
+from conftest import RELAY_MAPPING
+from scale_filters import HampelFilter
+from weighing_engine import (
+    PHASE_COMPLETE, PHASE_FILLING, PHASE_JOGGING, PHASE_STALLED, WeighingEngine
+)
+
+GATE = RELAY_MAPPING['pintu_pasir_1']
+
+
+def settle(controller):
+    controller.submit(lambda: None, priority=PRIORITY_READ).result(timeout=2)
+
+
+def gate_on(controller) -> bool:
+    settle(controller)
+    return bool(controller.coil_image >> GATE & 1)
+
+
+def start(engine, **job):
+    return engine.start_job(dict({
+        'job_id': 'pasir1', 'material': 'pasir1', 'scales': ['pasir'],
+        'relays': ['pintu_pasir_1'], 'target': 100, 'trigger': 70, 'tolerance': 2,
+    }, **job))
+
+
+def test_trigger_stops_full_flow(scale_reader, controller):
+    engine = WeighingEngine({}, scale_reader, controller)
+    job = start(engine)
+    assert gate_on(controller)
+
+    scale_reader.feed('pasir', 40.0)
+    assert job.phase == PHASE_FILLING and gate_on(controller)
+    scale_reader.feed('pasir', 71.0)
+    assert job.phase == PHASE_JOGGING and not gate_on(controller)
+
+
+def test_cut_off_at_the_final_weight(scale_reader, controller):
+    engine = WeighingEngine({}, scale_reader, controller)
+    events = []
+    engine.add_event_listener(events.append)
+    job = start(engine, trigger=100)  # No jogging: full flow up to the cut-off
+
+    scale_reader.feed('pasir', 90.0)
+    assert job.phase == PHASE_FILLING and gate_on(controller)
+    scale_reader.feed('pasir', 98.5)  # At or past target - tolerance
+    settle(controller)
+    assert job.phase == PHASE_COMPLETE and not engine.jobs
+    complete = [event for event in events if event['type'] == 'weighing_complete']
+    assert len(complete) == 1
+    assert complete[0]['weight'] == 98.5
+    assert complete[0]['close_latency_ms'] is not None
+
+
+def test_jog_pulses_follow_the_sample_clock(scale_reader, controller):
+    engine = WeighingEngine({}, scale_reader, controller)
+    job = start(engine, jog_on=1, jog_off=2)
+    t0 = time.monotonic()
+
+    scale_reader.feed('pasir', 75.0, t0)
+    assert job.phase == PHASE_JOGGING and not gate_on(controller)
+
+    steps = [(0.5, 76.0, True), (1.5, 77.0, False), (2.9, 78.0, False), (3.2, 79.0, True), (4.1, 80.0, False)]
+    for offset, weight, expected in steps:
+        scale_reader.feed('pasir', weight, t0 + offset)
+        assert job.gate_open is expected, offset
+        assert gate_on(controller) is expected, offset
+
+
+def test_jogging_without_progress_stalls(scale_reader, controller):
+    engine = WeighingEngine({'weighing_engine': {'stall_timeout_seconds': 15}}, scale_reader, controller)
+    job = start(engine)
+    t0 = time.monotonic()
+
+    scale_reader.feed('pasir', 80.0, t0)
+    scale_reader.feed('pasir', 82.0, t0 + 5)    # Progress
+    scale_reader.feed('pasir', 82.5, t0 + 15)   # Below stall_progress_kg
+    assert job.phase == PHASE_JOGGING
+    scale_reader.feed('pasir', 82.5, t0 + 20.5)
+
+    assert job.phase == PHASE_STALLED and not engine.jobs
+    assert not gate_on(controller)
+
+
+def test_cut_off_follows_a_ramp_through_the_hampel_stage(scale_reader, controller):
+    engine = WeighingEngine({}, scale_reader, controller)
+    hampel = HampelFilter(window=7, threshold=3.0, min_deviation_kg=5.0)
+    for _ in range(7):
+        scale_reader.feed('pasir', hampel.update(192.0)[0])
+    job = start(engine, target=220, trigger=100)
+
+    raw = 192.0
+    while engine.jobs:
+        raw += 4.0
+        scale_reader.feed('pasir', hampel.update(raw)[0])
+
+    # Cut at the first sample past the final weight (218 kg), not samples later
+    assert job.phase == PHASE_COMPLETE
+    assert job.weight == raw == 220.0
@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+Traffic Recorder Module
+Append-only binary capture of the plant's raw I/O, replayed offline by
+traffic_replay.py
+
+Recorded (traffic_capture config block):
+- every raw byte chunk ScaleReader receives from an indicator port
+- every Modbus call ModbusController / AmpereReader make, and its result
+- every HMI control message the WebSocket server receives (channel "hmi")
+  and every decoded panel button edge (channel "panel", physical_button)
+
+File layout (little endian):
+
+  header  <4s B d Q>  b'BPTR', version, wall clock start (s), monotonic start (ns)
+  record  <B B Q H>   kind, channel, ns since start, payload length; payload
+
+Channel numbers are assigned on first use and announced by a CHANNEL record
+(payload = UTF-8 name) before their first data record. pymodbus and
+minimalmodbus do not expose the raw RTU frames, so Modbus traffic is recorded
+at the client call: the request as compact JSON {"fn", "args", "kw"} and the
+response as {"ok", "us"} plus "bits" (coil mask) or "registers" for reads.
+
+I/O threads only append to an in-memory deque; a writer thread writes the
+records out every flush_interval_ms. A file is rotated at max_file_mb.
+"""
+
+import json
+import os
+import struct
+import threading
+import time
+from collections import deque
+from typing import Dict, Iterable, Iterator, Tuple
+from modbus_controller import bits_to_mask
+
+MAGIC = b'BPTR'
+VERSION = 1
+HEADER = struct.Struct('<4sBdQ')
+RECORD = struct.Struct('<BBQH')
+MAX_PAYLOAD = 0xFFFF
+MAX_CHANNELS = 256
+
+KIND_CHANNEL = 0
+KIND_SERIAL_RX = 1
+KIND_MODBUS_REQUEST = 2
+KIND_MODBUS_RESPONSE = 3
+KIND_CONTROL = 4
+
+KIND_NAMES = {
+    KIND_CHANNEL: 'channel',
+    KIND_SERIAL_RX: 'serial_rx',
+    KIND_MODBUS_REQUEST: 'modbus_request',
+    KIND_MODBUS_RESPONSE: 'modbus_response',
+    KIND_CONTROL: 'control',
+}
+
+
+def _json(value) -> bytes:
+    return json.dumps(value, separators=(',', ':')).encode()
+
+
+def encode_request(fn: str, args: tuple, kwargs: dict) -> bytes:
+    return _json({'fn': fn, 'args': list(args), 'kw': kwargs})
+
+
+def encode_response(fn: str, result, elapsed_ns: int, error: Exception = None) -> bytes:
+    response = {'ok': True, 'us': elapsed_ns // 1000}
+    if error is not None:
+        response['ok'] = False
+        response['error'] = f"{type(error).__name__}: {error}"
+    elif isinstance(result, list):
+        response['registers'] = result           # minimalmodbus read_registers
+    elif result is not None and hasattr(result, 'isError'):
+        if result.isError():
+            response['ok'] = False
+            response['error'] = str(result)
+        elif fn.startswith('read_') and getattr(result, 'bits', None) is not None:
+            response['bits'] = bits_to_mask(result.bits)
+            response['n'] = len(result.bits)
+        elif getattr(result, 'registers', None) is not None:
+            response['registers'] = list(result.registers)
+    return _json(response)
+
+
+class RecordingClient:
+    """
+    Proxy for a Modbus client (pymodbus client, minimalmodbus Instrument)
+    that records the listed calls; everything else passes through
+    """
+
+    def __init__(self, target, recorder, channel: str, methods: Iterable[str]):
+        self._target = target
+        for name in methods:
+            setattr(self, name, self._wrap(recorder, channel, name, getattr(target, name)))
+
+    def __getattr__(self, name):
+        return getattr(self._target, name)
+
+    @staticmethod
+    def _wrap(recorder, channel: str, fn: str, method):
+        def call(*args, **kwargs):
+            recorder.record(KIND_MODBUS_REQUEST, channel, encode_request(fn, args, kwargs))
+            start = time.perf_counter_ns()
+            try:
+                result = method(*args, **kwargs)
+            except Exception as e:
+                recorder.record(KIND_MODBUS_RESPONSE, channel,
+                                encode_response(fn, None, time.perf_counter_ns() - start, e))
+                raise
+            recorder.record(KIND_MODBUS_RESPONSE, channel,
+                            encode_response(fn, result, time.perf_counter_ns() - start))
+            return result
+        return call
+
+
+class TrafficRecorder:
+    def __init__(self, config: dict):
+        self.config = config.get('traffic_capture', {})
+        self.directory = self.config.get('directory', 'captures')
+        self.flush_interval = self.config.get('flush_interval_ms', 500) / 1000.0
+        self.max_file_bytes = int(self.config.get('max_file_mb', 256) * 1024 * 1024)
+
+        self.channels: Dict[str, int] = {}
+        self.channel_lock = threading.Lock()
+        self.pending = deque()              # (kind, channel, monotonic ns, payload)
+
+        self.path = None
+        self.file = None
+        self.file_start_ns = 0
+        self.file_bytes = 0
+        self.files = 0
+        self.records = 0
+        self.bytes_written = 0
+        self.truncated = 0
+
+        self.running = False
+        self.thread = None
+        self._wakeup = threading.Event()
+
+        print(f"✅ Traffic capture → {self.directory}/ (flush every {self.flush_interval * 1000:.0f}ms, "
+              f"rotate at {self.max_file_bytes // (1024 * 1024)}MB)")
+
+    # Producers (any thread, never touch the disk)
+    def channel(self, name: str) -> int:
+        channel_id = self.channels.get(name)
+        if channel_id is None:
+            with self.channel_lock:
+                channel_id = self.channels.get(name)
+                if channel_id is None:
+                    if len(self.channels) >= MAX_CHANNELS:
+                        raise ValueError(f"Too many capture channels ({MAX_CHANNELS})")
+                    channel_id = len(self.channels)
+                    self.pending.append((KIND_CHANNEL, channel_id, time.monotonic_ns(), name.encode()))
+                    self.channels[name] = channel_id
+        return channel_id
+
+    def record(self, kind: int, channel: str, payload: bytes):
+        # bytes() copies: serial readers reuse their receive buffer
+        self.pending.append((kind, self.channel(channel), time.monotonic_ns(), bytes(payload)))
+
+    def record_serial(self, scale_name: str, data: bytes):
+        self.record(KIND_SERIAL_RX, scale_name, data)
+
+    def record_control(self, source: str, message):
+        self.record(KIND_CONTROL, source, message.encode() if isinstance(message, str) else message)
+
+    def wrap_client(self, client, channel: str, methods: Iterable[str]) -> RecordingClient:
+        """Record `methods` of a Modbus client object on `channel`"""
+        return RecordingClient(client, self, channel, methods)
+
+    # Writer thread
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._writer_loop, name='traffic-capture', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        self._wakeup.set()
+        if self.thread:
+            self.thread.join(timeout=5.0)
+        if self.file:
+            self.file.close()
+            self.file = None
+        print(f"✅ Traffic capture: {self.records} records, {self.bytes_written / 1024:.0f}KB "
+              f"in {self.files} file(s)")
+
+    def _writer_loop(self):
+        try:
+            while self.running:
+                self._wakeup.wait(self.flush_interval)
+                self.flush()
+            self.flush()  # Final flush on shutdown
+        except Exception as e:
+            print(f"❌ Traffic capture writer error: {e}")
+
+    def _open(self, start_ns: int):
+        """Start a new capture file; channels are announced again so it replays on its own"""
+        if self.file:
+            self.file.close()
+        os.makedirs(self.directory, exist_ok=True)
+        # Sequence number keeps files of one run in order when rotated within a second
+        self.files += 1
+        path = os.path.join(self.directory, f"traffic-{time.strftime('%Y%m%d-%H%M%S')}-{self.files:03d}.bptr")
+
+        self.path = path
+        self.file = open(path, 'wb')
+        self.file_start_ns = start_ns
+        wall_start = time.time() - (time.monotonic_ns() - start_ns) / 1e9
+        out = bytearray(HEADER.pack(MAGIC, VERSION, wall_start, start_ns))
+        with self.channel_lock:
+            channels = list(self.channels.items())
+        for name, channel_id in channels:
+            payload = name.encode()
+            out += RECORD.pack(KIND_CHANNEL, channel_id, 0, len(payload)) + payload
+        self.file_bytes = 0
+        self._write(out)
+        print(f"📼 Traffic capture file: {path}")
+
+    def _write(self, out: bytearray):
+        if out:
+            self.file.write(out)
+            self.file.flush()
+            self.file_bytes += len(out)
+            self.bytes_written += len(out)
+            out.clear()
+
+    def flush(self) -> int:
+        """Write every queued record (writer thread; one write per flush)"""
+        out = bytearray()
+        count = 0
+        while self.pending:
+            kind, channel_id, timestamp, payload = self.pending.popleft()
+            if self.file is None or self.file_bytes + len(out) >= self.max_file_bytes:
+                if self.file:
+                    self._write(out)
+                self._open(timestamp)
+            if len(payload) > MAX_PAYLOAD:
+                payload = payload[:MAX_PAYLOAD]
+                self.truncated += 1
+            # Producers stamp before appending, so threads can interleave by a few µs
+            out += RECORD.pack(kind, channel_id, max(timestamp - self.file_start_ns, 0), len(payload))
+            out += payload
+            count += 1
+        if self.file:
+            self._write(out)
+        self.records += count
+        return count
+
+    def get_stats(self) -> dict:
+        return {
+            'path': self.path,
+            'records': self.records,
+            'bytes': self.bytes_written,
+            'files': self.files,
+            'pending': len(self.pending),
+            'truncated': self.truncated,
+            'channels': dict(self.channels),
+        }
+
+
+def read_header(path: str) -> dict:
+    with open(path, 'rb') as f:
+        magic, version, wall_start, monotonic_start = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a traffic capture")
+    return {'version': version, 'wall_start': wall_start, 'monotonic_start_ns': monotonic_start}
+
+
+def read_capture(path: str) -> Iterator[Tuple[int, str, int, bytes]]:
+    """
+    Yield (kind, channel name, ns since capture start, payload) in file order
+    CHANNEL records are consumed; a record cut short by a crash ends the capture.
+    """
+    channels: Dict[int, str] = {}
+    with open(path, 'rb') as f:
+        magic, version, _, _ = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a traffic capture")
+        if version != VERSION:
+            raise ValueError(f"Unsupported capture version {version}")
+        while True:
+            head = f.read(RECORD.size)
+            if len(head) < RECORD.size:
+                return
+            kind, channel_id, offset_ns, length = RECORD.unpack(head)
+            payload = f.read(length)
+            if len(payload) < length:
+                return
+            if kind == KIND_CHANNEL:
+                channels[channel_id] = payload.decode()
+                continue
+            yield kind, channels.get(channel_id, str(channel_id)), offset_ns, payload
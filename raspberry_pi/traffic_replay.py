@@ -0,0 +1,379 @@
+#!/usr/bin/env python3
+"""
+Traffic Replay
+Feeds a traffic capture (traffic_recorder.py) back through the controller
+stack offline: parse → filter → decide → write
+
+Usage:
+    python traffic_replay.py captures/traffic-20261017-081500-001.bptr            # 1x
+    python traffic_replay.py captures/traffic-20261017-081500-001.bptr --speed 10 # 10x
+    python traffic_replay.py captures/traffic-20261017-081500-001.bptr --speed 0  # flat out
+
+Indicator chunks go into ScaleReader.handle_data at their captured time / speed,
+so filters, motion, the weighing engine and its coil writes run as they do in
+production. HMI commands (relay_control, weigh_*, emergency_stop, batch_*)
+are re-issued, panel button edges go through PhysicalButtons.handle, and
+captured PZEM register blocks are served to AmpereReader.
+The ARM/ARX modules are simulated: writes are acked, reads return the image.
+
+The report compares the replay's coil image transitions with the captured
+writes (exit status 1 on divergence) and profiles the pipeline: handle_data
+time per chunk, schedule lag, gate close latency and bus wait times. Time-based
+weighing decisions (jog pulses, stall timeout) run on the wall clock, so only
+a 1x replay is expected to reproduce the captured writes exactly.
+"""
+
+import argparse
+import json
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+
+from scale_reader import ScaleReader
+from modbus_controller import ModbusController, iter_bits
+from ampere_reader import AmpereReader
+from mixer_analytics import MixerAnalytics
+from physical_buttons import PhysicalButtons
+from weighing_engine import WeighingEngine
+from traffic_recorder import (
+    read_capture, read_header, KIND_NAMES,
+    KIND_SERIAL_RX, KIND_MODBUS_REQUEST, KIND_MODBUS_RESPONSE, KIND_CONTROL
+)
+
+
+def summarize(values_ms: List[float]) -> dict:
+    """count / mean / p50 / p99 / max of a list of milliseconds"""
+    if not values_ms:
+        return {'count': 0}
+    ordered = sorted(values_ms)
+    return {
+        'count': len(ordered),
+        'mean_ms': round(sum(ordered) / len(ordered), 3),
+        'p50_ms': round(ordered[len(ordered) // 2], 3),
+        'p99_ms': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))], 3),
+        'max_ms': round(ordered[-1], 3),
+    }
+
+
+def apply_coils(image: int, address: int, values) -> int:
+    for offset, value in enumerate(values):
+        if value:
+            image |= 1 << (address + offset)
+        else:
+            image &= ~(1 << (address + offset))
+    return image
+
+
+class SimulatedResponse:
+    def __init__(self, bits: List[bool] = None):
+        self.bits = bits
+
+    def isError(self) -> bool:
+        return False
+
+
+class SimulatedArmClient:
+    """Stands in for the ARM/ARX modules: acks writes, reads back the coil image"""
+
+    def __init__(self, clock):
+        self.clock = clock              # → capture time (s) of the replay
+        self.image = 0
+        self.transitions = []           # (capture time, image) after every change
+        self.lock = threading.Lock()
+
+    def connect(self) -> bool:
+        return True
+
+    def is_socket_open(self) -> bool:
+        return True
+
+    def close(self):
+        pass
+
+    def _apply(self, address: int, values):
+        with self.lock:
+            image = apply_coils(self.image, address, values)
+            if image != self.image:
+                self.image = image
+                self.transitions.append((self.clock(), image))
+        return SimulatedResponse()
+
+    def write_coil(self, address: int, value: bool, slave: int = None):
+        return self._apply(address, [value])
+
+    def write_coils(self, address: int, values: List[bool], slave: int = None):
+        return self._apply(address, values)
+
+    def read_coils(self, address: int, count: int = 1, slave: int = None):
+        image = self.image
+        return SimulatedResponse([bool(image >> (address + i) & 1) for i in range(count)])
+
+
+class ReplayInstrument:
+    """PZEM-016 stand-in serving the captured register block"""
+
+    def __init__(self):
+        self.registers: Optional[List[int]] = None
+
+    def read_registers(self, address: int, count: int, functioncode: int = 4) -> List[int]:
+        if self.registers is None:
+            raise IOError("No captured PZEM block")
+        return self.registers
+
+
+class TrafficReplay:
+    def __init__(self, config: dict, speed: float = 1.0):
+        self.speed = speed
+        self.started_at: Optional[float] = None
+        self.capture_end_s = 0.0
+        self.wall_s = 0.0
+
+        self.arm = SimulatedArmClient(self.capture_time)
+        self.scale_reader = ScaleReader(config)
+        self.modbus_controller = ModbusController(config, client=self.arm)
+
+        self.weighing_engine = None
+        if config.get('weighing_engine', {}).get('enabled', True):
+            self.weighing_engine = WeighingEngine(config, self.scale_reader, self.modbus_controller)
+            self.weighing_engine.add_event_listener(self.on_event)
+
+        self.physical_buttons = PhysicalButtons(config, self.modbus_controller, self.weighing_engine)
+
+        self.pzem = None
+        self.ampere_reader = None
+        self.mixer_analytics = None
+        if config.get('ampere_meter', {}).get('enabled', False):
+            self.pzem = ReplayInstrument()
+            self.ampere_reader = AmpereReader(config, instrument=self.pzem)
+            if config.get('mixer_analytics', {}).get('enabled', True):
+                self.mixer_analytics = MixerAnalytics(config, self.ampere_reader)
+                self.mixer_analytics.add_event_listener(self.on_event)
+
+        self.counts: Dict[str, int] = {}
+        self.commands: Dict[str, int] = {}
+        self.skipped = 0
+        self.handle_data_ms: List[float] = []
+        self.lag_ms: List[float] = []
+        self.close_latency_ms: List[float] = []
+        self.weighings: List[dict] = []
+        self.events: Dict[str, int] = {}
+
+        # Coil image transitions of the capture (acknowledged writes only)
+        self.captured_image = 0
+        self.captured_transitions = []
+        self.pending_requests: Dict[str, dict] = {}
+
+    def capture_time(self) -> float:
+        """Replay position in capture seconds"""
+        if self.started_at is None:
+            return 0.0
+        elapsed = time.monotonic() - self.started_at
+        return elapsed * self.speed if self.speed else elapsed
+
+    def on_event(self, event: dict):
+        event_type = event.get('type')
+        self.events[event_type] = self.events.get(event_type, 0) + 1
+        if event_type == 'weighing_complete':
+            if event.get('close_latency_ms') is not None:
+                self.close_latency_ms.append(event['close_latency_ms'])
+            self.weighings.append({
+                key: event.get(key) for key in ('job_id', 'material', 'target', 'weight', 'phase')
+            })
+
+    def run(self, path: str):
+        self.started_at = time.monotonic()
+        for kind, channel, offset_ns, payload in read_capture(path):
+            if self.speed:
+                delay = self.started_at + offset_ns / 1e9 / self.speed - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                self.lag_ms.append(max(-delay, 0.0) * 1000.0)
+            self.capture_end_s = offset_ns / 1e9
+            name = KIND_NAMES.get(kind, str(kind))
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+            if kind == KIND_SERIAL_RX:
+                self.feed_serial(channel, payload)
+            elif kind == KIND_MODBUS_REQUEST:
+                self.pending_requests[channel] = json.loads(payload)
+            elif kind == KIND_MODBUS_RESPONSE:
+                self.on_modbus_response(channel, json.loads(payload), offset_ns)
+            elif kind == KIND_CONTROL:
+                self.handle_command(payload)
+            else:
+                self.skipped += 1
+        self.wall_s = time.monotonic() - self.started_at
+        self._drain()
+
+    def feed_serial(self, scale_name: str, data: bytes):
+        if scale_name not in self.scale_reader.buffers:
+            self.skipped += 1
+            return
+        start = time.perf_counter_ns()
+        self.scale_reader.handle_data(scale_name, data)
+        self.handle_data_ms.append((time.perf_counter_ns() - start) / 1e6)
+
+    def on_modbus_response(self, channel: str, response: dict, offset_ns: int):
+        request = self.pending_requests.pop(channel, None)
+        if request is None or not response.get('ok'):
+            return
+        fn, args = request['fn'], request['args']
+        if channel == 'arm' and fn in ('write_coil', 'write_coils'):
+            values = [args[1]] if fn == 'write_coil' else args[1]
+            image = apply_coils(self.captured_image, args[0], values)
+            if image != self.captured_image:
+                self.captured_image = image
+                self.captured_transitions.append((offset_ns / 1e9, image))
+        elif channel == 'pzem' and self.ampere_reader and 'registers' in response:
+            self.pzem.registers = response['registers']
+            self.ampere_reader.get_all_data()
+
+    def handle_command(self, message: bytes):
+        """
+        Re-issue an HMI command the way websocket_server.handle_message does,
+        or a panel button edge the way on_physical_button does
+        """
+        try:
+            data = json.loads(message)
+        except ValueError:
+            self.skipped += 1
+            return
+        msg_type = data.get('type')
+        self.commands[msg_type] = self.commands.get(msg_type, 0) + 1
+        engine = self.weighing_engine
+
+        if msg_type == 'relay_control':
+            relay = data.get('relay', '').lower()
+            coil_address = data.get('gpio_pin')
+            if coil_address is None:
+                coil_address = self.modbus_controller.coil_by_name.get(relay)
+            if coil_address is not None:
+                self.modbus_controller.set_relay_by_coil_nowait(
+                    coil_address, data.get('state', False), relay or None)
+        elif msg_type == 'weigh_material' and engine:
+            try:
+                engine.start_job(data)
+            except (KeyError, ValueError) as e:
+                print(f"⚠️  Replayed weigh_material rejected: {e}")
+        elif msg_type == 'weigh_cancel' and engine:
+            engine.cancel_job(str(data.get('job_id')))
+        elif msg_type == 'emergency_stop':
+            if engine:
+                engine.cancel_all()
+            self.modbus_controller.set_all_off_nowait()
+        elif msg_type == 'batch_start' and self.mixer_analytics:
+            self.mixer_analytics.start_batch(str(data.get('batch_id') or int(time.time() * 1000)))
+        elif msg_type == 'batch_end' and self.mixer_analytics:
+            self.mixer_analytics.end_batch()
+        elif msg_type == 'mixer_water_dosed' and self.mixer_analytics:
+            self.mixer_analytics.mark_water_dosed()
+        elif msg_type == 'physical_button':
+            self.physical_buttons.handle(str(data.get('button')), bool(data.get('pressed')),
+                                         str(data.get('panel', 'panel')))
+
+    def _drain(self, timeout: float = 2.0):
+        """Wait for writes still queued on the bus"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline and any(self.modbus_controller.scheduler.queue_depth().values()):
+            time.sleep(0.01)
+
+    def relays_on(self, image: int) -> List[str]:
+        return [self.modbus_controller.get_relay_name_by_coil(coil) for coil in iter_bits(image)]
+
+    def compare_coils(self) -> dict:
+        """Captured vs replayed coil image transitions, up to the first divergence"""
+        captured = self.captured_transitions
+        replayed = list(self.arm.transitions)
+        result = {'match': True, 'captured': len(captured), 'replayed': len(replayed)}
+        drift = []
+        for index, ((expected_t, expected), (actual_t, actual)) in enumerate(zip(captured, replayed)):
+            if expected != actual:
+                result.update({
+                    'match': False, 'index': index, 'at_s': round(expected_t, 3),
+                    'expected_on': self.relays_on(expected), 'replayed_on': self.relays_on(actual),
+                })
+                break
+            drift.append((actual_t - expected_t) * 1000.0)
+        if len(captured) != len(replayed):
+            result['match'] = False
+        if self.speed and drift:
+            result['drift'] = summarize([abs(value) for value in drift])
+        return result
+
+    def report(self, path: str) -> dict:
+        header = read_header(path)
+        return {
+            'capture': path,
+            'captured_at': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(header['wall_start'])),
+            'speed': self.speed,
+            'capture_s': round(self.capture_end_s, 2),
+            'wall_s': round(self.wall_s, 2),
+            'records': self.counts,
+            'skipped': self.skipped,
+            'commands': self.commands,
+            'events': self.events,
+            'weighings': self.weighings,
+            'profile': {
+                'handle_data': summarize(self.handle_data_ms),
+                'schedule_lag': summarize(self.lag_ms),
+                'close_latency': summarize(self.close_latency_ms),
+                'filters': self.scale_reader.get_filter_stats(),
+                'bus': self.modbus_controller.get_bus_stats(),
+            },
+            'coils': self.compare_coils(),
+        }
+
+    def close(self):
+        if self.weighing_engine:
+            self.weighing_engine.cancel_all()
+        self.modbus_controller.cleanup()
+
+
+def print_report(report: dict):
+    print("\n" + "=" * 60)
+    print(f"  REPLAY {report['capture']} ({report['captured_at']}) at "
+          f"{report['speed'] or 'max'}x")
+    print("=" * 60)
+    print(f"  {report['capture_s']}s of traffic replayed in {report['wall_s']}s")
+    print(f"  Records: {report['records']} (skipped {report['skipped']})")
+    print(f"  Commands: {report['commands']}")
+    for weighing in report['weighings']:
+        print(f"  ⚖️  {weighing['material']}: {weighing['weight']}kg / {weighing['target']}kg ({weighing['phase']})")
+    for name in ('handle_data', 'schedule_lag', 'close_latency'):
+        print(f"  {name}: {report['profile'][name]}")
+    coils = report['coils']
+    if coils['match']:
+        print(f"  ✅ Coil writes match the capture ({coils['captured']} transitions, "
+              f"drift {coils.get('drift')})")
+    else:
+        print(f"  ❌ Coil writes diverge: {coils}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a traffic capture through the controller stack")
+    parser.add_argument('capture', help="Capture file (.bptr)")
+    parser.add_argument('--config', default='config_autonics.json', help="Controller configuration")
+    parser.add_argument('--speed', type=float, default=1.0, help="Replay speed factor (0 = as fast as possible)")
+    parser.add_argument('--json', action='store_true', help="Print the report as JSON")
+    args = parser.parse_args()
+
+    with open(args.config, 'r') as f:
+        config = json.load(f)
+
+    replay = TrafficReplay(config, args.speed)
+    try:
+        replay.run(args.capture)
+        report = replay.report(args.capture)
+    finally:
+        replay.close()
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+    sys.exit(0 if report['coils']['match'] else 1)
+
+
+if __name__ == "__main__":
+    main()
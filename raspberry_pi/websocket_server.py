@@ -1,47 +1,380 @@
 #!/usr/bin/env python3
 """
 WebSocket Server Module
-Handles WebSocket communication with web app
+Handles WebSocket communication with the web app (HMI, path "/") and the ESP32
+operator panels (physical_buttons.path, default "/esp32") in one process
+
+Broadcasts are encoded once and posted to a bounded per-client outbox
+(client_outbox.py); each client is served by its own sender task.
+Clients that negotiate the bp-bin.v1 subprotocol receive weight/ampere
+telemetry as compact binary frames (telemetry_codec.py), everything else as
+JSON. A `subscribe` message narrows the topics a client receives and caps its
+update rate; sends are scheduled per client from one shared snapshot.
+Plain HTTP GETs under /api/batches are answered from the batch store.
 """
 
 import asyncio
 import websockets
 import json
 import time
-from typing import Set
+from http import HTTPStatus
+from urllib.parse import parse_qs, unquote, urlsplit
+from typing import Dict, Optional
+from client_outbox import ClientOutbox, STREAM_TOPICS
+from modbus_controller import iter_bits
+from physical_buttons import FRAME_HEARTBEAT, decode_button_frame, heartbeat_ack
+from safety_supervisor import SOURCE_EVENT_LOOP, SOURCE_HMI
+from telemetry_codec import TelemetryCodec, SUBPROTOCOL
+
+# Broadcast message type → subscription topic (unlisted types go to everyone)
+TOPIC_BY_TYPE = {
+    'weight_update': 'weights',
+    'scale_motion': 'motion',
+    'ampere_update': 'ampere',
+    'mixer_plateau': 'ampere',
+    'mixer_analytics': 'ampere',
+    'relay_update': 'relays',
+    'physical_button_update': 'buttons',
+    'emergency_stop': 'alarms',
+    'panel_stale': 'alarms',
+    'safety_trip': 'alarms',
+    'safety_recovered': 'alarms',
+    'panel_recovered': 'alarms',
+    'mixer_overload': 'alarms',
+    'mixer_overload_cleared': 'alarms',
+    'weighing_phase': 'weighing',
+    'weighing_progress': 'weighing',
+    'weighing_complete': 'weighing',
+}
+
+# Latest-value-wins messages of the stream topics; other messages on those
+# topics (e.g. mixer_plateau, mixer_analytics) are events, queued in order
+STREAM_TYPES = ('weight_update', 'scale_motion', 'ampere_update')
+
+# Messages that make a client a controlling HMI (its heartbeat is watched)
+CONTROL_TYPES = ('relay_control', 'weigh_material', 'weigh_cancel', 'emergency_stop',
+                 'batch_start', 'batch_end', 'mixer_water_dosed')
 
 class WebSocketServer:
-    def __init__(self, config: dict, scale_reader, modbus_controller, ampere_reader=None):
+    def __init__(self, config: dict, scale_reader, modbus_controller, ampere_reader=None,
+                 weighing_engine=None, mixer_analytics=None, physical_buttons=None,
+                 safety_supervisor=None, batch_store=None, recorder=None):
         self.config = config
         self.scale_reader = scale_reader
         self.modbus_controller = modbus_controller
         self.ampere_reader = ampere_reader
+        self.weighing_engine = weighing_engine
+        self.mixer_analytics = mixer_analytics
+        self.physical_buttons = physical_buttons
+        self.safety_supervisor = safety_supervisor
+        self.batch_store = batch_store
+        self.recorder = recorder  # TrafficRecorder: HMI messages and panel button edges are captured
         self.host = config['websocket_host']
         self.port = config['websocket_port']
-        self.clients: Set[websockets.WebSocketServerProtocol] = set()
+        self.clients: Dict[websockets.WebSocketServerProtocol, ClientOutbox] = {}
+        self.panels: Dict[websockets.WebSocketServerProtocol, dict] = {}  # ESP32 button panels
+        self.controllers = set()  # Clients that sent a control message
+        self.panel_path = physical_buttons.path if physical_buttons else '/esp32'
+        
+        # Panel liveness: a panel silent for longer than this (firmware sends a
+        # heartbeat every second) is stale: buttons released, alarm raised,
+        # connection dropped so it reconnects and resyncs
+        panel_config = config.get('physical_buttons', {})
+        self.panel_timeout = panel_config.get('liveness_timeout_s', 3.0)
+        self.panel_check_interval = panel_config.get('liveness_check_s', 0.5)
+        self.stale_panels: Dict[str, float] = {}  # panel_id → time marked stale
+        
+        # Slow-client policy for broadcasts
+        outbox_config = config.get('websocket_outbox', {})
+        self.outbox_max_pending = outbox_config.get('max_pending', 64)
+        self.outbox_stall_timeout = outbox_config.get('stall_timeout_s', 5.0)
+        
+        # Weight updates: "full" (all scales every tick) or "delta" (only
+        # scales that moved beyond their deadband, plus periodic keyframes)
+        weight_config = config.get('weight_updates', {})
+        self.weight_mode = weight_config.get('mode', 'full')
+        self.keyframe_interval = weight_config.get('keyframe_interval_s', 5.0)
+        self.active_frequency_hz = weight_config.get('active_frequency_hz', config['update_frequency_hz'])
+        deadband = weight_config.get('deadband_kg', 0.0)
+        self.weight_deadband = (
+            deadband if isinstance(deadband, dict)
+            else {scale: deadband for scale in config['serial_ports']}
+        )
+        self.weight_seq = 0
+        
+        # Steady flag / flow rate: sent when a flag flips or a flow moves by
+        # more than the deadband, and with every weight keyframe interval
+        self.flow_deadband = config.get('scale_motion', {}).get('flow_deadband_kg_s', 0.5)
+        self.motion_sent: Dict[str, dict] = {}
+        self.last_motion_keyframe = 0.0
+        
+        # Optional binary telemetry (JSON stays the default)
+        self.binary_enabled = config.get('telemetry', {}).get('binary_enabled', True)
+        self.codec = TelemetryCodec(list(config['serial_ports']))
+        self.weight_sent: Dict[str, float] = {}   # Values as of weight_seq
+        self.last_keyframe = 0.0
         self.running = False
+        self.loop = None
+        
+        if self.weighing_engine:
+            self.weighing_engine.add_event_listener(self.on_engine_event)
+        if self.mixer_analytics:
+            self.mixer_analytics.add_event_listener(self.on_engine_event)
+        
+        if self.safety_supervisor:
+            self.safety_supervisor.add_event_listener(self.on_engine_event)
+        
+        # Coil readback changes found by the Modbus poller
+        self.modbus_controller.add_relay_listener(self.on_relay_change)
         
     async def handle_client(self, websocket, path):
-        """Handle individual client connection"""
+        """Handle individual client connection (routed by path)"""
         client_id = f"{websocket.remote_address[0]}:{websocket.remote_address[1]}"
+        if path.rstrip('/') == self.panel_path.rstrip('/'):
+            await self.handle_panel(websocket, client_id)
+            return
+        
         print(f"✅ Client connected: {client_id}")
         
-        self.clients.add(websocket)
+        binary = websocket.subprotocol == SUBPROTOCOL
+        outbox = ClientOutbox(
+            websocket, client_id,
+            max_pending=self.outbox_max_pending,
+            stall_timeout=self.outbox_stall_timeout,
+            binary=binary
+        )
+        self.clients[websocket] = outbox
+        if binary:
+            print(f"📦 {client_id} uses binary telemetry ({SUBPROTOCOL})")
+            outbox.post(self.codec.index_frame())
+        if self.weight_mode == 'delta':
+            self.send_weight_keyframe(websocket)
+        if self.motion_sent:
+            self.post(websocket, outbox, json.dumps(self.motion_message(self.motion_sent)), 'motion')
         
+        # Messages are handled in order by a per-client task, so the receive
+        # loop stays free: an emergency stop must not wait behind a relay
+        # write that is still waiting for the bus
+        pending = asyncio.Queue()
+        asyncio.ensure_future(self.serve_messages(websocket, pending))
         try:
             async for message in websocket:
-                await self.handle_message(websocket, message)
+                if self.is_emergency_stop(message):
+                    asyncio.ensure_future(self.handle_message(websocket, message))
+                else:
+                    pending.put_nowait(message)
                 
         except websockets.exceptions.ConnectionClosed:
             print(f"❌ Client disconnected: {client_id}")
         finally:
-            self.clients.remove(websocket)
+            pending.put_nowait(None)  # Worker finishes what was received, then exits
+            self.controllers.discard(websocket)
+            outbox = self.clients.pop(websocket, None)
+            if outbox:
+                outbox.close()
+    
+    async def serve_messages(self, websocket, pending: asyncio.Queue):
+        """Handle one client's messages in arrival order (None = disconnected)"""
+        while True:
+            message = await pending.get()
+            if message is None:
+                return
+            await self.handle_message(websocket, message)
+    
+    @staticmethod
+    def is_emergency_stop(message) -> bool:
+        if not isinstance(message, str) or 'emergency_stop' not in message:
+            return False
+        try:
+            return json.loads(message).get('type') == 'emergency_stop'
+        except (ValueError, AttributeError):
+            return False
+    
+    async def handle_panel(self, websocket, client_id: str):
+        """ESP32 button panel: reports only, receives no HMI broadcasts"""
+        print(f"✅ Button panel connected: {client_id}")
+        # 'id' gains the panel_id after panel_hello; 'key' (button state) never changes
+        panel = {
+            'id': client_id, 'key': client_id, 'panel_id': None, 'pressed': set(), 'buttons': [],
+            'seq': None, 'last_seen': time.monotonic(), 'stale': False, 'supervised': False,
+        }
+        self.panels[websocket] = panel
+        
+        try:
+            async for message in websocket:
+                if panel['stale']:
+                    continue  # Being dropped; it resyncs after reconnecting
+                panel['last_seen'] = time.monotonic()
+                if isinstance(message, bytes):
+                    ack = self.on_button_frame(panel, message)
+                    if ack:
+                        await websocket.send(ack)
+                    continue
+                try:
+                    data = json.loads(message)
+                except json.JSONDecodeError:
+                    print(f"⚠️  Invalid JSON from panel {client_id}: {message}")
+                    continue
+                msg_type = data.get('type')
+                if msg_type == 'physical_button_state':
+                    self.on_physical_button(panel, data.get('relay'), bool(data.get('state', False)))
+                elif msg_type == 'panel_hello':
+                    # Bit order of the binary button frames that follow
+                    panel['buttons'] = list(data.get('buttons', []))
+                    panel['panel_id'] = data.get('panel_id', 'panel')
+                    panel['id'] = f"{panel['panel_id']}@{client_id}"
+                    # Only panels that send heartbeats are held to the timeout
+                    panel['supervised'] = bool(data.get('heartbeat_ms'))
+                    print(f"👋 Panel {panel['id']}: {len(panel['buttons'])} buttons ({data.get('format')})")
+                    self.on_panel_online(panel)
+                
+        except websockets.exceptions.ConnectionClosed:
+            print(f"❌ Button panel disconnected: {client_id}")
+        finally:
+            del self.panels[websocket]
+            # A held jog button must not stay ON when its panel drops
+            for button in list(panel['pressed']):
+                self.on_physical_button(panel, button, False)
+    
+    def on_button_frame(self, panel: dict, frame: bytes) -> Optional[bytes]:
+        """
+        Batched binary report: every changed bit is one press/release.
+        Heartbeats carry the full state; any bit that differs from what the
+        server believes is applied as a change (lost frame, missed edge).
+        Returns:
+            Heartbeat ack to send back, or None
+        """
+        try:
+            frame_type, seq, state, changed = decode_button_frame(frame)
+        except ValueError as e:
+            print(f"⚠️  Panel {panel['id']}: {e}")
+            return None
+        buttons = panel['buttons']
+        if not buttons:
+            print(f"⚠️  Panel {panel['id']}: button frame before panel_hello ignored")
+            return None
+        
+        if frame_type == FRAME_HEARTBEAT:
+            known = 0
+            for bit, button in enumerate(buttons):
+                if button in panel['pressed']:
+                    known |= 1 << bit
+            changed = state ^ known
+            if changed:
+                print(f"🔄 Panel {panel['id']}: heartbeat resync ({bin(changed).count('1')} buttons)")
+        else:
+            if panel['seq'] is not None and seq != (panel['seq'] + 1) & 0xFFFF and seq != 0:
+                print(f"⚠️  Panel {panel['id']}: button frame seq {panel['seq']} → {seq}")
+            panel['seq'] = seq
+        
+        for bit in iter_bits(changed):
+            if bit < len(buttons):
+                self.on_physical_button(panel, buttons[bit], bool(state >> bit & 1))
+        
+        return heartbeat_ack(seq) if frame_type == FRAME_HEARTBEAT else None
+    
+    def on_panel_online(self, panel: dict):
+        stale_since = self.stale_panels.pop(panel['panel_id'], None)
+        if stale_since is not None:
+            print(f"✅ Panel {panel['id']} back online")
+            self.broadcast({
+                'type': 'panel_recovered',
+                'panel': panel['id'],
+                'offline_s': round(time.monotonic() - stale_since, 1),
+                'timestamp': int(time.time() * 1000)
+            })
+    
+    async def watch_panels(self):
+        """Mark panels stale once they miss heartbeats for panel_timeout"""
+        while self.running:
+            now = time.monotonic()
+            for websocket, panel in list(self.panels.items()):
+                silent = now - panel['last_seen']
+                if not panel['supervised'] or panel['stale'] or silent <= self.panel_timeout:
+                    continue
+                
+                panel['stale'] = True
+                self.stale_panels[panel['panel_id'] or panel['id']] = now
+                print(f"🚨 Panel {panel['id']} stale: silent for {silent:.1f}s")
+                # A held jog button must not keep running on a dead link
+                for button in list(panel['pressed']):
+                    self.on_physical_button(panel, button, False)
+                self.broadcast({
+                    'type': 'panel_stale',
+                    'panel': panel['id'],
+                    'silent_s': round(silent, 1),
+                    'timeout_s': self.panel_timeout,
+                    'timestamp': int(time.time() * 1000)
+                })
+                if self.batch_store:
+                    self.batch_store.record_event('panel_stale', {'panel': panel['id'], 'silent_s': round(silent, 1)})
+                asyncio.ensure_future(websocket.close(code=1011, reason='heartbeat timeout'))
+            
+            await asyncio.sleep(self.panel_check_interval)
+    
+    def on_physical_button(self, panel: dict, button: str, pressed: bool):
+        """Act on the coils first, then notify the HMIs"""
+        if not button:
+            return
+        if self.recorder:
+            # Decoded edge (JSON or binary frame, resync, release on disconnect)
+            self.recorder.record_control('panel', json.dumps({
+                'type': 'physical_button', 'panel': panel['key'], 'button': button, 'pressed': pressed
+            }))
+        if pressed:
+            panel['pressed'].add(button)
+        else:
+            panel['pressed'].discard(button)
+        
+        action = 'notify'
+        if self.physical_buttons:
+            action = self.physical_buttons.handle(button, pressed, panel['key'])
+            if action is None:
+                return  # No edge (repeated report)
+        
+        print(f"🔘 Physical button ({panel['id']}): {button} = {'PRESSED' if pressed else 'RELEASED'} [{action}]")
+        timestamp = int(time.time() * 1000)
+        self.broadcast({
+            'type': 'physical_button_update',
+            'relay': button,
+            'state': pressed,
+            'action': action,
+            'panel': panel['id'],
+            'timestamp': timestamp
+        })
+        if self.batch_store:
+            self.batch_store.record_event('physical_button', {
+                'button': button, 'state': pressed, 'action': action, 'panel': panel['id']
+            })
+        if action == 'emergency_stop' and pressed:
+            self.broadcast({
+                'type': 'emergency_stop',
+                'source': 'physical_button',
+                'button': button,
+                'timestamp': timestamp
+            })
+    
+    def heartbeat_source(self, websocket) -> Optional[str]:
+        """
+        Watchdog source for a controlling HMI: one that sent a control message
+        or receives relay updates. Passive subscribers (e.g. office dashboards
+        on weights only) return None and cannot keep the watchdog fed.
+        Keyed by host, so a reconnecting HMI feeds its own source again.
+        """
+        outbox = self.clients.get(websocket)
+        if websocket not in self.controllers and not (outbox and outbox.subscription.wants('relays')):
+            return None
+        return f"{SOURCE_HMI}:{websocket.remote_address[0]}"
     
     async def handle_message(self, websocket, message: str):
         """Handle incoming message from client"""
+        if self.recorder:
+            self.recorder.record_control('hmi', message)
         try:
             data = json.loads(message)
             msg_type = data.get('type')
+            if msg_type in CONTROL_TYPES:
+                self.controllers.add(websocket)
             
             if msg_type == 'relay_control':
                 # Control relay via Modbus
@@ -52,9 +385,9 @@ class WebSocketServer:
                 # Try to set relay
                 success = False
                 if coil_address is not None:
-                    success = self.modbus_controller.set_relay_by_coil(coil_address, state)
+                    success = await self.modbus_controller.set_relay_by_coil_async(coil_address, state)
                 else:
-                    success = self.modbus_controller.set_relay(relay, state)
+                    success = await self.modbus_controller.set_relay_async(relay, state)
                 
                 # Send acknowledgment
                 response = {
@@ -66,17 +399,131 @@ class WebSocketServer:
                 await websocket.send(json.dumps(response))
                 
             elif msg_type == 'get_status':
-                # Send current relay status from Modbus
-                status = self.modbus_controller.get_status()
+                # Current relay status (poller cache while fresh, else a live read)
+                status = await self.modbus_controller.get_status_async()
+                age = self.modbus_controller.status_age()
                 response = {
                     'type': 'status',
-                    'relays': status
+                    'relays': status,
+                    'age_ms': None if age is None else int(age * 1000)
+                }
+                await websocket.send(json.dumps(response))
+                
+            elif msg_type == 'weigh_material':
+                # Closed-loop weighing job executed by the weighing engine
+                response = {
+                    'type': 'weigh_ack',
+                    'job_id': data.get('job_id'),
+                    'material': data.get('material'),
+                    'success': False
+                }
+                if not self.weighing_engine:
+                    response['error'] = 'Weighing engine disabled'
+                else:
+                    try:
+                        job = self.weighing_engine.start_job(data)
+                        response['job_id'] = job.job_id
+                        response['success'] = True
+                    except (KeyError, ValueError) as e:
+                        response['error'] = str(e)
+                await websocket.send(json.dumps(response))
+                
+            elif msg_type == 'weigh_cancel':
+                success = False
+                if self.weighing_engine:
+                    success = self.weighing_engine.cancel_job(str(data.get('job_id')))
+                response = {
+                    'type': 'weigh_cancel_ack',
+                    'job_id': data.get('job_id'),
+                    'success': success
+                }
+                await websocket.send(json.dumps(response))
+                
+            elif msg_type in ('batch_start', 'batch_end', 'mixer_water_dosed', 'get_mixer_analytics'):
+                if msg_type == 'batch_start':
+                    data['batch_id'] = str(data.get('batch_id') or int(time.time() * 1000))
+                response = self.handle_mixer_message(msg_type, data)
+                if self.batch_store and not self.mixer_analytics and msg_type in ('batch_start', 'batch_end'):
+                    # Batch lifecycle still recorded without the ampere meter
+                    response = {'type': 'batch_started' if msg_type == 'batch_start' else 'batch_summary', 'batch': None}
+                if self.batch_store and msg_type == 'batch_start':
+                    info = {key: value for key, value in data.items() if key not in ('type', 'batch_id')}
+                    self.batch_store.start_batch(data['batch_id'], info)
+                    response.setdefault('batch_id', data['batch_id'])
+                elif self.batch_store and msg_type == 'batch_end':
+                    response.setdefault('batch_id', self.batch_store.current_batch)
+                    self.batch_store.end_batch(response.get('batch'))
+                await websocket.send(json.dumps(response))
+                if self.mixer_analytics and msg_type != 'get_mixer_analytics':
+                    # Batch stats for every client, incl. binary ones whose
+                    # ampere frames only carry the rolling values
+                    self.broadcast(self.handle_mixer_message('get_mixer_analytics', data))
+                
+            elif msg_type in ('get_batches', 'get_batch'):
+                # SQLite reads run off the event loop
+                response = await self.query_batches(msg_type, data)
+                await websocket.send(json.dumps(response))
+                
+            elif msg_type == 'get_mixer_series':
+                series = None
+                if self.mixer_analytics:
+                    series = self.mixer_analytics.get_series(int(data.get('since_seq', 0)))
+                response = {
+                    'type': 'mixer_series',
+                    'series': series
+                }
+                await websocket.send(json.dumps(response))
+                
+            elif msg_type == 'subscribe':
+                # {"type": "subscribe", "topics": ["weights", "alarms"], "max_rate_hz": 1}
+                outbox = self.clients.get(websocket)
+                if outbox:
+                    effective = outbox.subscription.update(data.get('topics'), data.get('max_rate_hz'))
+                    response = {'type': 'subscribed'}
+                    response.update(effective)
+                    await websocket.send(json.dumps(response))
+                    if 'weights' in outbox.subscription.topics:
+                        self.send_weight_keyframe(websocket)
+                
+            elif msg_type == 'request_keyframe':
+                # Client detected a gap in weight_update sequence numbers
+                self.send_weight_keyframe(websocket)
+                
+            elif msg_type == 'get_scale_filters':
+                response = {
+                    'type': 'scale_filters',
+                    'raw': self.scale_reader.get_raw_weights(),
+                    'filters': self.scale_reader.get_filter_stats()
+                }
+                await websocket.send(json.dumps(response))
+                
+            elif msg_type == 'get_bus_stats':
+                response = {
+                    'type': 'bus_stats',
+                    'modbus': self.modbus_controller.get_bus_stats()
+                }
+                await websocket.send(json.dumps(response))
+                
+            elif msg_type == 'heartbeat':
+                # HMI liveness for the safety supervisor's watchdog
+                source = self.heartbeat_source(websocket)
+                if self.safety_supervisor and source:
+                    self.safety_supervisor.feed(source)
+                
+            elif msg_type == 'get_safety_status':
+                response = {
+                    'type': 'safety_status',
+                    'safety': self.safety_supervisor.get_metrics() if self.safety_supervisor else None
                 }
                 await websocket.send(json.dumps(response))
                 
             elif msg_type == 'emergency_stop':
                 # Emergency stop all relays via Modbus
-                self.modbus_controller.set_all_off()
+                if self.batch_store:
+                    self.batch_store.record_event('emergency_stop', {'source': 'hmi'})
+                if self.weighing_engine:
+                    self.weighing_engine.cancel_all()
+                await self.modbus_controller.set_all_off_async()
                 response = {
                     'type': 'emergency_ack',
                     'message': 'All relays turned OFF'
@@ -88,85 +535,284 @@ class WebSocketServer:
         except Exception as e:
             print(f"❌ Error handling message: {e}")
     
+    def handle_mixer_message(self, msg_type: str, data: dict) -> dict:
+        """Batch lifecycle / analytics requests for the mixer load curve"""
+        if not self.mixer_analytics:
+            return {'type': 'error', 'message': 'Mixer analytics disabled'}
+        
+        if msg_type == 'batch_start':
+            batch_id = str(data.get('batch_id') or int(time.time() * 1000))
+            return {'type': 'batch_started', 'batch': self.mixer_analytics.start_batch(batch_id)}
+        if msg_type == 'batch_end':
+            return {'type': 'batch_summary', 'batch': self.mixer_analytics.end_batch()}
+        if msg_type == 'mixer_water_dosed':
+            return {'type': 'mixer_water_dosed_ack', 'success': self.mixer_analytics.mark_water_dosed()}
+        
+        snapshot = self.mixer_analytics.get_snapshot()
+        snapshot['type'] = 'mixer_analytics'
+        return snapshot
+    
+    async def query_batches(self, msg_type: str, data: dict) -> dict:
+        """get_batches {limit, before} → batches; get_batch {batch_id} → batch"""
+        if not self.batch_store:
+            return {'type': 'error', 'message': 'Batch store disabled'}
+        loop = asyncio.get_running_loop()
+        if msg_type == 'get_batches':
+            batches = await loop.run_in_executor(
+                None, self.batch_store.recent_batches, int(data.get('limit', 20)), data.get('before'))
+            return {'type': 'batches', 'batches': batches, 'store': self.batch_store.get_stats()}
+        batch = await loop.run_in_executor(None, self.batch_store.get_batch, str(data.get('batch_id')))
+        return {'type': 'batch', 'batch_id': data.get('batch_id'), 'batch': batch}
+    
+    async def process_http_request(self, path: str, request_headers):
+        """
+        GET /api/batches?limit=20&before=<started_at>  → recent batches (JSON)
+        GET /api/batches/<batch_id>                    → one batch with details
+        Anything else continues with the WebSocket handshake.
+        """
+        url = urlsplit(path)
+        if not url.path.startswith('/api/batches') or request_headers.get('Upgrade'):
+            return None
+        
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        batch_id = unquote(url.path[len('/api/batches'):].strip('/'))
+        try:
+            if batch_id:
+                response = await self.query_batches('get_batch', {'batch_id': batch_id})
+                status = HTTPStatus.OK if response.get('batch') else HTTPStatus.NOT_FOUND
+            else:
+                before = float(query['before']) if 'before' in query else None
+                response = await self.query_batches('get_batches', {'limit': query.get('limit', 20), 'before': before})
+                status = HTTPStatus.OK if response['type'] == 'batches' else HTTPStatus.SERVICE_UNAVAILABLE
+        except ValueError as e:
+            response, status = {'type': 'error', 'message': str(e)}, HTTPStatus.BAD_REQUEST
+        
+        body = json.dumps(response).encode()
+        headers = [('Content-Type', 'application/json'), ('Access-Control-Allow-Origin', '*')]
+        return status, headers, body
+    
+    def encoder(self, message: dict):
+        """
+        Per-message frame cache: frame(binary) encodes at most once per
+        encoding, however many clients receive the message
+        """
+        encode_binary = self.codec.encoder_for(message['type'])
+        frames = {}
+        
+        def frame(binary: bool):
+            binary = binary and encode_binary is not None
+            if binary not in frames:
+                frames[binary] = encode_binary(message) if binary else json.dumps(message)
+            return frames[binary]
+        return frame
+    
+    def post(self, websocket, outbox: ClientOutbox, frame, slot: Optional[str] = None):
+        if not outbox.post(frame, slot):
+            # Over its limit: outbox is closing the connection
+            self.clients.pop(websocket, None)
+    
+    def broadcast(self, message: dict):
+        """
+        Encode a message once and queue it for every subscribed client
+        Stream topics (weights, ampere) are latest-value-wins and rate limited
+        per client; everything else is queued in order.
+        """
+        if not self.clients:
+            return
+        topic = TOPIC_BY_TYPE.get(message['type'])
+        stream = topic in STREAM_TOPICS and message['type'] in STREAM_TYPES
+        frame = self.encoder(message)
+        now = time.monotonic()
+        for websocket, outbox in list(self.clients.items()):
+            subscription = outbox.subscription
+            if not subscription.wants(topic):
+                continue
+            if stream:
+                if not subscription.due(topic, now):
+                    continue
+                subscription.mark(topic, now)
+            self.post(websocket, outbox, frame(outbox.binary), topic if stream else None)
+    
+    def publish_weights(self, message: Optional[dict]):
+        """
+        Fan out the shared weight state. Clients that received the previous
+        frame get the delta; rate-limited or lagging clients get a full frame
+        (keyframe) when they are due, so skipped deltas never leave them stale.
+        """
+        if not self.clients or not self.weight_sent:
+            return
+        delta = self.encoder(message) if message else None
+        full = None
+        now = time.monotonic()
+        for websocket, outbox in list(self.clients.items()):
+            subscription = outbox.subscription
+            if (not subscription.wants('weights') or subscription.weight_seq == self.weight_seq
+                    or not subscription.due('weights', now)):
+                continue
+            if delta and subscription.weight_seq == self.weight_seq - 1:
+                frame = delta(outbox.binary)
+            else:
+                if full is None:
+                    full = self.encoder(self.weight_message(dict(self.weight_sent), True))
+                frame = full(outbox.binary)
+            subscription.mark('weights', now)
+            subscription.weight_seq = self.weight_seq
+            self.post(websocket, outbox, frame, 'weights')
+    
+    def on_engine_event(self, event: dict):
+        """Weighing/mixer event (reader thread) → broadcast on the event loop"""
+        if self.loop and self.running:
+            self.loop.call_soon_threadsafe(self.broadcast, event)
+    
+    def on_relay_change(self, changes: dict):
+        """Coil readback changed (bus thread) → push only the changed relays"""
+        if self.loop and self.running and self.clients:
+            message = {
+                'type': 'relay_update',
+                'timestamp': int(time.time() * 1000),
+                'relays': changes
+            }
+            self.loop.call_soon_threadsafe(self.broadcast, message)
+    
+    def weight_message(self, weights: Dict[str, float], keyframe: bool) -> dict:
+        return {
+            'type': 'weight_update',
+            'timestamp': int(time.time() * 1000),
+            'seq': self.weight_seq,
+            'keyframe': keyframe,
+            'weights': weights
+        }
+    
+    def send_weight_keyframe(self, websocket):
+        """Queue the last sent weights (current seq) for a single client"""
+        outbox = self.clients.get(websocket)
+        if outbox and self.weight_sent:
+            message = self.weight_message(dict(self.weight_sent), True)
+            outbox.subscription.weight_seq = self.weight_seq
+            self.post(websocket, outbox, self.encoder(message)(outbox.binary), 'weights')
+    
+    def next_weight_message(self, weights: Dict[str, float], now: float) -> Optional[dict]:
+        """Full frame, or in delta mode only the scales outside their deadband"""
+        keyframe = (self.weight_mode != 'delta' or not self.weight_sent
+                    or now - self.last_keyframe >= self.keyframe_interval)
+        if keyframe:
+            changed = weights
+            self.last_keyframe = now
+        else:
+            changed = {
+                scale: weight for scale, weight in weights.items()
+                if scale not in self.weight_sent
+                or (weight != self.weight_sent[scale]
+                    and abs(weight - self.weight_sent[scale]) >= self.weight_deadband.get(scale, 0.0))
+            }
+            if not changed:
+                return None
+        
+        self.weight_seq += 1
+        self.weight_sent.update(changed)
+        return self.weight_message(changed, keyframe)
+    
+    def motion_message(self, motion: Dict[str, dict]) -> dict:
+        return {
+            'type': 'scale_motion',
+            'timestamp': int(time.time() * 1000),
+            'scales': motion
+        }
+    
+    def next_motion_message(self, motion: Dict[str, dict], now: float) -> Optional[dict]:
+        """All scales' motion state if any steady flag flipped or flow moved beyond the deadband"""
+        changed = now - self.last_motion_keyframe >= self.keyframe_interval or any(
+            scale not in self.motion_sent
+            or state['steady'] != self.motion_sent[scale]['steady']
+            or abs(state['flow_kg_s'] - self.motion_sent[scale]['flow_kg_s']) >= self.flow_deadband
+            for scale, state in motion.items()
+        )
+        if not changed:
+            return None
+        self.last_motion_keyframe = now
+        self.motion_sent = motion
+        return self.motion_message(motion)
+    
     async def broadcast_weights(self):
         """Broadcast weight data to all connected clients"""
-        update_interval = 1.0 / self.config['update_frequency_hz']
+        idle_interval = 1.0 / self.config['update_frequency_hz']
+        active_interval = 1.0 / self.active_frequency_hz
         
         while self.running:
             if self.clients:
                 # Get current weights
                 weights = self.scale_reader.get_weights()
                 
-                # Create message
-                message = {
-                    'type': 'weight_update',
-                    'timestamp': int(time.time() * 1000),
-                    'weights': weights
-                }
+                # Create message (None = nothing moved beyond the deadband)
+                message = self.next_weight_message(weights, time.monotonic())
                 
-                # Broadcast to all clients
-                disconnected = set()
-                for client in self.clients:
-                    try:
-                        await client.send(json.dumps(message))
-                    except:
-                        disconnected.add(client)
+                # Per-client fan-out. A frame a slow client has not sent yet is
+                # replaced; the seq gap makes it ask for a keyframe.
+                self.publish_weights(message)
                 
-                # Remove disconnected clients
-                self.clients -= disconnected
+                # Steady / flow rate changes (small JSON message, own topic)
+                motion = self.next_motion_message(self.scale_reader.get_motion(), time.monotonic())
+                if motion:
+                    self.broadcast(motion)
             
-            await asyncio.sleep(update_interval)
+            # Faster updates while the engine is weighing
+            weighing = self.weighing_engine is not None and bool(self.weighing_engine.jobs)
+            await asyncio.sleep(active_interval if weighing else idle_interval)
     
     async def broadcast_ampere(self):
         """Broadcast ampere meter data to all connected clients"""
         if not self.ampere_reader:
             return  # Ampere meter not available
         
-        update_interval = 0.5  # 500ms update rate
+        update_interval = self.ampere_reader.sample_interval  # Follow the sampler rate
         
         while self.running:
             if self.clients:
-                # Get current ampere data
-                ampere_data = self.ampere_reader.get_all_data()
+                # Latest sample from the PZEM sampler thread (no serial I/O here)
+                ampere_data = self.ampere_reader.get_cached_data()
                 
-                if ampere_data:
+                if ampere_data['timestamp']:
                     # Create message
                     message = {
                         'type': 'ampere_update',
                         'timestamp': int(time.time() * 1000),
                         'data': ampere_data
                     }
+                    if self.mixer_analytics:
+                        message['analytics'] = self.mixer_analytics.get_snapshot()
                     
                     # Broadcast to all clients
-                    disconnected = set()
-                    for client in self.clients:
-                        try:
-                            await client.send(json.dumps(message))
-                        except:
-                            disconnected.add(client)
-                    
-                    # Remove disconnected clients
-                    self.clients -= disconnected
+                    self.broadcast(message)
             
             await asyncio.sleep(update_interval)
     
+    async def feed_safety_watchdog(self):
+        """Event loop heartbeat: a blocked loop stops feeding and trips the supervisor"""
+        interval = self.safety_supervisor.watchdog_timeout / 5.0
+        while self.running:
+            self.safety_supervisor.feed(SOURCE_EVENT_LOOP)
+            await asyncio.sleep(interval)
+    
     async def start_server(self):
         """Start WebSocket server"""
         self.running = True
+        self.loop = asyncio.get_running_loop()
         
         # Start server
-        async with websockets.serve(self.handle_client, self.host, self.port):
+        subprotocols = [SUBPROTOCOL] if self.binary_enabled else None
+        async with websockets.serve(self.handle_client, self.host, self.port,
+                                    subprotocols=subprotocols,
+                                    process_request=self.process_http_request):
             print(f"✅ WebSocket server started on ws://{self.host}:{self.port}")
             
             # Start broadcasting tasks
+            tasks = [self.broadcast_weights(), self.watch_panels()]
+            if self.safety_supervisor:
+                tasks.append(self.feed_safety_watchdog())
             if self.ampere_reader:
                 print("✅ Ampere meter broadcasting enabled")
-                await asyncio.gather(
-                    self.broadcast_weights(),
-                    self.broadcast_ampere()
-                )
-            else:
-                await self.broadcast_weights()
+                tasks.append(self.broadcast_ampere())
+            await asyncio.gather(*tasks)
     
     def start(self):
         """Start server (blocking)"""
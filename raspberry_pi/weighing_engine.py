@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""
+Weighing Engine Module
+Closed-loop material weighing (trigger / jogging / tolerance) driven directly
+by ScaleReader samples, so gate cut-off decisions are taken on the controller
+instead of in the browser.
+"""
+
+import threading
+import time
+import itertools
+from typing import Dict, List, Callable
+from bus_scheduler import PRIORITY_PROCESS, PRIORITY_SAFETY
+
+# Job phases
+PHASE_FILLING = 'filling'
+PHASE_JOGGING = 'jogging'
+PHASE_COMPLETE = 'complete'
+PHASE_STALLED = 'stalled'
+PHASE_CANCELLED = 'cancelled'
+
+
+class WeighingJob:
+    """State of a single "weigh material X to Y kg" job"""
+
+    def __init__(self, job_id: str, material: str, scales: List[str],
+                 relays: List[tuple], target: float, trigger: float,
+                 jog_on: float, jog_off: float, tolerance: float):
+        self.job_id = job_id
+        self.material = material
+        self.scales = scales
+        self.relays = relays            # [(coil_address, relay_name), ...]
+        self.target = target
+        self.trigger_weight = target * (trigger / 100.0)
+        self.final_weight = target - tolerance
+        self.jog_on = jog_on
+        self.jog_off = jog_off
+        self.tolerance = tolerance
+
+        self.phase = PHASE_FILLING
+        self.gate_open = False
+        self.open_futures = []          # Gate-open writes that may still be queued
+        self.weight = 0.0
+        self.started_at = time.monotonic()
+        self.jog_cycle_start = 0.0
+        self.last_progress_weight = None
+        self.last_progress_time = self.started_at
+        self.last_event_time = 0.0
+        self.close_latency_ms = None
+
+    def to_dict(self) -> dict:
+        return {
+            'job_id': self.job_id,
+            'material': self.material,
+            'phase': self.phase,
+            'weight': round(self.weight, 2),
+            'target': self.target,
+            'trigger_weight': round(self.trigger_weight, 2),
+            'final_weight': round(self.final_weight, 2),
+            'gate_open': self.gate_open,
+        }
+
+
+class WeighingEngine:
+    def __init__(self, config: dict, scale_reader, modbus_controller):
+        self.config = config.get('weighing_engine', {})
+        self.scale_reader = scale_reader
+        self.modbus_controller = modbus_controller
+
+        self.progress_interval = self.config.get('progress_interval_ms', 100) / 1000.0
+        self.stall_timeout = self.config.get('stall_timeout_seconds', 15)
+        self.stall_progress_kg = self.config.get('stall_progress_kg', 1.0)
+
+        self.jobs: Dict[str, WeighingJob] = {}
+        self.jobs_by_scale: Dict[str, List[WeighingJob]] = {}
+        self.latest_weights: Dict[str, float] = {}
+        self.lock = threading.RLock()
+        self.event_listeners: List[Callable[[dict], None]] = []
+        self._job_counter = itertools.count(1)
+
+        scale_reader.add_sample_listener(self.on_sample)
+
+        print("✅ Weighing engine initialized")
+
+    def add_event_listener(self, callback: Callable[[dict], None]):
+        """Register callback(event) for progress/phase/complete events"""
+        self.event_listeners.append(callback)
+
+    def _emit(self, event_type: str, job: WeighingJob, **extra):
+        event = job.to_dict()
+        event['type'] = event_type
+        event['timestamp'] = int(time.time() * 1000)
+        event.update(extra)
+        for callback in self.event_listeners:
+            try:
+                callback(event)
+            except Exception as e:
+                print(f"⚠️  Weighing event listener error: {e}")
+
+    def _resolve_relays(self, relays: List[str], coils: List[int]) -> List[tuple]:
+        """Resolve relay names and/or raw coil addresses to (coil, name) pairs"""
+        mapping = self.modbus_controller.relay_mapping
+        resolved = []
+        for name in relays or []:
+            name = name.lower()
+            if name not in mapping:
+                raise ValueError(f"Unknown relay: {name}")
+            resolved.append((mapping[name], name))
+        for coil in coils or []:
+            resolved.append((int(coil), self.modbus_controller.get_relay_name_by_coil(int(coil))))
+        if not resolved:
+            raise ValueError("Weighing job needs at least one relay or coil")
+        return resolved
+
+    def start_job(self, job_data: dict) -> WeighingJob:
+        """
+        Start a weighing job
+        Args:
+            job_data: {
+                'job_id': optional id, generated if missing,
+                'material': e.g. 'pasir1',
+                'scales': ['pasir'] (summed, e.g. ['pasir', 'batu'] for a shared hopper),
+                'relays': ['pintu_pasir_1'] and/or 'coils': [4],
+                'target': kg, absolute scale reading unless 'relative' is true,
+                'relative': True to add target to the current reading,
+                'trigger': % of target to stop full flow (default 70),
+                'jog_on' / 'jog_off': seconds (default 1 / 2),
+                'tolerance': kg (default 5)
+            }
+        Raises:
+            ValueError: invalid job or scale already busy
+        """
+        material = job_data.get('material', '')
+        scales = job_data.get('scales') or ([job_data['scale']] if job_data.get('scale') else [])
+        if not scales:
+            raise ValueError("Weighing job needs a scale")
+        for scale in scales:
+            if scale not in self.scale_reader.serial_ports:
+                raise ValueError(f"Unknown scale: {scale}")
+
+        target = float(job_data['target'])
+        relays = self._resolve_relays(job_data.get('relays'), job_data.get('coils'))
+
+        with self.lock:
+            # Smoothed weights only stand in for scales without a sample yet
+            for scale, weight in self.scale_reader.get_weights().items():
+                self.latest_weights.setdefault(scale, weight)
+            for scale in scales:
+                if self.jobs_by_scale.get(scale):
+                    raise ValueError(f"Scale {scale} already has an active weighing job")
+
+            if job_data.get('relative'):
+                target += self._current_weight(scales)
+
+            job_id = str(job_data.get('job_id') or f"job-{next(self._job_counter)}")
+            if job_id in self.jobs:
+                raise ValueError(f"Duplicate weighing job id: {job_id}")
+            job = WeighingJob(
+                job_id=job_id,
+                material=material,
+                scales=list(scales),
+                relays=relays,
+                target=target,
+                trigger=float(job_data.get('trigger', 70)),
+                jog_on=float(job_data.get('jog_on', 1)),
+                jog_off=float(job_data.get('jog_off', 2)),
+                tolerance=float(job_data.get('tolerance', 5)),
+            )
+            job.weight = self._current_weight(scales)
+            job.last_progress_weight = job.weight
+
+            self.jobs[job_id] = job
+            for scale in scales:
+                self.jobs_by_scale.setdefault(scale, []).append(job)
+
+            print(f"⚖️  Weighing {material}: target={job.target:.1f}kg, "
+                  f"trigger={job.trigger_weight:.1f}kg, final={job.final_weight:.1f}kg")
+
+            if job.weight >= job.final_weight:
+                self._finish(job, PHASE_COMPLETE)
+            else:
+                self._set_gate(job, True)
+                self._emit('weighing_phase', job)
+
+        return job
+
+    def cancel_job(self, job_id: str) -> bool:
+        """Cancel a running job, closing its gates"""
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return False
+            self._finish(job, PHASE_CANCELLED)
+            return True
+
+    def cancel_all(self):
+        """Cancel every running job (shutdown / emergency stop)"""
+        with self.lock:
+            for job in list(self.jobs.values()):
+                self._finish(job, PHASE_CANCELLED)
+
+    def cancel_jobs_on(self, scale: str = None, coil_address: int = None) -> List[str]:
+        """Cancel jobs weighing on a scale or driving a coil (safety supervisor)"""
+        with self.lock:
+            cancelled = []
+            for job in list(self.jobs.values()):
+                if scale in job.scales or any(coil == coil_address for coil, _ in job.relays):
+                    self._finish(job, PHASE_CANCELLED)
+                    cancelled.append(job.job_id)
+            return cancelled
+
+    def get_jobs(self) -> List[dict]:
+        with self.lock:
+            return [job.to_dict() for job in self.jobs.values()]
+
+    def _current_weight(self, scales: List[str]) -> float:
+        return sum(self.latest_weights.get(scale, 0.0) for scale in scales)
+
+    def _set_gate(self, job: WeighingJob, state: bool):
+        """Queue writes for all job relays without blocking the reader thread"""
+        job.gate_open = state
+        # Closing a gate at the cut-off point jumps ahead of ordinary process writes,
+        # so an open still waiting for the bus is dropped rather than served after it
+        priority = PRIORITY_PROCESS if state else PRIORITY_SAFETY
+        if not state:
+            for future in job.open_futures:
+                future.cancel()
+        futures = []
+        for coil_address, relay_name in job.relays:
+            futures.append(self.modbus_controller.set_relay_by_coil_nowait(
+                coil_address, state, relay_name, priority))
+        job.open_futures = futures if state else []
+        return futures
+
+    def _finish(self, job: WeighingJob, phase: str, sample_time: float = None):
+        close_futures = self._set_gate(job, False) if job.gate_open else []
+        job.phase = phase
+
+        del self.jobs[job.job_id]
+        for scale in job.scales:
+            scale_jobs = self.jobs_by_scale.get(scale, [])
+            if job in scale_jobs:
+                scale_jobs.remove(job)
+
+        duration = time.monotonic() - job.started_at
+        print(f"✅ {job.material} weighing {phase}: {job.weight:.1f}kg in {duration:.1f}s")
+
+        if not close_futures or sample_time is None:
+            self._emit('weighing_complete', job, duration_s=round(duration, 2), close_latency_ms=None)
+            return
+
+        # Report completion once the gate close is acknowledged by the bus
+        pending = [len(close_futures)]
+
+        def on_closed(_future):
+            with self.lock:
+                pending[0] -= 1
+                if pending[0]:
+                    return
+            job.close_latency_ms = (time.monotonic() - sample_time) * 1000.0
+            self._emit('weighing_complete', job,
+                       duration_s=round(duration, 2),
+                       close_latency_ms=round(job.close_latency_ms, 2))
+
+        for future in close_futures:
+            future.add_done_callback(on_closed)
+
+    def on_sample(self, scale_name: str, weight: float, sample_time: float, raw: float):
+        """
+        Called by ScaleReader for every parsed sample (reader thread)
+        Args:
+            scale_name: Scale that produced the sample
+            weight: Outlier-rejected weight in kg, not smoothed; a ramp
+                starting from steady is at most one sample late
+            sample_time: time.monotonic() when the frame was parsed
+            raw: Parsed weight before the filter stage (unused)
+        """
+        self.latest_weights[scale_name] = weight
+        if not self.jobs_by_scale.get(scale_name):
+            return
+
+        with self.lock:
+            for job in list(self.jobs_by_scale.get(scale_name, [])):
+                self._step(job, sample_time)
+
+    def _step(self, job: WeighingJob, now: float):
+        job.weight = self._current_weight(job.scales)
+
+        if job.weight >= job.final_weight:
+            self._finish(job, PHASE_COMPLETE, now)
+            return
+
+        if job.phase == PHASE_FILLING:
+            if job.weight >= job.trigger_weight:
+                # Stop full flow, continue with jogging pulses
+                self._set_gate(job, False)
+                job.phase = PHASE_JOGGING
+                job.jog_cycle_start = now
+                job.last_progress_time = now
+                self._emit('weighing_phase', job)
+                return
+
+        elif job.phase == PHASE_JOGGING:
+            cycle = job.jog_on + job.jog_off
+            position = (now - job.jog_cycle_start) % cycle if cycle > 0 else 0.0
+            should_be_on = position < job.jog_on
+            if should_be_on != job.gate_open:
+                self._set_gate(job, should_be_on)
+
+            # Watchdog: force completion if no progress while jogging
+            if job.weight > job.last_progress_weight + self.stall_progress_kg:
+                job.last_progress_weight = job.weight
+                job.last_progress_time = now
+            elif now - job.last_progress_time > self.stall_timeout:
+                print(f"⚠️  WATCHDOG: {job.material} weighing stuck at {job.weight:.1f}kg")
+                self._finish(job, PHASE_STALLED, now)
+                return
+
+        if now - job.last_event_time >= self.progress_interval:
+            job.last_event_time = now
+            self._emit('weighing_progress', job)
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Weight Frame Parser Module
+Parses raw indicator frames (bytes) into weight + status, using a format
+profile per indicator port
+
+Profiles:
+- "generic":     first number in the frame, e.g. "WT:  125.5 kg", "  125.5  "
+- "wt":          "WT:  125.5 kg"
+- "gross_net":   "GROSS:340.2KG", "NET:-12.0KG", "GS 340.2", "NT 12.0"
+- "fixed_width": signed fixed width, e.g. "+089.7", "-0012.5"
+- "st_gs":       status frames "ST,GS,+00125.5kg" (ST=stable, US=motion,
+                 OL=overload; GS=gross, NT=net)
+"""
+
+import re
+import sys
+from typing import NamedTuple, Optional, Union
+
+
+class WeightFrame(NamedTuple):
+    weight: float
+    stable: Optional[bool]      # None when the format carries no status
+    overload: bool
+    net: Optional[bool]         # True = net, False = gross, None = unknown
+
+
+_NUMBER = rb'([+-]?\d+(?:\.\d*)?)'
+
+PROFILE_PATTERNS = {
+    'generic': re.compile(_NUMBER),
+    'wt': re.compile(rb'\s*WT\s*:\s*' + _NUMBER, re.IGNORECASE),
+    'gross_net': re.compile(rb'\s*(GROSS|NET|GS|NT)\s*[:,]?\s*' + _NUMBER, re.IGNORECASE),
+    'fixed_width': re.compile(rb'\s*([+-]\d+(?:\.\d+)?)'),
+    'st_gs': re.compile(rb'\s*(ST|US|OL)\s*,\s*(GS|NT)\s*,\s*' + _NUMBER, re.IGNORECASE),
+}
+
+DEFAULT_PROFILE = 'generic'
+
+_END = sys.maxsize
+
+
+class WeightParser:
+    def __init__(self, profile: str = DEFAULT_PROFILE,
+                 min_kg: float = -10000, max_kg: float = 10000):
+        if profile not in PROFILE_PATTERNS:
+            raise ValueError(f"Unknown indicator profile: {profile}")
+        self.profile = profile
+        self.min_kg = min_kg
+        self.max_kg = max_kg
+        self.pattern = PROFILE_PATTERNS[profile]
+
+        # Bind the profile-specific parse function once; parse() runs for
+        # every frame, so it is a closure over pre-bound locals.
+        # parse(buffer, pos, endpos) matches a frame in place inside a larger
+        # buffer (bytes/bytearray/memoryview) without slicing it out.
+        self.parse = getattr(self, f"_build_{profile}")()
+
+    @classmethod
+    def from_config(cls, profile_config: Union[str, dict, None]) -> 'WeightParser':
+        """
+        Build a parser from an indicator_profiles entry
+        Accepts a profile name ("st_gs") or {"format": "st_gs", "min_kg": .., "max_kg": ..}
+        """
+        if profile_config is None:
+            return cls()
+        if isinstance(profile_config, str):
+            return cls(profile_config)
+        return cls(
+            profile_config.get('format', DEFAULT_PROFILE),
+            profile_config.get('min_kg', -10000),
+            profile_config.get('max_kg', 10000),
+        )
+
+    def _build_plain(self, find):
+        """Formats that carry only a number in group 1"""
+        min_kg, max_kg = self.min_kg, self.max_kg
+        new = tuple.__new__
+
+        def parse(line: bytes, pos: int = 0, endpos: int = _END) -> Optional[WeightFrame]:
+            match = find(line, pos, endpos)
+            if match is None:
+                return None
+            weight = float(match.group(1))
+            # Out of range readings are reported as overload instead of a weight
+            return new(WeightFrame, (weight, None, not (min_kg <= weight <= max_kg), None))
+        return parse
+
+    def _build_generic(self):
+        return self._build_plain(self.pattern.search)
+
+    def _build_wt(self):
+        return self._build_plain(self.pattern.match)
+
+    def _build_fixed_width(self):
+        return self._build_plain(self.pattern.match)
+
+    def _build_gross_net(self):
+        match_frame = self.pattern.match
+        min_kg, max_kg = self.min_kg, self.max_kg
+        new = tuple.__new__
+
+        def parse(line: bytes, pos: int = 0, endpos: int = _END) -> Optional[WeightFrame]:
+            match = match_frame(line, pos, endpos)
+            if match is None:
+                return None
+            kind, value = match.groups()
+            weight = float(value)
+            return new(WeightFrame, (weight, None, not (min_kg <= weight <= max_kg),
+                                     kind[0] in b'Nn'))
+        return parse
+
+    def _build_st_gs(self):
+        match_frame = self.pattern.match
+        min_kg, max_kg = self.min_kg, self.max_kg
+        new = tuple.__new__
+
+        def parse(line: bytes, pos: int = 0, endpos: int = _END) -> Optional[WeightFrame]:
+            match = match_frame(line, pos, endpos)
+            if match is None:
+                return None
+            status, kind, value = match.groups()
+            weight = float(value)
+            status = status.upper()
+            if status == b'OL':
+                return new(WeightFrame, (weight, False, True, kind[0] in b'Nn'))
+            return new(WeightFrame, (weight, status == b'ST', not (min_kg <= weight <= max_kg),
+                                     kind[0] in b'Nn'))
+        return parse
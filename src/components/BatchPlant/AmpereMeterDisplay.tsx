@@ -3,8 +3,9 @@ import { useRaspberryPi } from '@/hooks/useRaspberryPi';
 import { useSlumpEstimation } from '@/hooks/useSlumpEstimation';
 
 export const AmpereMeterDisplay = () => {
-  const { ampereData, isConnected, productionMode } = useRaspberryPi();
-  const { estimatedSlump, slumpStatus } = useSlumpEstimation(ampereData.ampere);
+  const { ampereData, mixerAnalytics, isConnected, productionMode } = useRaspberryPi();
+  const plateauAmpere = mixerAnalytics?.batch?.active ? mixerAnalytics.batch.plateau_ampere : null;
+  const { estimatedSlump, slumpStatus, slumpSource } = useSlumpEstimation(ampereData.ampere, plateauAmpere);
 
   // Show "N/A" in simulation mode or when not connected
   const isDataAvailable = productionMode === 'production' && isConnected;
@@ -64,7 +65,9 @@ export const AmpereMeterDisplay = () => {
           <p className="text-3xl font-bold text-foreground tabular-nums">
             {isDataAvailable ? estimatedSlump : '--'}
           </p>
-          <p className="text-[9px] text-muted-foreground mt-0.5">cm</p>
+          <p className="text-[9px] text-muted-foreground mt-0.5">
+            cm{isDataAvailable && slumpSource === 'plateau' ? ' · plateau' : ''}
+          </p>
           
           {isDataAvailable && (
             <p className={`text-xs font-semibold mt-1 ${
@@ -1,5 +1,6 @@
 import { useState, useEffect, useRef } from 'react';
 import { useToast } from '@/hooks/use-toast';
+import type { ScaleMotion, WeighingJobRequest, WeighingProgress } from '@/hooks/useRaspberryPi';
 
 export interface ProductionConfig {
   selectedSilos: number[];
@@ -184,12 +185,27 @@ const initialComponentStates: ComponentStates = {
 // Helper function for delays
 const delay = (ms: number) => new Promise(resolve => setTimeout(resolve, ms));
 
+// Hopper settling: wait for the controller's steady flag, at most this long
+const STEADY_TIMEOUT_MS = 8000;
+// Motion flags lag the last gate pulse by up to one broadcast
+const STEADY_MIN_MS = 300;
+
 export const useProductionSequence = (
   onCementDeduction: (siloId: number, amount: number) => void,
   onAggregateDeduction: (binId: number, amount: number) => void,
   onWaterDeduction: (amount: number) => void,
   relaySettings: RelayConfig[],
-  raspberryPi?: { isConnected: boolean; actualWeights: any; sendRelayCommand: any; productionMode: 'production' | 'simulation' },
+  raspberryPi?: {
+    isConnected: boolean;
+    actualWeights: any;
+    sendRelayCommand: any;
+    productionMode: 'production' | 'simulation';
+    startWeighingJob?: (job: WeighingJobRequest) => Promise<WeighingProgress>;
+    startMixerBatch?: (batchId: string, info?: Record<string, unknown>) => void;
+    endMixerBatch?: () => void;
+    markWaterDosed?: () => void;
+    scaleMotion?: Record<string, ScaleMotion>;
+  },
   isAutoMode: boolean = false,
   onComplete?: (finalWeights?: { pasir: number; batu: number; semen: number; air: number; startTime?: string; endTime?: string }) => void,
   onAggregateBinsRefill?: () => void // ✅ NEW: Callback for refilling aggregate bins (System 3)
@@ -225,6 +241,11 @@ export const useProductionSequence = (
   const dischargeSeqIdRef = useRef(0);
   // ✅ Cumulative weights tracker across all mixings
   const cumulativeActualWeights = useRef({ pasir: 0, batu: 0, semen: 0, air: 0 });
+  // 🌀 Controller-side batch (mixer analytics + batch store) open for this production run
+  const mixerBatchIdRef = useRef<string | null>(null);
+  // Latest Raspberry Pi props for async sequences (motion updates arrive while they wait)
+  const raspberryPiRef = useRef(raspberryPi);
+  raspberryPiRef.current = raspberryPi;
   
   // Watchdog state untuk monitor stuck material
   const watchdogTimersRef = useRef<Record<string, NodeJS.Timeout | null>>({
@@ -577,8 +598,61 @@ export const useProductionSequence = (
     }
   };
 
+  // Scale(s) a material is weighed on (System 1: pasir + batu share one hopper)
+  const scalesForMaterial = (material: string): WeighingJobRequest['scales'] => {
+    if (systemConfig === 1 && ['pasir1', 'pasir2', 'batu1', 'batu2'].includes(material)) {
+      return ['pasir', 'batu'];
+    }
+    return [material.startsWith('pasir') ? 'pasir' : material.startsWith('batu') ? 'batu' : material as 'semen' | 'air'];
+  };
+
+  // Wait until the controller reports the scales steady; without motion data
+  // (simulation / disconnected) fall back to the fixed settle time
+  const waitForSteady = async (scales: string[], fallbackMs: number) => {
+    const pi = raspberryPiRef.current;
+    if (pi?.productionMode !== 'production' || !pi?.isConnected || !pi.scaleMotion) {
+      if (fallbackMs > 0) await delay(fallbackMs);
+      return;
+    }
+    const started = Date.now();
+    await delay(STEADY_MIN_MS);
+    while (Date.now() - started < STEADY_TIMEOUT_MS) {
+      const motion = raspberryPiRef.current?.scaleMotion;
+      if (motion && scales.every(scale => motion[scale]?.steady)) {
+        console.log(`⚖️ Scales steady (${scales.join(', ')}) after ${Date.now() - started}ms`);
+        return;
+      }
+      await delay(100);
+    }
+    console.warn(`⚠️ Scales ${scales.join(', ')} not steady after ${STEADY_TIMEOUT_MS}ms - continuing`);
+  };
+
+  // Controller batch lifecycle: one batch per production run (all mixings),
+  // so parallel weighings for the next mixing land on the same batch
+  const openControllerBatch = (config: ProductionConfig) => {
+    if (raspberryPi?.productionMode !== 'production' || !raspberryPi?.isConnected || !raspberryPi.startMixerBatch) {
+      return;
+    }
+    const batchId = `batch_${Date.now()}`;
+    mixerBatchIdRef.current = batchId;
+    raspberryPi.startMixerBatch(batchId, {
+      jumlah_mixing: config.jumlahMixing,
+      mixing_time: config.mixingTime,
+      target_weights: config.targetWeights,
+    });
+    console.log(`🌀 Controller batch ${batchId} started`);
+  };
+
+  const closeControllerBatch = () => {
+    if (!mixerBatchIdRef.current) return;
+    raspberryPi?.endMixerBatch?.();
+    console.log(`🌀 Controller batch ${mixerBatchIdRef.current} ended`);
+    mixerBatchIdRef.current = null;
+  };
+
   const stopProduction = () => {
     clearAllTimers();
+    closeControllerBatch();
     
     // Clear all watchdog timers
     Object.values(watchdogTimersRef.current).forEach(timer => {
@@ -646,6 +720,8 @@ export const useProductionSequence = (
     
     // ✅ CRITICAL: Set accurate production start timestamp
     setProductionStartTimestamp(new Date());
+    closeControllerBatch();
+    openControllerBatch(config);
     const now = new Date();
     const timeStr = now.toLocaleTimeString('id-ID', { 
       hour: '2-digit', 
@@ -762,7 +838,7 @@ export const useProductionSequence = (
           await weighMaterialWithJogging('pasir1', config.targetWeights.pasir1, config, weighingStatus, 0);
           weighingStatus.pasir1 = true;
           cumulativeWeight += config.targetWeights.pasir1;
-          await delay(2000); // Stabilization
+          await waitForSteady(['pasir', 'batu'], 2000); // Stabilization (shared hopper)
         } else {
           weighingStatus.pasir1 = true;
         }
@@ -773,7 +849,7 @@ export const useProductionSequence = (
           await weighMaterialWithJogging('pasir2', config.targetWeights.pasir2, config, weighingStatus, cumulativeWeight);
           weighingStatus.pasir2 = true;
           cumulativeWeight += config.targetWeights.pasir2;
-          await delay(2000); // Stabilization
+          await waitForSteady(['pasir', 'batu'], 2000); // Stabilization (shared hopper)
         } else {
           weighingStatus.pasir2 = true;
         }
@@ -784,7 +860,7 @@ export const useProductionSequence = (
           await weighMaterialWithJogging('batu1', config.targetWeights.batu1, config, weighingStatus, cumulativeWeight);
           weighingStatus.batu1 = true;
           cumulativeWeight += config.targetWeights.batu1;
-          await delay(2000); // Stabilization
+          await waitForSteady(['pasir', 'batu'], 2000); // Stabilization (shared hopper)
         } else {
           weighingStatus.batu1 = true;
         }
@@ -808,10 +884,10 @@ export const useProductionSequence = (
           await weighMaterialWithJogging('pasir1', config.targetWeights.pasir1, config, weighingStatus, 0);
           weighingStatus.pasir1 = true;
           
-          // ⏱️ JEDA 2 DETIK untuk stabilisasi hopper pasir
+          // ⏱️ Tunggu hopper pasir stabil (fallback: jeda 2 detik)
           if (config.targetWeights.pasir2 > 0 && config.selectedBins.pasir2 > 0) {
-            console.log('⏳ Waiting 2 seconds for hopper stabilization...');
-            await delay(2000);
+            console.log('⏳ Waiting for hopper stabilization...');
+            await waitForSteady(['pasir'], 2000);
           }
         } else {
           weighingStatus.pasir1 = true;
@@ -865,10 +941,10 @@ export const useProductionSequence = (
           await weighMaterialWithJogging('batu1', config.targetWeights.batu1, config, weighingStatus, 0);
           weighingStatus.batu1 = true;
           
-          // ⏱️ JEDA 2 DETIK untuk stabilisasi hopper batu
+          // ⏱️ Tunggu hopper batu stabil (fallback: jeda 2 detik)
           if (config.targetWeights.batu2 > 0 && config.selectedBins.batu2 > 0) {
-            console.log('⏳ Waiting 2 seconds for hopper stabilization...');
-            await delay(2000);
+            console.log('⏳ Waiting for hopper stabilization...');
+            await waitForSteady(['batu'], 2000);
           }
         } else {
           weighingStatus.batu1 = true;
@@ -927,6 +1003,17 @@ export const useProductionSequence = (
       weighAir()
     ]);
 
+    // Final weights are accepted (and dump gates opened) only once the hoppers settled
+    const weighedScales = Array.from(new Set(
+      (['pasir1', 'pasir2', 'batu1', 'batu2', 'semen', 'air'] as const)
+        .filter(material => config.targetWeights[material] > 0)
+        .filter(material => systemConfig !== 3 || material === 'semen' || material === 'air')
+        .flatMap(material => scalesForMaterial(material))
+    ));
+    if (weighedScales.length > 0) {
+      await waitForSteady(weighedScales, 0);
+    }
+
     console.log('✅ All parallel weighing complete');
     
     // Turn off weighing relays
@@ -1032,6 +1119,190 @@ export const useProductionSequence = (
       let joggingCycleStart = 0;
       let simulatedWeight = adjustedStarting; // Use adjusted starting weight
 
+      // Update weight display and hopper fill level (cumulative for aggregates)
+      const updateWeightDisplay = (currentWeight: number) => {
+        if (material === 'pasir1' || material === 'pasir2') {
+          const percentage = Math.min(100, (currentWeight / (config.targetWeights.pasir1 + config.targetWeights.pasir2)) * 100);
+          setProductionState(prev => {
+            const aggTargetTotal = (config.targetWeights.pasir1 + config.targetWeights.pasir2) + (config.targetWeights.batu1 + config.targetWeights.batu2);
+            const aggWeightNow = currentWeight + (prev.currentWeights.batu || 0);
+            const aggPercentage = aggTargetTotal > 0 ? Math.min(100, (aggWeightNow / aggTargetTotal) * 100) : 0;
+            return ({
+              ...prev,
+              currentWeights: { 
+                ...prev.currentWeights, 
+                pasir: currentWeight,
+                // System 1: Update aggregate as SUM of pasir + batu for accurate display
+                ...(systemConfig === 1 ? { aggregate: aggWeightNow } : {})
+              },
+              hopperFillLevels: { 
+                ...prev.hopperFillLevels, 
+                pasir: percentage,
+                // System 1: Update aggregate hopper fill level as combined percentage
+                ...(systemConfig === 1 ? { aggregate: aggPercentage } : {})
+              },
+            });
+          });
+          // System 1: Set aggregate weighing indicator
+          if (systemConfig === 1) {
+            setComponentStates(prev => ({ ...prev, isAggregateWeighing: true }));
+          }
+        } else if (material === 'batu1' || material === 'batu2') {
+          setProductionState(prev => {
+            // In System 1, load cell reading for batu is cumulative (pasir + batu)
+            // We must derive batu-only cumulative by subtracting pasir total
+            const pasirCum = prev.currentWeights.pasir || 0;
+            const batuCumNow = systemConfig === 1 
+              ? Math.max(0, currentWeight - pasirCum) 
+              : currentWeight;
+
+            const batuTargetTotal = (config.targetWeights.batu1 + config.targetWeights.batu2);
+            const percentage = batuTargetTotal > 0 
+              ? Math.min(100, (batuCumNow / batuTargetTotal) * 100) 
+              : 0;
+
+            const aggTargetTotal = (config.targetWeights.pasir1 + config.targetWeights.pasir2) + (config.targetWeights.batu1 + config.targetWeights.batu2);
+            const aggWeightNow = batuCumNow + pasirCum;
+            const aggPercentage = aggTargetTotal > 0 
+              ? Math.min(100, (aggWeightNow / aggTargetTotal) * 100) 
+              : 0;
+
+            return ({
+              ...prev,
+              currentWeights: { 
+                ...prev.currentWeights, 
+                batu: batuCumNow,
+                // System 1: Update aggregate as SUM of pasir + batu for accurate display
+                ...(systemConfig === 1 ? { aggregate: aggWeightNow } : {})
+              },
+              hopperFillLevels: { 
+                ...prev.hopperFillLevels, 
+                batu: percentage,
+                // System 1: Update aggregate hopper fill level as combined percentage
+                ...(systemConfig === 1 ? { aggregate: aggPercentage } : {})
+              },
+            });
+          });
+          // System 1: Set aggregate weighing indicator
+          if (systemConfig === 1) {
+            setComponentStates(prev => ({ ...prev, isAggregateWeighing: true }));
+          }
+        } else {
+          // ✅ FIX: Update fill level for both semen and air
+          const percentage = Math.min(100, (currentWeight / targetWeight) * 100);
+          setProductionState(prev => ({
+            ...prev,
+            currentWeights: { ...prev.currentWeights, [material]: currentWeight },
+            hopperFillLevels: {
+              ...prev.hopperFillLevels,
+              ...(material === 'air' ? { air: percentage } : {}),
+              ...(material === 'semen' ? { semen: percentage } : {})
+            }
+          }));
+        }
+      };
+
+      // ✅ PRODUCTION MODE: The controller runs the trigger/jogging/cut-off loop next to
+      // the scale reader (weigh_material job); the browser only follows the result
+      if (raspberryPi?.productionMode === 'production' && raspberryPi?.isConnected && raspberryPi.startWeighingJob) {
+        const gateRelays = material === 'semen'
+          ? config.selectedSilos.map(siloId => `silo_${siloId}`)
+          : material === 'air'
+            ? ['water_tank_valve']
+            : [getAggregateRelayName(material, config.selectedBins[material])].filter((name): name is string => !!name);
+        const valveStates: Partial<Record<typeof material, keyof ComponentStates>> = {
+          pasir1: 'sandBin1Valve',
+          pasir2: 'sandBin2Valve',
+          batu1: 'stoneBin1Valve',
+          batu2: 'stoneBin2Valve',
+          air: 'waterTankValve',
+        };
+        const valveState = valveStates[material];
+        const scales = scalesForMaterial(material);
+
+        // Same relay → Modbus coil lookup as controlRelay; unmapped names go by relay name
+        const relays: string[] = [];
+        const coils: number[] = [];
+        gateRelays.forEach(relayName => {
+          const relay = relaySettings.find(r => r.name.toLowerCase().replace(/ /g, '_') === relayName.toLowerCase());
+          const modbusCoil = relay ? parseInt(relay.modbusCoil) : NaN;
+          if (Number.isNaN(modbusCoil)) {
+            relays.push(relayName);
+          } else {
+            coils.push(modbusCoil);
+          }
+        });
+
+        // System 3: Start horizontal conveyor 5 seconds BEFORE dumping
+        if (systemConfig === 3 && scales[0] !== 'semen' && scales[0] !== 'air') {
+          setComponentStates(prev => ({ ...prev, beltBawah: true }));
+          controlRelay('belt_bawah', true);
+          addActivityLog('🟢 Belt Bawah ON (pre-dump)');
+          await delay(5000);
+        }
+
+        if (valveState) {
+          setComponentStates(prev => ({ ...prev, [valveState]: true }));
+        }
+        addActivityLog(`🟢 ${material} weighing started on controller`);
+
+        const displayInterval = setInterval(() => {
+          updateWeightDisplay(scales.reduce((sum, scale) => sum + (raspberryPi.actualWeights[scale] || 0), 0));
+        }, 200);
+        addInterval(displayInterval);
+
+        try {
+          const result = await raspberryPi.startWeighingJob({
+            material,
+            scales,
+            relays,
+            coils,
+            target: adjustedTarget,
+            trigger: jogging.trigger,
+            jog_on: jogging.jogingOn,
+            jog_off: jogging.jogingOff,
+            tolerance: jogging.toleransi,
+          });
+          updateWeightDisplay(result.weight);
+
+          if (result.phase === 'complete' || result.phase === 'stalled') {
+            // Stalled = watchdog forced completion, as the browser loop did before
+            weighingStatus[material] = true;
+            setProductionState(prev => ({
+              ...prev,
+              weighingComplete: { ...prev.weighingComplete, [material]: true }
+            }));
+            addActivityLog(`✅ ${material} weighing ${result.phase}: ${result.weight.toFixed(1)}kg`);
+          } else {
+            addActivityLog(`⚠️ ${material} weighing ${result.phase}: ${result.weight.toFixed(1)}kg`);
+          }
+          console.log(`✅ ${material} weighing ${result.phase} on controller: ${result.weight.toFixed(1)}kg (close latency ${result.close_latency_ms ?? '-'}ms)`);
+        } catch (error) {
+          console.error(`❌ ${material} weighing job failed:`, error);
+          addActivityLog(`❌ ${material} weighing failed`);
+        } finally {
+          clearInterval(displayInterval);
+          if (valveState) {
+            setComponentStates(prev => ({ ...prev, [valveState]: false }));
+          }
+          if (material === 'semen') {
+            setComponentStates(prev => ({ ...prev, siloValves: prev.siloValves.map(() => false) }));
+          }
+        }
+
+        // System 3: Stop horizontal conveyor 5 seconds AFTER closing storage bin gate
+        if (systemConfig === 3 && scales[0] !== 'semen' && scales[0] !== 'air') {
+          setTimeout(() => {
+            setComponentStates(prev => ({ ...prev, beltBawah: false }));
+            controlRelay('belt_bawah', false);
+            addActivityLog('🔴 Belt Bawah OFF (post-dump)');
+          }, 5000);
+        }
+
+        resolve();
+        return;
+      }
+
       // Open material relay
       if (material === 'pasir1') {
         const binId = config.selectedBins.pasir1;
@@ -1268,86 +1539,7 @@ export const useProductionSequence = (
           }
         }
 
-        // Update weight display and hopper fill level (cumulative for aggregates)
-        if (material === 'pasir1' || material === 'pasir2') {
-          const percentage = Math.min(100, (currentWeight / (config.targetWeights.pasir1 + config.targetWeights.pasir2)) * 100);
-          setProductionState(prev => {
-            const aggTargetTotal = (config.targetWeights.pasir1 + config.targetWeights.pasir2) + (config.targetWeights.batu1 + config.targetWeights.batu2);
-            const aggWeightNow = currentWeight + (prev.currentWeights.batu || 0);
-            const aggPercentage = aggTargetTotal > 0 ? Math.min(100, (aggWeightNow / aggTargetTotal) * 100) : 0;
-            return ({
-              ...prev,
-              currentWeights: { 
-                ...prev.currentWeights, 
-                pasir: currentWeight,
-                // System 1: Update aggregate as SUM of pasir + batu for accurate display
-                ...(systemConfig === 1 ? { aggregate: aggWeightNow } : {})
-              },
-              hopperFillLevels: { 
-                ...prev.hopperFillLevels, 
-                pasir: percentage,
-                // System 1: Update aggregate hopper fill level as combined percentage
-                ...(systemConfig === 1 ? { aggregate: aggPercentage } : {})
-              },
-            });
-          });
-          // System 1: Set aggregate weighing indicator
-          if (systemConfig === 1) {
-            setComponentStates(prev => ({ ...prev, isAggregateWeighing: true }));
-          }
-        } else if (material === 'batu1' || material === 'batu2') {
-          setProductionState(prev => {
-            // In System 1, load cell reading for batu is cumulative (pasir + batu)
-            // We must derive batu-only cumulative by subtracting pasir total
-            const pasirCum = prev.currentWeights.pasir || 0;
-            const batuCumNow = systemConfig === 1 
-              ? Math.max(0, currentWeight - pasirCum) 
-              : currentWeight;
-
-            const batuTargetTotal = (config.targetWeights.batu1 + config.targetWeights.batu2);
-            const percentage = batuTargetTotal > 0 
-              ? Math.min(100, (batuCumNow / batuTargetTotal) * 100) 
-              : 0;
-
-            const aggTargetTotal = (config.targetWeights.pasir1 + config.targetWeights.pasir2) + (config.targetWeights.batu1 + config.targetWeights.batu2);
-            const aggWeightNow = batuCumNow + pasirCum;
-            const aggPercentage = aggTargetTotal > 0 
-              ? Math.min(100, (aggWeightNow / aggTargetTotal) * 100) 
-              : 0;
-
-            return ({
-              ...prev,
-              currentWeights: { 
-                ...prev.currentWeights, 
-                batu: batuCumNow,
-                // System 1: Update aggregate as SUM of pasir + batu for accurate display
-                ...(systemConfig === 1 ? { aggregate: aggWeightNow } : {})
-              },
-              hopperFillLevels: { 
-                ...prev.hopperFillLevels, 
-                batu: percentage,
-                // System 1: Update aggregate hopper fill level as combined percentage
-                ...(systemConfig === 1 ? { aggregate: aggPercentage } : {})
-              },
-            });
-          });
-          // System 1: Set aggregate weighing indicator
-          if (systemConfig === 1) {
-            setComponentStates(prev => ({ ...prev, isAggregateWeighing: true }));
-          }
-        } else {
-          // ✅ FIX: Update fill level for both semen and air
-          const percentage = Math.min(100, (currentWeight / targetWeight) * 100);
-          setProductionState(prev => ({
-            ...prev,
-            currentWeights: { ...prev.currentWeights, [material]: currentWeight },
-            hopperFillLevels: {
-              ...prev.hopperFillLevels,
-              ...(material === 'air' ? { air: percentage } : {}),
-              ...(material === 'semen' ? { semen: percentage } : {})
-            }
-          }));
-        }
+        updateWeightDisplay(currentWeight);
 
         // Phase 1: Normal weighing
         if (phase === 1 && currentWeight >= triggerWeight) {
@@ -2759,6 +2951,11 @@ export const useProductionSequence = (
         
         // Deduct water from tank AFTER discharge complete
         onWaterDeduction(targetWeight);
+
+        // Water is in the mixer: start the time-to-plateau measurement
+        if (mixerBatchIdRef.current) {
+          raspberryPi?.markWaterDosed?.();
+        }
         
         // 🔓 Clear per-material guard
         dischargeGuardsRef.current['air'] = false;
@@ -3307,6 +3504,7 @@ export const useProductionSequence = (
         console.log(`🏁 Production END TIME: ${timeStr}`);
         
         addActivityLog('🎉 Production complete!');
+        closeControllerBatch();
         
         // 📝 SAVE PRODUCTION RECORD TO DATABASE
         try {
@@ -1,5 +1,6 @@
 import { useState, useEffect, useRef, useCallback } from 'react';
 import { useToast } from '@/hooks/use-toast';
+import { decodeTelemetryFrame, TELEMETRY_SUBPROTOCOL } from '@/lib/telemetryCodec';
 
 interface ActualWeights {
   pasir: number;
@@ -18,7 +19,23 @@ interface RelayCommand {
 interface WeightUpdateMessage {
   type: 'weight_update';
   timestamp: number;
-  weights: ActualWeights;
+  seq?: number;
+  keyframe?: boolean;
+  // Keyframes carry every scale; delta frames only the scales that moved
+  weights: Partial<ActualWeights>;
+}
+
+// Per scale, computed on the controller from the filtered weight stream
+export interface ScaleMotion {
+  steady: boolean;     // Std dev over the motion window below the threshold
+  flow_kg_s: number;   // + filling, - discharging
+  std_kg: number | null;
+}
+
+interface ScaleMotionMessage {
+  type: 'scale_motion';
+  timestamp: number;
+  scales: Record<string, ScaleMotion>;
 }
 
 interface PhysicalButtonUpdateMessage {
@@ -26,19 +43,123 @@ interface PhysicalButtonUpdateMessage {
   relay: string;
   state: boolean;
   timestamp: number;
+  // Action the controller already executed for this button (coils are switched server-side)
+  action?: 'notify' | 'emergency_stop' | 'momentary' | 'toggle';
+  panel?: string;
+}
+
+export interface MixerBatchStats {
+  batch_id: string;
+  active: boolean;
+  duration_s: number;
+  samples: number;
+  batch_mean: number;
+  batch_peak: number;
+  energy_kwh: number;
+  water_dosed: boolean;
+  time_to_plateau_s: number | null;
+  plateau_ampere: number | null;
 }
 
+export interface MixerAnalytics {
+  ampere: number;
+  rolling_mean: number;
+  rolling_peak: number;
+  window_s: number;
+  overload: boolean;
+  batch: MixerBatchStats | null;
+}
+
+// Until the first full snapshot (binary clients get batch stats separately)
+const EMPTY_MIXER_ANALYTICS: MixerAnalytics = {
+  ampere: 0,
+  rolling_mean: 0,
+  rolling_peak: 0,
+  window_s: 0,
+  overload: false,
+  batch: null,
+};
+
 interface AmpereUpdateMessage {
   type: 'ampere_update';
   timestamp: number;
+  analytics?: MixerAnalytics;
+  // Binary frames carry only the rolling statistics and the overload flag
+  rolling?: { rolling_mean: number; rolling_peak: number; overload: boolean };
   data: {
     voltage: number;
     ampere: number;
     power: number;
+    energy?: number;        // Wh
+    frequency?: number;     // Hz
+    power_factor?: number;
+    alarm?: boolean;
+    online?: boolean;
   };
 }
 
-export const useRaspberryPi = () => {
+interface RelayStatusMessage {
+  type: 'status' | 'relay_update';
+  relays: Record<string, boolean>;
+  timestamp?: number;
+  age_ms?: number | null;
+}
+
+export interface WeighingJobRequest {
+  job_id?: string;
+  material: string;
+  scales: Array<keyof ActualWeights>;
+  relays?: string[];
+  coils?: number[];
+  target: number;
+  relative?: boolean;
+  trigger?: number;
+  jog_on?: number;
+  jog_off?: number;
+  tolerance?: number;
+}
+
+export interface WeighingProgress {
+  job_id: string;
+  material: string;
+  phase: 'filling' | 'jogging' | 'complete' | 'stalled' | 'cancelled';
+  weight: number;
+  target: number;
+  trigger_weight: number;
+  final_weight: number;
+  gate_open: boolean;
+  duration_s?: number;
+  close_latency_ms?: number | null;
+}
+
+interface WeighingEventMessage extends WeighingProgress {
+  type: 'weighing_phase' | 'weighing_progress' | 'weighing_complete';
+  timestamp: number;
+}
+
+interface WeighAckMessage {
+  type: 'weigh_ack';
+  job_id: string;
+  success: boolean;
+  error?: string;
+}
+
+export type TelemetryTopic = 'weights' | 'motion' | 'ampere' | 'relays' | 'buttons' | 'alarms' | 'weighing';
+
+export interface TelemetrySubscription {
+  topics: TelemetryTopic[];
+  // One rate for weights/ampere, or per stream topic; omit for full rate
+  maxRateHz?: number | Partial<Record<'weights' | 'motion' | 'ampere', number>>;
+}
+
+interface PendingWeighingJob {
+  resolve: (result: WeighingProgress) => void;
+  reject: (error: Error) => void;
+}
+
+// subscription: topics/rate for passive views (e.g. office dashboards at 1 Hz);
+// omit to receive everything at the controller's full rate
+export const useRaspberryPi = (subscription?: TelemetrySubscription) => {
   const [isConnected, setIsConnected] = useState(false);
   const [actualWeights, setActualWeights] = useState<ActualWeights>({
     pasir: 0,
@@ -47,6 +168,8 @@ export const useRaspberryPi = () => {
     air: 0,
   });
   const [lastWeightUpdate, setLastWeightUpdate] = useState<number>(0);
+  // Steady flag and flow rate per scale (end a stage as soon as the scale settles)
+  const [scaleMotion, setScaleMotion] = useState<Record<string, ScaleMotion>>({});
   const [currentWsUrl, setCurrentWsUrl] = useState<string>('');
   
   // Physical button states from ESP32
@@ -57,17 +180,36 @@ export const useRaspberryPi = () => {
     voltage: 0,
     ampere: 0,
     power: 0,
+    energy: 0,
+    frequency: 0,
+    power_factor: 0,
+    alarm: false,
+    online: false,
     lastUpdate: 0,
   });
   
+  // Mixer load-curve analytics computed on the controller
+  const [mixerAnalytics, setMixerAnalytics] = useState<MixerAnalytics | null>(null);
+  
   // Production mode: "production" or "simulation" (default)
   const [productionMode, setProductionModeState] = useState<'production' | 'simulation'>(() => {
     const saved = localStorage.getItem('production_mode');
     return (saved === 'production' || saved === 'simulation') ? saved : 'simulation';
   });
   
+  // Relay states read back from the ARM/ARX modules (full on connect, then deltas)
+  const [relayStates, setRelayStates] = useState<Record<string, boolean>>({});
+  
+  // Closed-loop weighing jobs executed on the controller
+  const [weighingJobs, setWeighingJobs] = useState<Record<string, WeighingProgress>>({});
+  const pendingJobsRef = useRef<Map<string, PendingWeighingJob>>(new Map());
+  
   const wsRef = useRef<WebSocket | null>(null);
+  const lastWeightSeqRef = useRef<number | null>(null);
+  const telemetryScalesRef = useRef<string[]>([]);
+  const subscriptionRef = useRef<TelemetrySubscription | undefined>(subscription);
   const reconnectTimeoutRef = useRef<NodeJS.Timeout | null>(null);
+  const heartbeatIntervalRef = useRef<NodeJS.Timeout | null>(null);
   const { toast } = useToast();
   
   // Update localStorage when production mode changes
@@ -94,11 +236,36 @@ export const useRaspberryPi = () => {
       
       setCurrentWsUrl(wsUrl);
       console.log('Connecting to Autonics controller at:', wsUrl);
-      const ws = new WebSocket(wsUrl);
+      // Opt-in compact binary telemetry (weights/ampere); JSON otherwise
+      const useBinary = localStorage.getItem('controller_binary_telemetry') === 'true';
+      const ws = useBinary ? new WebSocket(wsUrl, [TELEMETRY_SUBPROTOCOL]) : new WebSocket(wsUrl);
+      ws.binaryType = 'arraybuffer';
 
       ws.onopen = () => {
         console.log('✅ Connected to Autonics controller');
         setIsConnected(true);
+        lastWeightSeqRef.current = null;
+        if (subscriptionRef.current) {
+          ws.send(JSON.stringify({
+            type: 'subscribe',
+            topics: subscriptionRef.current.topics,
+            max_rate_hz: subscriptionRef.current.maxRateHz,
+          }));
+        }
+        ws.send(JSON.stringify({ type: 'get_status' }));
+        if (useBinary) {
+          // Binary ampere frames carry no batch stats: start from a full snapshot
+          ws.send(JSON.stringify({ type: 'get_mixer_analytics' }));
+        }
+        // Controller safety watchdog turns all relays OFF if the HMI goes silent;
+        // passive views (with a subscription) must not keep it fed
+        if (!subscriptionRef.current) {
+          heartbeatIntervalRef.current = setInterval(() => {
+            if (ws.readyState === WebSocket.OPEN) {
+              ws.send(JSON.stringify({ type: 'heartbeat' }));
+            }
+          }, 1000);
+        }
         toast({
           title: "Controller Connected",
           description: "Real-time weight data aktif (Autonics ARM/ARX)",
@@ -107,12 +274,32 @@ export const useRaspberryPi = () => {
 
       ws.onmessage = (event) => {
         try {
-          const data = JSON.parse(event.data);
+          const data = typeof event.data === 'string'
+            ? JSON.parse(event.data)
+            : decodeTelemetryFrame(event.data, telemetryScalesRef.current);
+          if (!data) return;
           
-          if (data.type === 'weight_update') {
+          if (data.type === 'telemetry_index') {
+            // Scale order for binary weight frames, sent once after connect
+            telemetryScalesRef.current = data.scales;
+          } else if (data.type === 'weight_update') {
             const msg = data as WeightUpdateMessage;
-            setActualWeights(msg.weights);
+            if (msg.seq !== undefined && !msg.keyframe) {
+              const lastSeq = lastWeightSeqRef.current;
+              if (lastSeq === null || msg.seq !== lastSeq + 1) {
+                // Missed a delta frame: values may be stale until a keyframe arrives
+                console.warn(`⚠️ Weight update gap (seq ${lastSeq} → ${msg.seq}), requesting keyframe`);
+                ws.send(JSON.stringify({ type: 'request_keyframe' }));
+              }
+            }
+            if (msg.seq !== undefined) {
+              lastWeightSeqRef.current = msg.seq;
+            }
+            setActualWeights(prev => ({ ...prev, ...msg.weights }));
             setLastWeightUpdate(Date.now());
+          } else if (data.type === 'scale_motion') {
+            const msg = data as ScaleMotionMessage;
+            setScaleMotion(msg.scales);
           } else if (data.type === 'physical_button_update') {
             // Handle physical button state from ESP32
             const msg = data as PhysicalButtonUpdateMessage;
@@ -130,6 +317,39 @@ export const useRaspberryPi = () => {
                 [msg.relay]: false,
               }));
             }, 3000);
+          } else if (data.type === 'status') {
+            const msg = data as RelayStatusMessage;
+            setRelayStates(msg.relays);
+          } else if (data.type === 'relay_update') {
+            // Only the coils whose hardware state changed
+            const msg = data as RelayStatusMessage;
+            setRelayStates(prev => ({ ...prev, ...msg.relays }));
+          } else if (data.type === 'emergency_stop') {
+            // Emergency stop executed on the controller (e.g. physical panel button)
+            console.error(`🚨 Emergency stop from ${data.source}: ${data.button ?? ''}`);
+            toast({
+              title: "EMERGENCY STOP",
+              description: "Semua relay dimatikan oleh tombol fisik",
+              variant: "destructive",
+            });
+          } else if (data.type === 'panel_stale') {
+            // Button panel missed its heartbeats; its held buttons were released
+            console.error(`🚨 Button panel ${data.panel} silent for ${data.silent_s}s`);
+            toast({
+              title: "Panel Tombol Terputus",
+              description: `Panel ${data.panel} tidak merespon ${data.silent_s} detik, tombol dilepas`,
+              variant: "destructive",
+            });
+          } else if (data.type === 'safety_trip') {
+            // Safety supervisor acted on the controller (watchdog, door timeout, weight spike)
+            console.error(`🚨 Safety trip: ${data.reason} (${data.reaction_ms}ms)`, data);
+            toast({
+              title: "Safety Trip",
+              description: `${data.reason}${data.relay ? `: ${data.relay}` : data.scale ? `: ${data.scale}` : ''}`,
+              variant: "destructive",
+            });
+          } else if (data.type === 'panel_recovered') {
+            console.log(`✅ Button panel ${data.panel} back online after ${data.offline_s}s`);
           } else if (data.type === 'ampere_update') {
             // Handle ampere meter data from PZEM-016
             const msg = data as AmpereUpdateMessage;
@@ -137,6 +357,58 @@ export const useRaspberryPi = () => {
               ...msg.data,
               lastUpdate: Date.now(),
             });
+            if (msg.analytics) {
+              setMixerAnalytics(msg.analytics);
+            } else if (msg.rolling) {
+              const rolling = msg.rolling;
+              setMixerAnalytics(prev => ({ ...(prev ?? EMPTY_MIXER_ANALYTICS), ...rolling, ampere: msg.data.ampere }));
+            }
+          } else if (data.type === 'mixer_analytics') {
+            // Full snapshot, broadcast on batch start/end and water dosing
+            const { type, ...snapshot } = data;
+            setMixerAnalytics(snapshot as MixerAnalytics);
+          } else if (data.type === 'mixer_overload') {
+            // Raised by the controller at sample time, ahead of the next ampere_update
+            console.error(`🚨 Mixer overload: ${data.ampere}A (limit ${data.limit}A)`);
+            setMixerAnalytics(prev => ({ ...(prev ?? EMPTY_MIXER_ANALYTICS), overload: true }));
+            toast({
+              title: "Mixer Overload",
+              description: `Arus mixer ${Number(data.ampere).toFixed(1)}A melebihi batas ${data.limit}A`,
+              variant: "destructive",
+            });
+          } else if (data.type === 'mixer_overload_cleared') {
+            setMixerAnalytics(prev => ({ ...(prev ?? EMPTY_MIXER_ANALYTICS), overload: false }));
+          } else if (data.type === 'mixer_plateau' || data.type === 'batch_started' || data.type === 'batch_summary') {
+            const batch: MixerBatchStats | null = data.type === 'mixer_plateau' ? data : data.batch;
+            if (batch) {
+              setMixerAnalytics(prev => ({ ...(prev ?? EMPTY_MIXER_ANALYTICS), batch }));
+            }
+          } else if (
+            data.type === 'weighing_phase' ||
+            data.type === 'weighing_progress' ||
+            data.type === 'weighing_complete'
+          ) {
+            const { type, timestamp, ...progress } = data as WeighingEventMessage;
+            setWeighingJobs(prev => ({ ...prev, [progress.job_id]: progress }));
+            
+            if (type === 'weighing_complete') {
+              console.log(`⚖️ Weighing ${progress.material} ${progress.phase}: ${progress.weight.toFixed(1)}kg (gate close ${progress.close_latency_ms ?? '-'}ms)`);
+              const pending = pendingJobsRef.current.get(progress.job_id);
+              if (pending) {
+                pendingJobsRef.current.delete(progress.job_id);
+                pending.resolve(progress);
+              }
+            }
+          } else if (data.type === 'weigh_ack') {
+            const msg = data as WeighAckMessage;
+            if (!msg.success) {
+              console.error(`❌ Weighing job ${msg.job_id} rejected: ${msg.error}`);
+              const pending = pendingJobsRef.current.get(msg.job_id);
+              if (pending) {
+                pendingJobsRef.current.delete(msg.job_id);
+                pending.reject(new Error(msg.error || 'Weighing job rejected'));
+              }
+            }
           } else if (data.type === 'error') {
             console.error('Raspberry Pi error:', data.message);
           }
@@ -154,6 +426,14 @@ export const useRaspberryPi = () => {
         console.log('❌ Disconnected from Autonics controller');
         setIsConnected(false);
         wsRef.current = null;
+        if (heartbeatIntervalRef.current) {
+          clearInterval(heartbeatIntervalRef.current);
+          heartbeatIntervalRef.current = null;
+        }
+        
+        // Jobs keep running on the controller, but we can no longer track them
+        pendingJobsRef.current.forEach(pending => pending.reject(new Error('Controller disconnected')));
+        pendingJobsRef.current.clear();
 
         // Auto-reconnect after 5 seconds
         reconnectTimeoutRef.current = setTimeout(() => {
@@ -191,11 +471,62 @@ export const useRaspberryPi = () => {
     }
   }, [productionMode]);
 
+  // Start a closed-loop weighing job on the controller; resolves when the job finishes
+  const startWeighingJob = useCallback((job: WeighingJobRequest): Promise<WeighingProgress> => {
+    if (!wsRef.current || wsRef.current.readyState !== WebSocket.OPEN) {
+      return Promise.reject(new Error('Controller not connected'));
+    }
+    
+    const jobId = job.job_id || `${job.material}-${Date.now()}`;
+    return new Promise<WeighingProgress>((resolve, reject) => {
+      pendingJobsRef.current.set(jobId, { resolve, reject });
+      wsRef.current!.send(JSON.stringify({ type: 'weigh_material', ...job, job_id: jobId }));
+      console.log(`📤 Weighing job sent: ${job.material} → ${job.target}kg (${jobId})`);
+    });
+  }, []);
+
+  const cancelWeighingJob = useCallback((jobId: string) => {
+    if (wsRef.current && wsRef.current.readyState === WebSocket.OPEN) {
+      wsRef.current.send(JSON.stringify({ type: 'weigh_cancel', job_id: jobId }));
+    }
+  }, []);
+
+  // Mixer batch lifecycle for the controller-side load-curve analytics
+  const sendMixerMessage = useCallback((message: Record<string, unknown>) => {
+    if (wsRef.current && wsRef.current.readyState === WebSocket.OPEN) {
+      wsRef.current.send(JSON.stringify(message));
+    }
+  }, []);
+
+  const startMixerBatch = useCallback((batchId: string, info?: Record<string, unknown>) => {
+    sendMixerMessage({ ...info, type: 'batch_start', batch_id: batchId });
+  }, [sendMixerMessage]);
+
+  const endMixerBatch = useCallback(() => {
+    sendMixerMessage({ type: 'batch_end' });
+  }, [sendMixerMessage]);
+
+  const markWaterDosed = useCallback(() => {
+    sendMixerMessage({ type: 'mixer_water_dosed' });
+  }, [sendMixerMessage]);
+
+  // Change topics/rate on the live connection (also used on every reconnect)
+  const subscribe = useCallback((next: TelemetrySubscription) => {
+    subscriptionRef.current = next;
+    if (wsRef.current && wsRef.current.readyState === WebSocket.OPEN) {
+      wsRef.current.send(JSON.stringify({ type: 'subscribe', topics: next.topics, max_rate_hz: next.maxRateHz }));
+    }
+  }, []);
+
   const disconnect = useCallback(() => {
     if (reconnectTimeoutRef.current) {
       clearTimeout(reconnectTimeoutRef.current);
       reconnectTimeoutRef.current = null;
     }
+    if (heartbeatIntervalRef.current) {
+      clearInterval(heartbeatIntervalRef.current);
+      heartbeatIntervalRef.current = null;
+    }
     if (wsRef.current) {
       wsRef.current.close();
       wsRef.current = null;
@@ -225,10 +556,20 @@ export const useRaspberryPi = () => {
     disconnect,
     reconnect: connect,
     lastWeightUpdate,
+    scaleMotion,
     currentWsUrl,
     productionMode,
     setProductionMode,
     physicalButtonStates,
     ampereData,
+    mixerAnalytics,
+    startMixerBatch,
+    endMixerBatch,
+    markWaterDosed,
+    relayStates,
+    subscribe,
+    weighingJobs,
+    startWeighingJob,
+    cancelWeighingJob,
   };
 };
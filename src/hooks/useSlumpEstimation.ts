@@ -21,7 +21,9 @@ export interface SlumpStatus {
   icon: string;
 }
 
-export const useSlumpEstimation = (currentAmpere: number) => {
+// plateauAmpere: mixer current at the post-water-dosing plateau (from the
+// controller's mixer analytics); preferred over the live reading when known
+export const useSlumpEstimation = (currentAmpere: number, plateauAmpere?: number | null) => {
   const [calibrationTable, setCalibrationTable] = useState<CalibrationPoint[]>(() => {
     const saved = localStorage.getItem('slump_calibration');
     return saved ? JSON.parse(saved) : DEFAULT_CALIBRATION;
@@ -53,7 +55,8 @@ export const useSlumpEstimation = (currentAmpere: number) => {
     return 0;
   };
 
-  const estimatedSlump = estimateSlump(currentAmpere);
+  const slumpSource: 'plateau' | 'live' = plateauAmpere != null ? 'plateau' : 'live';
+  const estimatedSlump = estimateSlump(plateauAmpere ?? currentAmpere);
   
   // Classify slump status
   const getSlumpStatus = (slump: number): SlumpStatus => {
@@ -76,6 +79,7 @@ export const useSlumpEstimation = (currentAmpere: number) => {
   return {
     estimatedSlump: Math.round(estimatedSlump * 10) / 10, // 1 decimal place
     slumpStatus: getSlumpStatus(estimatedSlump),
+    slumpSource,
     calibrationTable,
     saveCalibration,
     resetToDefault,
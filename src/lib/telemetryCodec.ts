@@ -0,0 +1,116 @@
+// Decoder for the controller's "bp-bin.v1" binary telemetry frames
+// (see raspberry_pi/telemetry_codec.py for the layout). Little endian.
+
+export const TELEMETRY_SUBPROTOCOL = 'bp-bin.v1';
+
+const FRAME_INDEX = 0x01;
+const FRAME_WEIGHTS = 0x02;
+const FRAME_AMPERE = 0x03;
+
+const WEIGHTS_HEADER_SIZE = 16; // <B B I Q H>
+
+export interface TelemetryIndexFrame {
+  type: 'telemetry_index';
+  scales: string[];
+}
+
+export interface BinaryWeightFrame {
+  type: 'weight_update';
+  timestamp: number;
+  seq: number;
+  keyframe: boolean;
+  weights: Record<string, number>;
+}
+
+export interface BinaryAmpereFrame {
+  type: 'ampere_update';
+  timestamp: number;
+  data: {
+    voltage: number;
+    ampere: number;
+    power: number;
+    energy: number;
+    frequency: number;
+    power_factor: number;
+    online: boolean;
+    alarm: boolean;
+  };
+  // Batch statistics are not in the frame (JSON mixer_analytics / mixer_plateau)
+  rolling: { rolling_mean: number; rolling_peak: number; overload: boolean };
+}
+
+export type TelemetryFrame = TelemetryIndexFrame | BinaryWeightFrame | BinaryAmpereFrame;
+
+// Timestamps are uint64 ms; Number is exact far beyond any real clock value
+const readTimestamp = (view: DataView, offset: number) =>
+  view.getUint32(offset, true) + view.getUint32(offset + 4, true) * 2 ** 32;
+
+const round = (value: number, decimals: number) => {
+  const factor = 10 ** decimals;
+  return Math.round(value * factor) / factor;
+};
+
+export const decodeTelemetryFrame = (buffer: ArrayBuffer, scales: string[]): TelemetryFrame | null => {
+  const view = new DataView(buffer);
+  const frameType = view.getUint8(0);
+
+  if (frameType === FRAME_INDEX) {
+    const count = view.getUint8(1);
+    const decoder = new TextDecoder();
+    const names: string[] = [];
+    let offset = 2;
+    for (let i = 0; i < count; i++) {
+      const length = view.getUint8(offset);
+      names.push(decoder.decode(new Uint8Array(buffer, offset + 1, length)));
+      offset += 1 + length;
+    }
+    return { type: 'telemetry_index', scales: names };
+  }
+
+  if (frameType === FRAME_WEIGHTS) {
+    const flags = view.getUint8(1);
+    const mask = view.getUint16(14, true);
+    const weights: Record<string, number> = {};
+    let offset = WEIGHTS_HEADER_SIZE;
+    for (let i = 0; i < scales.length; i++) {
+      if (mask & (1 << i)) {
+        // float32 on the wire: round back to the indicator resolution
+        weights[scales[i]] = round(view.getFloat32(offset, true), 2);
+        offset += 4;
+      }
+    }
+    return {
+      type: 'weight_update',
+      timestamp: readTimestamp(view, 6),
+      seq: view.getUint32(2, true),
+      keyframe: (flags & 0x01) !== 0,
+      weights,
+    };
+  }
+
+  if (frameType === FRAME_AMPERE) {
+    const flags = view.getUint8(1);
+    return {
+      type: 'ampere_update',
+      timestamp: readTimestamp(view, 2),
+      data: {
+        voltage: round(view.getFloat32(10, true), 1),
+        ampere: round(view.getFloat32(14, true), 3),
+        power: round(view.getFloat32(18, true), 1),
+        energy: view.getUint32(22, true),
+        frequency: round(view.getFloat32(26, true), 1),
+        power_factor: round(view.getFloat32(30, true), 2),
+        online: (flags & 0x01) !== 0,
+        alarm: (flags & 0x02) !== 0,
+      },
+      rolling: {
+        rolling_mean: round(view.getFloat32(34, true), 3),
+        rolling_peak: round(view.getFloat32(38, true), 3),
+        overload: (flags & 0x04) !== 0,
+      },
+    };
+  }
+
+  console.warn(`⚠️ Unknown telemetry frame type: ${frameType}`);
+  return null;
+};